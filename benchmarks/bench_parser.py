@@ -0,0 +1,108 @@
+"""Per-row parse cost of the HTML parsers, before and after the single-pass table extractor.
+
+Usage: python benchmarks/bench_parser.py [--rows 5000] [--repeat 5]
+
+The saved pages in ``tests/fixtures`` are grown to ``--rows`` rows by repeating their table body.
+"""
+import argparse
+import base64
+import time
+
+from common import FIXTURES, FakeResponse, scale_page
+from parsel import Selector
+
+from pyroxy.address import ProxyAddress, Speed
+from pyroxy.parser import FreeProxyCZ, FreeProxyNetParser
+
+
+def legacy_free_proxy_net(response):
+    selector = Selector(response.text)
+    proxy_list = []
+    for tr in selector.css(".fpl-list > table tr"):
+        tds = tr.css("td")
+        if not tds:
+            continue
+        ip = tds[0].css("::text").get()
+        port = int(tds[1].css("::text").get())
+        google = (tds[5].css("::text").get() or "") in "yes"
+        country = tds[3].css("::text").get()
+        anonymity = FreeProxyNetParser.setup_anonymity(tds[4].css("::text").get())
+        https = tds[6].css("::text").get()
+        updated = tds[7].css("::text").get()
+        protocol = FreeProxyNetParser.setup_protocol("https" if https == "yes" else "http")
+        proxy_list.append(ProxyAddress(ip, port, protocol, country, updated, google=google, anonymity=anonymity))
+    return proxy_list
+
+
+def legacy_free_proxy_cz(text):
+    selector = Selector(text)
+    column_length = len(selector.css("table#proxy_list th ::text"))
+    proxies = []
+    for row in selector.css("table#proxy_list tbody > tr"):
+        tds = row.css("td")
+        if len(tds) != column_length:
+            continue
+        ip_string = tds[0].css("script").re_first(r".*\(\"(.+)\"").split('")')[0]
+        ip = base64.urlsafe_b64decode(ip_string).decode()
+        port = int(tds[1].css("::text").get())
+        protocol = tds[2].css("::text").get()
+        country = tds[3].css("a::text").get()
+        _ = tds[4].css("::text").get()
+        _ = tds[5].css("::text").get()
+        anonymity = tds[6].css("::text").get()
+        speed = Speed.parse(tds[7].css("small::text").get())
+        uptime = Speed.parse(tds[8].css("small::text").get())
+        response_time = Speed.parse(tds[9].css("small::text").get())
+        last_checked = tds[10].css("small::text").get()
+        proxies.append(
+            ProxyAddress(
+                ip,
+                port,
+                FreeProxyCZ.setup_protocol(protocol),
+                country,
+                last_checked,
+                anonymity=FreeProxyCZ.setup_anonymity(anonymity),
+                speed=speed,
+                uptime=uptime,
+                response=response_time,
+            )
+        )
+    return proxies
+
+
+def best_of(fn, arg, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    net = FakeResponse(scale_page((FIXTURES / "free_proxy_net.html").read_text(), args.rows))
+    cz = scale_page((FIXTURES / "free_proxy_cz.html").read_text(), args.rows)
+    cases = [
+        ("FreeProxyNetParser", legacy_free_proxy_net, FreeProxyNetParser.parse, net),
+        ("FreeProxyCZ", legacy_free_proxy_cz, FreeProxyCZ.parse, cz),
+    ]
+
+    print(f"{'parser':<20}{'rows':>8}{'before us/row':>16}{'after us/row':>16}{'speedup':>10}")
+    for name, before, after, page in cases:
+        before_time, expected = best_of(before, page, args.repeat)
+        after_time, result = best_of(after, page, args.repeat)
+        assert result == expected, f"{name}: fast path output differs"
+        rows = len(result)
+        print(
+            f"{name:<20}{rows:>8}{before_time / rows * 1e6:>16.2f}{after_time / rows * 1e6:>16.2f}"
+            f"{before_time / after_time:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Offline benchmark suite for parsing, filtering, dedup, output and fetching.
+
+Usage: python benchmarks/bench_suite.py [--rows 1000,100000] [--repeat 5] [--only parse]
+                                        [--baseline baseline.json] [--save-baseline baseline.json]
+
+Every case runs ``--repeat`` times for each row count, and reports throughput (rows per second at
+the median), p50/p95/p99 wall time and the tracemalloc peak of one more run. Fixtures are the saved
+pages in ``tests/fixtures`` scaled to the row count; fetch cases go through a local HTTP server.
+
+With ``--baseline`` the results are compared to a file written earlier by ``--save-baseline``, and
+the script exits with status 1 if any case lost more than ``--threshold`` of its throughput or
+grew its peak memory by more than that share, so it can gate a release.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from common import FIXTURES, FakeResponse, StubServer, measure, scale_geonode, scale_page, scale_proxies
+
+from pyroxy import fetch
+from pyroxy.address import Anonymity, Protocol
+from pyroxy.merge import ProxyMerger
+from pyroxy.parser import FreeProxyCZ, FreeProxyNetParser, GeoNodeProxyParser
+from pyroxy.pyroxy import filter_proxy_list
+from pyroxy.query import ProxyQuery
+from pyroxy.ranking import top_k
+from pyroxy.settings import Config
+from pyroxy.store import ProxyStore
+from pyroxy.writers import WRITERS, write_proxies
+
+Case = Tuple[str, Callable[[], object]]
+
+# the CLI's default selection
+ELITE = ProxyQuery([Protocol.HTTPS, Protocol.SOCKS4, Protocol.SOCKS5], [Anonymity.HIA])
+
+
+def parse_cases(rows: int) -> List[Case]:
+    net = FakeResponse(scale_page((FIXTURES / "free_proxy_net.html").read_text(), rows))
+    cz = scale_page((FIXTURES / "free_proxy_cz.html").read_text(), rows)
+    geonode = FakeResponse(scale_geonode((FIXTURES / "geonode.json").read_text(), rows))
+    return [
+        ("parse/FreeProxyNetParser", lambda: FreeProxyNetParser.parse(net)),
+        ("parse/FreeProxyCZ", lambda: FreeProxyCZ.parse(cz)),
+        ("parse/GeoNodeProxyParser", lambda: GeoNodeProxyParser.parse(geonode)),
+        ("parse/GeoNodeProxyParser+query", lambda: GeoNodeProxyParser.parse(geonode, ELITE)),
+        ("parse/FreeProxyCZ+query", lambda: FreeProxyCZ.parse(cz, ELITE)),
+    ]
+
+
+def pool_cases(rows: int, tmp_dir: Path) -> List[Case]:
+    sample = GeoNodeProxyParser.parse(FakeResponse((FIXTURES / "geonode.json").read_text()))
+    proxies = scale_proxies(sample, rows)
+    unique = ProxyMerger(proxies).values()
+    store = ProxyStore(unique)
+    protocols, anonymity = [Protocol.HTTPS, Protocol.SOCKS4, Protocol.SOCKS5], [Anonymity.HIA]
+
+    cases = [
+        ("filter/list", lambda: filter_proxy_list(unique, protocols, anonymity)),
+        ("filter/store", lambda: filter_proxy_list(store, protocols, anonymity)),
+        ("dedup/merge", lambda: ProxyMerger(proxies).values()),
+        ("rank/top50", lambda: top_k(store, 50)),
+    ]
+    for fmt in WRITERS:
+        path = tmp_dir / f"proxies.{fmt}"
+        cases.append((f"write/{fmt}", lambda fmt=fmt, path=path: write_proxies(path, unique, fmt)))
+    return cases
+
+
+@contextmanager
+def patched(obj, **values) -> Iterator[None]:
+    saved = {name: obj.__dict__[name] for name in values if name in obj.__dict__}
+    for name, value in values.items():
+        setattr(obj, name, value)
+    try:
+        yield
+    finally:
+        for name in values:
+            if name in saved:
+                setattr(obj, name, saved[name])
+            else:
+                delattr(obj, name)
+
+
+@contextmanager
+def stub_sources(rows: int) -> Iterator[None]:
+    """Point the registered sources at a local server holding pages of ``rows`` rows, unthrottled."""
+    pages = {
+        "/net": scale_page((FIXTURES / "free_proxy_net.html").read_text(), rows).encode(),
+        "/geonode": scale_geonode((FIXTURES / "geonode.json").read_text(), rows).encode(),
+    }
+    unthrottled = {"rate_limit": float("inf"), "burst": 1000}
+    with StubServer(pages) as server, ExitStack() as stack:
+        # measure fetching and parsing, not replies from the response cache
+        stack.enter_context(patched(Config, RESPONSE_CACHE_SIZE=0))
+        stack.enter_context(patched(FreeProxyNetParser, url=server.url("/net"), **unthrottled))
+        page_url = server.url("/geonode") + "?limit={limit}&page={page}"
+        stack.enter_context(patched(GeoNodeProxyParser, page_url=page_url, page_size=rows, **unthrottled))
+        fetch.limiter.reset()
+        stack.callback(fetch.limiter.reset)
+        yield
+
+
+def fetch_cases() -> List[Case]:
+    return [
+        (f"fetch/{name}", lambda name=name: asyncio.run(fetch.fetch_source(name, timeout=60)))
+        for name in ("freeproxy", "geonode")
+    ]
+
+
+def run(rows_list: List[int], repeat: int, only: str) -> Dict[str, dict]:
+    results = {}
+
+    def report(name: str, rows: int, fn: Callable[[], object]) -> None:
+        if only and not name.startswith(only):
+            return
+        stats = measure(fn, repeat)
+        stats["rows_per_sec"] = rows / stats["p50"]
+        results[f"{name}@{rows}"] = stats
+        print(
+            f"{name:<32}{rows:>9}{stats['rows_per_sec']:>14,.0f}{stats['p50'] * 1e3:>11.2f}"
+            f"{stats['p95'] * 1e3:>11.2f}{stats['p99'] * 1e3:>11.2f}{stats['peak_bytes'] / 2 ** 20:>10.1f}",
+            flush=True,
+        )
+
+    print(f"{'case':<32}{'rows':>9}{'rows/s':>14}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'peak MB':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in rows_list:
+            for name, fn in parse_cases(rows) + pool_cases(rows, Path(tmp)):
+                report(name, rows, fn)
+            with stub_sources(rows):
+                for name, fn in fetch_cases():
+                    report(name, rows, fn)
+    return results
+
+
+def regressions(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    found = []
+    for key, stats in results.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        if stats["rows_per_sec"] < before["rows_per_sec"] * (1 - threshold):
+            found.append(f"{key}: {stats['rows_per_sec']:,.0f} rows/s, baseline {before['rows_per_sec']:,.0f}")
+        if stats["peak_bytes"] > before["peak_bytes"] * (1 + threshold):
+            found.append(f"{key}: peak {stats['peak_bytes']:,} bytes, baseline {before['peak_bytes']:,}")
+    return found
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", default="1000,100000", help="Comma separated row counts.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", default="", help="Run only cases whose name starts with this prefix.")
+    parser.add_argument("--baseline", type=Path, help="Fail on regressions against this results file.")
+    parser.add_argument("--save-baseline", type=Path, help="Write the results to this file.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed fractional regression.")
+    args = parser.parse_args()
+    if args.baseline and not args.baseline.exists():
+        parser.error(f"no baseline at {args.baseline}, record one with --save-baseline")
+
+    results = run([int(rows) for rows in args.rows.split(",")], args.repeat, args.only)
+
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps(results, indent=1, sort_keys=True))
+    if args.baseline:
+        found = regressions(results, json.loads(args.baseline.read_text()), args.threshold)
+        for line in found:
+            print(f"REGRESSION {line}")
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
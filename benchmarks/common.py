@@ -0,0 +1,123 @@
+"""Fixtures and measurement helpers shared by the benchmark scripts.
+
+Everything runs offline: pages come from ``tests/fixtures`` grown to the requested number of rows,
+and fetch paths are served by a local HTTP server.
+"""
+import json
+import math
+import threading
+import time
+import tracemalloc
+from dataclasses import replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from pyroxy.address import ProxyAddress
+
+FIXTURES = Path(__file__).resolve().parent.parent / "tests" / "fixtures"
+
+
+class FakeResponse:
+    status_code = 200
+    url = "fixture"
+
+    def __init__(self, text):
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def unique_ip(i: int) -> str:
+    return f"{10 + (i >> 24) % 200}.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}"
+
+
+def scale_page(text: str, rows: int) -> str:
+    """Repeat the ``<tr>`` lines of a saved page's ``<tbody>`` until it holds ``rows`` rows."""
+    head, rest = text.split("<tbody>", 1)
+    body, tail = rest.split("</tbody>", 1)
+    lines = [line for line in body.splitlines() if line.startswith("<tr>")]
+    repeated = (lines * (rows // len(lines) + 1))[:rows]
+    return head + "<tbody>\n" + "\n".join(repeated) + "\n</tbody>" + tail
+
+
+def scale_geonode(text: str, rows: int) -> str:
+    """Grow a saved GeoNode response to ``rows`` entries, each with its own IP."""
+    payload = json.loads(text)
+    data = payload["data"]
+    payload["data"] = [dict(data[i % len(data)], ip=unique_ip(i)) for i in range(rows)]
+    payload["total"] = rows
+    return json.dumps(payload)
+
+
+def scale_proxies(proxies: List[ProxyAddress], rows: int, duplicates: float = 0.2) -> List[ProxyAddress]:
+    """``rows`` proxies cycled from ``proxies``, with a ``duplicates`` share repeating an earlier endpoint."""
+    unique = max(1, int(rows * (1 - duplicates)))
+    return [replace(proxies[i % len(proxies)], ip=unique_ip(i % unique)) for i in range(rows)]
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile, ``q`` in [0, 100]."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def measure(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """Wall time percentiles over ``repeat`` runs, then the peak traced memory of one more run."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+        "best": min(samples),
+        "peak_bytes": peak,
+    }
+
+
+class StubServer:
+    """Threaded local HTTP server answering every path in ``routes`` with a fixed body."""
+
+    def __init__(self, routes: Dict[str, bytes]):
+        routes = dict(routes)
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                body = routes.get(self.path.split("?")[0])
+                self.send_response(200 if body is not None else 404)
+                self.send_header("Content-Length", str(len(body or b"")))
+                self.end_headers()
+                self.wfile.write(body or b"")
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def url(self, path: str) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}{path}"
+
+    def __enter__(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
@@ -1,9 +1,30 @@
 """Top-level package for pyroxy."""
+from importlib import import_module
+
 from .address import Anonymity, Protocol
-from .pyroxy import filter_proxy_list, proxy_list
 
 __author__ = """Daniel Ndegwa"""
 __email__ = "daniendegwa@gmail.com"
 __version__ = "0.1.0"
 
-__all__ = ["proxy_list", "filter_proxy_list", "Protocol", "Anonymity"]
+__all__ = ["proxy_list", "filter_proxy_list", "Protocol", "Anonymity", "ProxyStore", "ProxyRotator"]
+
+# the rest pulls in requests, parsel and asyncio, so it is only imported on first use
+_LAZY = {
+    "proxy_list": ".pyroxy",
+    "filter_proxy_list": ".pyroxy",
+    "ProxyStore": ".store",
+    "ProxyRotator": ".rotator",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
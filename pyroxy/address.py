@@ -1,6 +1,11 @@
+import re
 from dataclasses import dataclass
 from enum import Enum
-from typing import Optional, Union
+from typing import Optional, Sequence, Union
+
+
+# layout of ProxyAddress.to_record, bumped whenever it changes so that stored records are rebuilt
+RECORD_VERSION = 1
 
 
 class Anonymity(Enum):
@@ -21,6 +26,19 @@ class Protocol(Enum):
 class SpeedType(Enum):
     BPS = 1
     TIME = 2
+    PERCENT = 3
+
+
+_SPEED_PATTERN = re.compile(r"\s*(\d*\.?\d+)\s*([a-z/%]+)\s*$", re.IGNORECASE)
+# unit to speed type and the factor to bytes per second, milliseconds or percent
+_SPEED_UNITS = {
+    "b/s": (SpeedType.BPS, 1),
+    "kb/s": (SpeedType.BPS, 1000),
+    "mb/s": (SpeedType.BPS, 1000000),
+    "ms": (SpeedType.TIME, 1),
+    "s": (SpeedType.TIME, 1000),
+    "%": (SpeedType.PERCENT, 1),
+}
 
 
 @dataclass(frozen=True)
@@ -28,6 +46,17 @@ class Speed:
     speed_type: SpeedType
     value: Union[int, float]
 
+    @classmethod
+    def parse(cls, text: Optional[str]) -> Optional["Speed"]:
+        """Read text like ``"1570 kB/s"``, ``"2796 ms"`` or ``"74%"``; None if it is not one of those."""
+        match = _SPEED_PATTERN.match(text or "")
+        unit = _SPEED_UNITS.get(match.group(2).lower()) if match else None
+        if match is None or unit is None:
+            return None
+        speed_type, factor = unit
+        value = float(match.group(1)) * factor
+        return cls(speed_type, int(value) if value.is_integer() else value)
+
 
 @dataclass(frozen=True)
 class ProxyAddress:
@@ -42,3 +71,48 @@ class ProxyAddress:
     uptime: Optional[Speed] = None
     response: Optional[Speed] = None
     latency: Optional[Speed] = None
+
+    def to_record(self) -> tuple:
+        """Flatten into a tuple of plain values, suitable for JSON, pickling or a database row."""
+        return (
+            self.ip,
+            self.port,
+            self.protocol.value,
+            self.country,
+            self.updated,
+            self.anonymity.value,
+            self.google,
+            _speed_to_record(self.speed),
+            _speed_to_record(self.uptime),
+            _speed_to_record(self.response),
+            _speed_to_record(self.latency),
+        )
+
+    @classmethod
+    def from_record(cls, record: Sequence) -> "ProxyAddress":
+        ip, port, protocol, country, updated, anonymity, google, speed, uptime, response, latency = record
+        return cls(
+            ip,
+            port,
+            Protocol(protocol),
+            country,
+            updated,
+            Anonymity(anonymity),
+            google,
+            _speed_from_record(speed),
+            _speed_from_record(uptime),
+            _speed_from_record(response),
+            _speed_from_record(latency),
+        )
+
+
+def _speed_to_record(speed):
+    if isinstance(speed, Speed):
+        return (speed.speed_type.value, speed.value)
+    return speed
+
+
+def _speed_from_record(value):
+    if isinstance(value, (list, tuple)):
+        return Speed(SpeedType(value[0]), value[1])
+    return value
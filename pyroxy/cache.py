@@ -0,0 +1,306 @@
+"""Content addressed, compressed store of fetched responses and the proxies parsed from them."""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+
+from .settings import Config
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # type: ignore[assignment]
+
+try:
+    import zstandard  # type: ignore[import]
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger("cache")
+
+
+class Harvest(NamedTuple):
+    """One stored response: when it was fetched, for which source, from where and its content hash."""
+
+    fetched_at: float
+    source: str
+    url: str
+    digest: str
+
+
+class ResponseCache:
+    """Fetched responses kept once per SHA-256 of their content, compressed with zstd or gzip.
+
+    ``objects/`` holds the compressed bodies and ``parsed/`` the proxies parsed from each body,
+    per source and query, so a response seen before is never parsed again. When both together
+    take more than ``max_bytes`` the least recently used bodies are deleted along with their
+    parsed results. ``index.json`` remembers the stored bodies and the latest body of every URL;
+    past harvests, enough to replay them offline, are appended to ``history.jsonl``.
+
+    Processes may share a directory: the index is saved under a file lock, merged with what the
+    others saved in the meantime.
+    """
+
+    index_name = "index.json"
+    history_name = "history.jsonl"
+    lock_name = "index.lock"
+
+    def __init__(
+        self,
+        directory: Union[str, Path] = Config.RESPONSE_CACHE_DIR,
+        max_bytes: int = Config.RESPONSE_CACHE_SIZE,
+        codec: Optional[str] = None,
+    ):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.codec = codec or ("zst" if zstandard is not None else "gz")
+        self._lock = threading.Lock()
+        index = _load_json(self.directory / self.index_name) or {}
+        # digest to compressed size, codec, last use and the sizes of its parsed files
+        self._objects: Dict[str, dict] = index.get("objects", {})
+        # url to source, digest and encoding of its latest response
+        self._latest: Dict[str, dict] = index.get("latest", {})
+        # what the index on disk held when last read, and what changed here since
+        self._synced: Set[str] = set(self._objects)
+        self._touched: Set[str] = set()
+        if index.get("history") and not self._history_path.exists():
+            # an index written before the history had a file of its own
+            self._history_lines = 0
+            self._append_history(index["history"])
+        else:
+            self._history_lines = sum(1 for _ in self._read_history())
+        self.size = sum(_entry_size(entry) for entry in self._objects.values())
+
+    def __len__(self) -> int:
+        return len(self._objects)
+
+    @property
+    def _history_path(self) -> Path:
+        return self.directory / self.history_name
+
+    def put(self, source: str, url: str, content: bytes, encoding: Optional[str] = None) -> str:
+        """Store a response of ``source`` fetched from ``url`` unless its content is known; returns its digest."""
+        digest = hashlib.sha256(content).hexdigest()
+        now = time.time()
+        with self._lock:
+            entry = self._objects.get(digest)
+            if entry is None:
+                data = _compress(self.codec, content)
+                _write_atomic(self._object_path(digest, self.codec), data)
+                entry = self._objects[digest] = {"size": len(data), "codec": self.codec}
+                self.size += len(data)
+            entry["used"] = now
+            self._latest[url] = {"source": source, "digest": digest, "encoding": encoding}
+            self._touched.add(url)
+            self._save(keep=digest, history=[[now, source, url, digest]])
+        return digest
+
+    def load(self, digest: str) -> Optional[bytes]:
+        """The content stored under ``digest``, None if it is not (or no longer) cached."""
+        with self._lock:
+            entry = self._objects.get(digest)
+            if entry is None:
+                return None
+            entry["used"] = time.time()
+        try:
+            with open(self._object_path(digest, entry["codec"]), "rb") as f:
+                return _decompress(entry["codec"], f.read())
+        except OSError:
+            return None
+
+    def latest(self, source: Optional[str] = None) -> List[Tuple[str, str, Optional[str]]]:
+        """``(url, digest, encoding)`` of the latest response from every URL of ``source``, or of all sources."""
+        with self._lock:
+            return [
+                (url, entry["digest"], entry["encoding"])
+                for url, entry in self._latest.items()
+                if source is None or entry["source"] == source
+            ]
+
+    def history(self, source: Optional[str] = None) -> List[Harvest]:
+        """The last ``Config.RESPONSE_CACHE_HISTORY`` harvests whose response is still stored, oldest first."""
+        with self._lock:
+            entries = [
+                Harvest(*entry)
+                for entry in self._read_history()
+                if entry[3] in self._objects and (source is None or entry[1] == source)
+            ]
+        return entries[-Config.RESPONSE_CACHE_HISTORY:]
+
+    def parsed(
+        self, digest: str, source: str, query_key: str, version: str
+    ) -> Optional[Tuple[Optional[int], List[list]]]:
+        """The total and records :meth:`remember` stored for this content, source and query.
+
+        Results stored by another ``version`` of the parser are ignored; remembering the new ones
+        replaces them.
+        """
+        with self._lock:
+            if digest not in self._objects:
+                return None
+            data = _load_json(self._parsed_path(digest, source, query_key))
+        if data is None or data.get("version") != version:
+            return None
+        return data["total"], data["records"]
+
+    def remember(
+        self, digest: str, source: str, query_key: str, version: str, total: Optional[int], records: List[tuple]
+    ) -> None:
+        data = json.dumps({"version": version, "total": total, "records": records}).encode()
+        path = self._parsed_path(digest, source, query_key)
+        with self._lock:
+            entry = self._objects.get(digest)
+            if entry is None:
+                return
+            _write_atomic(path, data)
+            parsed = entry.setdefault("parsed", {})
+            self.size += len(data) - parsed.get(path.name, 0)
+            parsed[path.name] = len(data)
+            self._save(keep=digest)
+
+    def _object_path(self, digest: str, codec: str) -> Path:
+        return self.directory / "objects" / digest[:2] / f"{digest}.{codec}"
+
+    def _parsed_path(self, digest: str, source: str, query_key: str) -> Path:
+        return self.directory / "parsed" / digest[:2] / f"{digest}.{source}.{query_key}.json"
+
+    def _evict(self, keep: str) -> None:
+        if self.size <= self.max_bytes:
+            return
+        evicted = set()
+        for digest in sorted(self._objects, key=lambda digest: self._objects[digest].get("used", 0)):
+            if self.size <= self.max_bytes:
+                break
+            if digest == keep:
+                continue
+            entry = self._objects.pop(digest)
+            self.size -= _entry_size(entry)
+            evicted.add(digest)
+            _unlink(self._object_path(digest, entry["codec"]))
+            parsed_dir = self.directory / "parsed" / digest[:2]
+            if parsed_dir.is_dir():
+                for path in parsed_dir.glob(f"{digest}.*"):
+                    _unlink(path)
+        self._latest = {url: entry for url, entry in self._latest.items() if entry["digest"] not in evicted}
+        logger.debug(f"Evicted {len(evicted)} cached responses, {self.size} bytes left")
+
+    def _save(self, keep: str, history: Optional[List[list]] = None) -> None:
+        """Merge the index on disk into ours, evict down to ``max_bytes`` and write it back; under ``_lock``.
+
+        ``history`` entries are appended under the same file lock, so no compaction can drop them.
+        """
+        with _file_lock(self.directory / self.lock_name):
+            if history:
+                self._append_history(history)
+            index = _load_json(self.directory / self.index_name) or {}
+            on_disk = index.get("objects", {})
+            for digest, entry in on_disk.items():
+                mine = self._objects.get(digest)
+                if mine is None:
+                    if digest not in self._synced:
+                        self._objects[digest] = entry
+                    continue
+                mine["used"] = max(mine.get("used", 0), entry.get("used", 0))
+                mine["parsed"] = {**entry.get("parsed", {}), **mine.get("parsed", {})}
+            for digest in self._synced.difference(on_disk):
+                # evicted by another process since we last read the index
+                self._objects.pop(digest, None)
+            latest = index.get("latest", {})
+            latest.update((url, self._latest[url]) for url in self._touched if url in self._latest)
+            self._latest = {url: entry for url, entry in latest.items() if entry["digest"] in self._objects}
+            self.size = sum(_entry_size(entry) for entry in self._objects.values())
+
+            self._evict(keep)
+            index = {"objects": self._objects, "latest": self._latest}
+            _write_atomic(self.directory / self.index_name, json.dumps(index).encode())
+            self._synced = set(self._objects)
+            self._touched.clear()
+            if self._history_lines > 2 * Config.RESPONSE_CACHE_HISTORY:
+                self._compact_history()
+
+    def _read_history(self) -> Iterator[list]:
+        try:
+            with open(self._history_path, "rb") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        # the torn tail of an append cut short
+                        continue
+        except OSError:
+            return
+
+    def _append_history(self, entries: List[list]) -> None:
+        self._history_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self._history_path, "ab") as f:
+            f.write(b"".join(json.dumps(entry).encode() + b"\n" for entry in entries))
+        self._history_lines += len(entries)
+
+    def _compact_history(self) -> None:
+        """Rewrite the history without evicted responses, down to the last ``Config.RESPONSE_CACHE_HISTORY``."""
+        entries = [entry for entry in self._read_history() if entry[3] in self._objects]
+        entries = entries[-Config.RESPONSE_CACHE_HISTORY:]
+        _write_atomic(self._history_path, b"".join(json.dumps(entry).encode() + b"\n" for entry in entries))
+        self._history_lines = len(entries)
+
+
+def _entry_size(entry: dict) -> int:
+    return entry["size"] + sum(entry.get("parsed", {}).values())
+
+
+@contextmanager
+def _file_lock(path: Path) -> Iterator[None]:
+    """Hold an exclusive lock on ``path`` between processes; only between threads where fcntl is missing."""
+    if fcntl is None:
+        yield
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "ab") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _compress(codec: str, content: bytes) -> bytes:
+    if codec == "zst":
+        return zstandard.ZstdCompressor().compress(content)
+    return gzip.compress(content, compresslevel=6)
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zst":
+        if zstandard is None:
+            raise OSError("zstd compressed cache entry, but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _load_json(path: Path) -> Optional[dict]:
+    try:
+        with open(path, "rb") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_file, "wb") as f:
+        f.write(data)
+    os.replace(tmp_file, path)
+
+
+def _unlink(path: Path) -> None:
+    try:
+        path.unlink()
+    except OSError:
+        pass
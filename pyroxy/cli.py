@@ -4,33 +4,191 @@ import sys
 
 import click
 
-from . import pyroxy
 from .address import Anonymity, Protocol
-from .settings import setup
-
-setup()
+from .metrics import EXPORTERS, start_profile, write_metrics
+from .settings import Config, setup
+from .writers import WRITERS
 
 logger = logging.getLogger("cli")
 
 
+class SourceChoice(click.Choice):
+    """Choice of the registered sources, looked up only when the option is parsed or shown.
+
+    The registry lives next to the parsers, which need requests and parsel; resolving it lazily
+    keeps ``--help`` and the commands that never fetch from importing them.
+    """
+
+    def __init__(self):
+        super().__init__([], case_sensitive=False)
+
+    @property
+    def choices(self):
+        from .fetch import source_names
+
+        return source_names()
+
+    @choices.setter
+    def choices(self, value):
+        pass
+
+
+site_option = click.option("--site", type=SourceChoice())
+snapshot_option = click.option(
+    "--snapshot", type=click.Path(file_okay=False), help="Also publish the pool as a shared snapshot in this directory."
+)
+workers_option = click.option(
+    "--parse-workers", "workers", type=int, default=Config.PARSE_WORKERS, help="Processes parsing fetched pages."
+)
+
+
 @click.group()
-def proxies():
-    pass
+@click.option("--metrics", "metrics_path", type=click.Path(dir_okay=False), help="Write metrics here on exit.")
+@click.option("--metrics-format", type=click.Choice(list(EXPORTERS)), help="Default: json for .json, else prometheus.")
+@click.option("--profile", type=click.Choice(["cprofile", "tracemalloc"]), help="Profile the command.")
+@click.option("--profile-output", type=click.Path(dir_okay=False), default="pyroxy.prof", show_default=True)
+@click.pass_context
+def proxies(ctx, metrics_path, metrics_format, profile, profile_output):
+    if metrics_path:
+        ctx.call_on_close(lambda: write_metrics(metrics_path, metrics_format))
+    if profile:
+        ctx.call_on_close(start_profile(profile, profile_output))
 
 
 @proxies.command()
 @click.argument("filename")
-@click.option("--site", type=click.Choice(["geonode", "freeproxy"], case_sensitive=False))
+@site_option
 @click.option("--cached/--no-cached", default=False)
-def proxylist(filename, site, cached):
+@click.option("--validate/--no-validate", default=False, help="Drop proxies that fail a live check.")
+@click.option("--ttl", type=float, help="Serve stored proxies younger than TTL seconds instead of fetching.")
+@click.option("--replay", is_flag=True, help="Parse the last fetched responses from the cache, offline.")
+@click.option("--format", "fmt", type=click.Choice(list(WRITERS)), default="text", show_default=True)
+@click.option("--top", type=int, help="Keep only the TOP best ranked proxies, best first.")
+@click.option("--judge", "judge_url", help="Relabel anonymity with what proxies leak to the judge at this URL.")
+@snapshot_option
+@workers_option
+def proxylist(filename, site, cached, validate, ttl, replay, fmt, top, judge_url, snapshot, workers):
     """Write proxy list to a file."""
+    setup()
+    from . import pyroxy, validator
+    from .query import ProxyQuery
+
+    query = ProxyQuery([Protocol.HTTPS, Protocol.SOCKS4, Protocol.SOCKS5], [Anonymity.HIA])
+    # the judge decides the anonymity, so the claimed one must not filter proxies out before it
+    fetch_query = ProxyQuery(query.protocols) if judge_url else query
     if cached:
         proxies_ = pyroxy.cached_proxies()
         logger.info(f"CACHED: {len(proxies_)}")
+    elif ttl is not None:
+        proxies_ = pyroxy.stored_proxy_list(site, ttl)
+    elif replay:
+        proxies_ = pyroxy.replayed_proxy_list(site, fetch_query)
     else:
-        proxies_ = pyroxy.proxy_list(site)
-    proxy_list = pyroxy.filter_proxy_list(proxies_, [Protocol.HTTPS, Protocol.SOCKS4, Protocol.SOCKS5], [Anonymity.HIA])
-    pyroxy.proxy_list_file(filename, proxy_list)
+        proxies_ = pyroxy.proxy_list(site, workers=workers, query=fetch_query)
+    proxy_list = pyroxy.filter_proxy_list(proxies_, [], [], query=fetch_query)
+    if judge_url:
+        from .judge import judge_proxies
+
+        proxy_list = pyroxy.filter_proxy_list(judge_proxies(proxy_list, judge_url), [], [], query=query)
+    if validate:
+        proxy_list = validator.validate_proxies(proxy_list)
+    if top is not None:
+        from .ranking import top_k
+
+        proxy_list = top_k(proxy_list, top)
+    pyroxy.proxy_list_file(filename, proxy_list, fmt)
+    if snapshot:
+        from .snapshot import publish_snapshot
+
+        publish_snapshot(proxy_list, snapshot)
+
+
+def _revalidating(fetch, validate, interval):
+    """The refresh of a served pool, how often to run it, and the revalidator to stop afterwards.
+
+    Without ``validate`` that is ``fetch`` itself every ``interval`` seconds. With it, ``fetch`` runs
+    every ``interval`` seconds to feed a :class:`RevalidationScheduler` checking proxies in the
+    background, and the pool follows its live proxies every ``Config.REVALIDATE_POOL_INTERVAL``.
+    """
+    if not validate:
+        return fetch, interval, None
+    from .scheduler import RevalidationScheduler, Revalidator, revalidated
+    from .validator import ProxyChecker
+
+    scheduler = RevalidationScheduler()
+    revalidator = Revalidator(scheduler, ProxyChecker())
+    revalidator.start()
+    return revalidated(fetch, scheduler, interval), min(interval, Config.REVALIDATE_POOL_INTERVAL), revalidator
+
+
+@proxies.command()
+@click.option("--host", default=Config.DAEMON_HOST)
+@click.option("--port", type=int, default=Config.DAEMON_PORT)
+@click.option("--socket", "socket_path", type=click.Path(), help="Listen on a Unix socket instead of TCP.")
+@click.option("--interval", type=float, default=Config.DAEMON_REFRESH_INTERVAL, help="Seconds between source fetches.")
+@site_option
+@click.option("--validate/--no-validate", default=True, help="Keep re-validating the pool in the background.")
+@snapshot_option
+@workers_option
+def serve(host, port, socket_path, interval, site, validate, snapshot, workers):
+    """Serve a continuously refreshed proxy pool over a local API."""
+    setup()
+    from . import daemon, pyroxy
+    from .snapshot import publish_snapshot
+
+    def fetch():
+        return pyroxy.proxy_list(site, workers=workers)
+
+    revalidated, pool_interval, revalidator = _revalidating(fetch, validate, interval)
+
+    def refresh():
+        proxies_ = revalidated()
+        if snapshot:
+            publish_snapshot(proxies_, snapshot)
+        return proxies_
+
+    try:
+        daemon.serve(refresh, host, port, socket_path, pool_interval)
+    finally:
+        if revalidator is not None:
+            revalidator.stop()
+
+
+@proxies.command()
+@click.option("--host", default=Config.FORWARD_HOST)
+@click.option("--port", type=int, default=Config.FORWARD_PORT)
+@click.option("--interval", type=float, default=Config.DAEMON_REFRESH_INTERVAL, help="Seconds between source fetches.")
+@site_option
+@click.option("--validate/--no-validate", default=True, help="Keep re-validating the pool in the background.")
+@workers_option
+def forward(host, port, interval, site, validate, workers):
+    """Run a local HTTP/SOCKS5 proxy that rotates over the harvested pool."""
+    setup()
+    from . import forwarder, pyroxy
+    from .query import ProxyQuery
+
+    query = ProxyQuery([Protocol.HTTPS, Protocol.SOCKS4, Protocol.SOCKS5])
+
+    def fetch():
+        return pyroxy.proxy_list(site, workers=workers, query=query)
+
+    refresh, pool_interval, revalidator = _revalidating(fetch, validate, interval)
+    try:
+        forwarder.forward(refresh, host, port, pool_interval)
+    finally:
+        if revalidator is not None:
+            revalidator.stop()
+
+
+@proxies.command()
+@click.option("--host", default=Config.JUDGE_HOST)
+@click.option("--port", type=int, default=Config.JUDGE_PORT)
+def judge(host, port):
+    """Run a proxy judge echoing the address and headers every request arrives with."""
+    setup()
+    from . import judge as judge_
+
+    judge_.serve(host, port)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,252 @@
+"""Long running proxy pool served over a local HTTP or Unix socket API."""
+import heapq
+import json
+import logging
+import math
+import os
+import socket
+import socketserver
+import stat
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from .address import Anonymity, Protocol, ProxyAddress
+from .geo import normalize_country
+from .metrics import EXPORTERS, export, metrics
+from .settings import Config
+from .store import proxy_latency, proxy_to_dict
+
+logger = logging.getLogger("daemon")
+
+BucketKey = Tuple[Protocol, Anonymity]
+
+
+def proxy_rank(proxy: ProxyAddress) -> float:
+    latency = proxy_latency(proxy)
+    return math.inf if math.isnan(latency) else latency
+
+
+def _country_key(country: Optional[str]) -> Optional[str]:
+    """Two letter code of a code or name, else the text itself without case, so that both spellings match."""
+    return normalize_country(country) or (country or "").strip().casefold() or None
+
+
+class ProxyPool:
+    """Deduplicated proxies ranked by latency, bucketed by (protocol, anonymity).
+
+    :meth:`update` builds a new set of buckets and swaps it in with one assignment, so readers
+    never lock and never see a half built pool. The same buckets are also split by country key,
+    so a country query never normalizes a name per proxy.
+    """
+
+    def __init__(self, proxies: Iterable[ProxyAddress] = ()):
+        self._buckets: Dict[BucketKey, List[ProxyAddress]] = {}
+        self._countries: Dict[str, Dict[BucketKey, List[ProxyAddress]]] = {}
+        self.size = 0
+        self.refreshed_at: Optional[float] = None
+        self.update(proxies)
+
+    def update(self, proxies: Iterable[ProxyAddress]) -> None:
+        unique: Dict[tuple, ProxyAddress] = {}
+        for proxy in proxies:
+            key = (proxy.ip, int(proxy.port), proxy.protocol)
+            known = unique.get(key)
+            if known is None or proxy_rank(proxy) < proxy_rank(known):
+                unique[key] = proxy
+
+        buckets: Dict[BucketKey, List[ProxyAddress]] = {}
+        countries: Dict[str, Dict[BucketKey, List[ProxyAddress]]] = {}
+        keys: Dict[Optional[str], Optional[str]] = {}
+        for proxy in sorted(unique.values(), key=proxy_rank):
+            bucket_key = (proxy.protocol, proxy.anonymity)
+            buckets.setdefault(bucket_key, []).append(proxy)
+            if proxy.country not in keys:
+                keys[proxy.country] = _country_key(proxy.country)
+            country = keys[proxy.country]
+            if country:
+                countries.setdefault(country, {}).setdefault(bucket_key, []).append(proxy)
+
+        self._buckets, self._countries = buckets, countries
+        self.size = len(unique)
+        self.refreshed_at = time.time()
+        metrics.set("pool_size", self.size)
+        for (protocol, anonymity), bucket in buckets.items():
+            metrics.set("pool_bucket_size", len(bucket), protocol=protocol.name, anonymity=anonymity.name)
+
+    def get(
+        self,
+        n: int,
+        protocols: Optional[Iterable[Protocol]] = None,
+        anonymity: Optional[Iterable[Anonymity]] = None,
+        country: Optional[str] = None,
+    ) -> List[ProxyAddress]:
+        """Return up to ``n`` of the fastest proxies matching the filters; ``country`` is a code or a name."""
+        protocols = set(protocols or Protocol)
+        anonymity = set(anonymity or Anonymity)
+        country = _country_key(country)
+        buckets = self._countries.get(country, {}) if country else self._buckets
+        selected = [bucket for (p, a), bucket in buckets.items() if p in protocols and a in anonymity]
+        ranked = selected[0] if len(selected) == 1 else heapq.merge(*selected, key=proxy_rank)
+        return list(islice(ranked, n))
+
+    def values(self) -> List[ProxyAddress]:
+        return [proxy for bucket in self._buckets.values() for proxy in bucket]
+
+
+class PoolRefresher(threading.Thread):
+    """Replace the pool's contents with ``refresh()`` every ``interval`` seconds."""
+
+    def __init__(self, pool: ProxyPool, refresh: Callable[[], List[ProxyAddress]], interval: float):
+        super().__init__(name="pool-refresher", daemon=True)
+        self.pool = pool
+        self.refresh = refresh
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self.pool.update(self.refresh())
+                logger.info(f"Pool refreshed: {self.pool.size}")
+            except Exception:
+                logger.exception("Pool refresh failed, keeping previous pool")
+            self._stopped.wait(self.interval)
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+
+def _parse_enums(enum, values: List[str]):
+    names = [name.strip().upper() for value in values for name in value.split(",") if name.strip()]
+    return [enum[name] for name in names]
+
+
+class PoolRequestHandler(BaseHTTPRequestHandler):
+    """``GET /proxies?n=10&protocol=https,socks5&anonymity=hia&country=US[&format=text]``, ``GET /health``.
+
+    ``GET /metrics`` returns the process metrics in Prometheus text format, or as JSON with ``?format=json``.
+    """
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/metrics":
+            fmt = query.get("format", ["prometheus"])[0]
+            if fmt not in EXPORTERS:
+                self._send(400, {"error": f"unknown format {fmt}"})
+                return
+            self._send_body(200, export(fmt).encode(), EXPORTERS[fmt].content_type)
+            return
+        if url.path == "/health":
+            self._send(200, {"size": self.server.pool.size, "refreshed_at": self.server.pool.refreshed_at})
+            return
+        if url.path != "/proxies":
+            self._send(404, {"error": "not found"})
+            return
+
+        try:
+            n = int(query.get("n", ["10"])[0])
+            if n < 0:
+                raise ValueError(f"n must not be negative, got {n}")
+            protocols = _parse_enums(Protocol, query.get("protocol", []))
+            anonymity = _parse_enums(Anonymity, query.get("anonymity", []))
+        except (KeyError, ValueError) as e:
+            self._send(400, {"error": f"bad query: {e}"})
+            return
+
+        proxies = self.server.pool.get(n, protocols, anonymity, query.get("country", [None])[0])
+        if query.get("format", ["json"])[0] == "text":
+            self._send_body(200, "".join(f"{p.ip}:{p.port}\n" for p in proxies).encode(), "text/plain")
+        else:
+            self._send(200, [proxy_to_dict(proxy) for proxy in proxies])
+
+    def _send(self, status: int, payload) -> None:
+        self._send_body(status, json.dumps(payload).encode(), "application/json")
+
+    def _send_body(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self) -> str:
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+class PoolHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], pool: ProxyPool):
+        super().__init__(address, PoolRequestHandler)
+        self.pool = pool
+
+
+def _remove_stale_socket(path: str) -> None:
+    """Unlink a socket file left behind by a daemon that is gone; a live one keeps its socket."""
+    try:
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            return
+    except FileNotFoundError:
+        return
+    with socket.socket(socket.AF_UNIX) as probe:
+        try:
+            probe.connect(path)
+        except ConnectionRefusedError:
+            logger.info(f"Removing stale socket {path}")
+            os.unlink(path)
+
+
+class PoolUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Pool API on a Unix socket, which is replaced if stale at startup and removed on close."""
+
+    daemon_threads = True
+
+    def __init__(self, path: str, pool: ProxyPool):
+        _remove_stale_socket(path)
+        self.path = path
+        self._bound = False
+        super().__init__(path, PoolRequestHandler)
+        self.pool = pool
+
+    def server_bind(self) -> None:
+        super().server_bind()
+        self._bound = True
+
+    def server_close(self) -> None:
+        super().server_close()
+        if self._bound:
+            self._bound = False
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+
+def serve(
+    refresh: Callable[[], List[ProxyAddress]],
+    host: str = Config.DAEMON_HOST,
+    port: int = Config.DAEMON_PORT,
+    socket_path: Optional[str] = None,
+    interval: float = Config.DAEMON_REFRESH_INTERVAL,
+) -> None:
+    """Keep a pool warm with ``refresh`` in the background and answer queries until interrupted."""
+    pool = ProxyPool()
+    refresher = PoolRefresher(pool, refresh, interval)
+    refresher.start()
+    server = PoolUnixServer(socket_path, pool) if socket_path else PoolHTTPServer((host, port), pool)
+    logger.info(f"Serving proxy pool on {socket_path or f'http://{host}:{port}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        refresher.stop()
+        server.server_close()
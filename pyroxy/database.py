@@ -0,0 +1,181 @@
+"""Persistent proxy store with per-source refresh times."""
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional
+
+import requests
+
+from .address import ProxyAddress
+from .fetch import fetch_source, get_source, parse_response, policy, select_sources, source_timeout
+from .metrics import metrics
+from .merge import ProxyMerger
+from .settings import Config
+
+logger = logging.getLogger("database")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    name TEXT PRIMARY KEY,
+    fetched_at REAL NOT NULL,
+    etag TEXT,
+    last_modified TEXT
+);
+CREATE TABLE IF NOT EXISTS proxies (
+    source TEXT NOT NULL,
+    ip TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    protocol INTEGER NOT NULL,
+    country TEXT,
+    updated TEXT,
+    anonymity INTEGER NOT NULL,
+    google INTEGER,
+    speed TEXT,
+    uptime TEXT,
+    response TEXT,
+    latency TEXT,
+    PRIMARY KEY (source, ip, port, protocol)
+);
+"""
+
+
+class SourceState(NamedTuple):
+    fetched_at: float
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+
+class ProxyDatabase:
+    """SQLite database in WAL mode holding the last good result of every source."""
+
+    def __init__(self, path: Path = Config.DATABASE_FILE):
+        self.connection = sqlite3.connect(str(path))
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def source_state(self, name: str) -> Optional[SourceState]:
+        row = self.connection.execute(
+            "SELECT fetched_at, etag, last_modified FROM sources WHERE name = ?", (name,)
+        ).fetchone()
+        return SourceState(*row) if row else None
+
+    def stale_sources(self, names: Iterable[str], ttl: float) -> List[str]:
+        now = time.time()
+        stale = []
+        for name in names:
+            state = self.source_state(name)
+            if state is None or now - state.fetched_at >= ttl:
+                stale.append(name)
+        return stale
+
+    def replace_source(
+        self, name: str, proxies: List[ProxyAddress], etag: Optional[str] = None, last_modified: Optional[str] = None
+    ) -> None:
+        rows = [(name,) + _to_row(proxy) for proxy in proxies]
+        with self.connection:
+            self.connection.execute("DELETE FROM proxies WHERE source = ?", (name,))
+            self.connection.executemany(f"INSERT OR REPLACE INTO proxies VALUES ({', '.join('?' * 12)})", rows)
+            self.connection.execute(
+                "INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)", (name, time.time(), etag, last_modified)
+            )
+
+    def touch_source(self, name: str) -> None:
+        with self.connection:
+            self.connection.execute("UPDATE sources SET fetched_at = ? WHERE name = ?", (time.time(), name))
+
+    def proxies(self, names: Iterable[str]) -> List[ProxyAddress]:
+        names = list(names)
+        rows = self.connection.execute(
+            f"SELECT ip, port, protocol, country, updated, anonymity, google, speed, uptime, response, latency "
+            f"FROM proxies WHERE source IN ({', '.join('?' * len(names))})",
+            names,
+        )
+        return [_from_row(row) for row in rows]
+
+
+def _to_row(proxy: ProxyAddress) -> tuple:
+    record = proxy.to_record()
+    return record[:7] + tuple(None if value is None else json.dumps(value) for value in record[7:])
+
+
+def _from_row(row: tuple) -> ProxyAddress:
+    return ProxyAddress.from_record(row[:7] + tuple(None if value is None else json.loads(value) for value in row[7:]))
+
+
+async def refresh_source(database: ProxyDatabase, name: str, timeout: Optional[float] = None) -> None:
+    """Fetch ``name`` again, sending the validators of the previous response when there is one.
+
+    Paginated sources are walked in full without validators, since each page changes independently.
+    """
+    parser = get_source(name)
+    if parser.page_url:
+        proxies = await fetch_source(name, timeout)
+        if proxies:
+            database.replace_source(name, proxies)
+        return
+    if not parser.url:
+        logger.info(f"{name}: no url to refresh from")
+        return
+
+    timeout = source_timeout(name, timeout)
+    headers = dict(Config.HEADERS)
+    state = database.source_state(name)
+    if state and state.etag:
+        headers["If-None-Match"] = state.etag
+    if state and state.last_modified:
+        headers["If-Modified-Since"] = state.last_modified
+
+    try:
+        with metrics.timer("fetch_seconds", source=name):
+            response = await asyncio.wait_for(policy.fetch(name, parser.url, timeout, headers), timeout)
+    except (asyncio.TimeoutError, requests.RequestException) as e:
+        logger.info(f"{name}: keeping stored proxies, fetch failed: {e!r}")
+        metrics.inc("fetch_errors_total", source=name, reason=type(e).__name__)
+        return
+
+    if response.status_code == 304:
+        logger.info(f"{name}: not modified")
+        metrics.inc("fetch_not_modified_total", source=name)
+        database.touch_source(name)
+        return
+
+    if response.status_code != 200:
+        logger.info(f"{name}: keeping stored proxies, got [{response.status_code}]")
+        return
+
+    _, proxies = await parse_response(name, response)
+    metrics.inc("parse_rows_total", len(proxies), source=name)
+    if not proxies:
+        # more likely a changed or blocked page than a source that really lists nothing
+        logger.info(f"{name}: keeping stored proxies, the response had none")
+        metrics.inc("fetch_errors_total", source=name, reason="empty")
+        return
+    logger.info(f"{name.upper():<9}: {len(proxies)} stored")
+    database.replace_source(name, proxies, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+
+
+async def refresh_sources(
+    database: ProxyDatabase,
+    sites: Optional[Iterable[str]] = None,
+    ttl: float = Config.DATABASE_TTL,
+    timeout: Optional[float] = None,
+) -> List[ProxyAddress]:
+    """Refresh the sources older than ``ttl`` seconds concurrently and return every stored proxy, merged.
+
+    A source whose refresh fails keeps its stored proxies; the others are refreshed regardless.
+    """
+    names = select_sources(sites)
+    stale = database.stale_sources(names, ttl)
+    results = await asyncio.gather(*(refresh_source(database, name, timeout) for name in stale), return_exceptions=True)
+    for name, result in zip(stale, results):
+        if isinstance(result, Exception):
+            logger.error(f"{name}: keeping stored proxies, refresh failed: {result!r}")
+            metrics.inc("fetch_errors_total", source=name, reason=type(result).__name__)
+    return ProxyMerger(database.proxies(names)).values()
@@ -0,0 +1,434 @@
+"""Concurrent fetching of proxy sources."""
+import asyncio
+import functools
+import logging
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack
+from typing import AsyncGenerator, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Type
+from urllib.parse import urlsplit
+
+import requests
+from requests import Response
+from requests.adapters import HTTPAdapter
+
+from .address import ProxyAddress
+from .cache import ResponseCache
+from .merge import ProxyMerger, merge_safe
+from .metrics import metrics
+from .parser import SOURCES, FreeProxyParser, GeoNodeProxyParser, PageResponse, load_source_plugins
+from .pipeline import ParsePipeline, ParseResult, RawResponse
+from .policy import FetchPolicy
+from .query import ProxyQuery
+from .ratelimit import HostLimiter
+from .settings import Config
+
+logger = logging.getLogger("fetch")
+
+_plugins_loaded = False
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_response_cache: Optional[ResponseCache] = None
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def source_names(default_only: bool = False) -> List[str]:
+    """Names of the registered sources, including those installed as plugins."""
+    global _plugins_loaded
+    if not _plugins_loaded:
+        _plugins_loaded = True
+        load_source_plugins()
+    return [name for name, parser in SOURCES.items() if parser.default or not default_only]
+
+
+def select_sources(sites: Optional[Iterable[str]] = None) -> List[str]:
+    if not sites:
+        return source_names(default_only=True)
+
+    known = source_names()
+    names = []
+    for site in sites:
+        name = site.lower()
+        if name not in known:
+            raise ValueError(f"Unknown proxy source: {site}")
+        if name not in names:
+            names.append(name)
+    return names
+
+
+def get_source(name: str) -> Type[FreeProxyParser]:
+    return SOURCES[name]
+
+
+def source_timeout(name: str, timeout: Optional[float] = None) -> float:
+    if timeout is not None:
+        return timeout
+    return Config.SOURCE_TIMEOUTS.get(name, Config.FETCH_TIMEOUT)
+
+
+def host_limits(host: str) -> Tuple[float, float]:
+    """The strictest rate limit and burst declared by the sources served from ``host``."""
+    limits = [
+        (parser.rate_limit, parser.burst)
+        for parser in SOURCES.values()
+        for url in (parser.url, parser.page_url)
+        if url and urlsplit(url).netloc == host
+    ]
+    if not limits:
+        return Config.SOURCE_RATE_LIMIT, Config.SOURCE_BURST
+    return min(rate for rate, _ in limits), min(burst for _, burst in limits)
+
+
+limiter = HostLimiter(host_limits)
+
+
+def get_session() -> requests.Session:
+    """The keep-alive session every fetch shares, so each host costs one pool of connections."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=Config.HTTP_POOL_SIZE, pool_maxsize=Config.HTTP_POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update(Config.HEADERS)
+            _session = session
+        return _session
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Threads running the blocking requests.
+
+    Not the event loop's default executor: ``asyncio.run`` joins that one on exit, which would
+    make every run wait for the requests hedging and deadlines gave up on.
+    """
+    global _executor
+    with _session_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(Config.FETCH_THREADS, thread_name_prefix="fetch")
+        return _executor
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """The cache every fetched response goes to, None when ``Config.RESPONSE_CACHE_SIZE`` is 0."""
+    global _response_cache
+    if Config.RESPONSE_CACHE_SIZE <= 0:
+        return None
+    with _session_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache(Config.RESPONSE_CACHE_DIR, Config.RESPONSE_CACHE_SIZE)
+        return _response_cache
+
+
+async def fetch(url: str, timeout: float, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Wait for the host's rate limit, then run a blocking GET on the shared session in :func:`get_executor`."""
+    await limiter.bucket(urlsplit(url).netloc).acquire()
+    return await _get(url, timeout, headers)
+
+
+async def _get(url: str, timeout: float, headers: Optional[Dict[str, str]] = None) -> Response:
+    loop = asyncio.get_running_loop()
+    get = functools.partial(get_session().get, url, headers=headers, timeout=timeout)
+    return await loop.run_in_executor(get_executor(), get)
+
+
+policy = FetchPolicy(_get, limiter)
+
+
+async def parse_response(
+    name: str, response: Response, pipeline: Optional[ParsePipeline] = None, query: Optional[ProxyQuery] = None
+) -> ParseResult:
+    """The source's ``parse_page(response, query)``, run in the process pool of ``pipeline`` when one is given.
+
+    Successful responses are stored in the response cache first; if the same content was parsed
+    before for this source and query, that result is returned without parsing.
+    """
+    metrics.inc("fetch_bytes_total", len(response.content), source=name)
+    cache = get_response_cache()
+    if cache is None or response.status_code != 200:
+        return await _parse(name, response, pipeline, query)
+    loop = asyncio.get_running_loop()
+    digest = await loop.run_in_executor(None, cache.put, name, response.url, response.content, response.encoding)
+    return await _parse_cached(cache, digest, name, response, pipeline, query)
+
+
+async def _parse(
+    name: str, response: PageResponse, pipeline: Optional[ParsePipeline], query: Optional[ProxyQuery]
+) -> ParseResult:
+    if pipeline is not None:
+        return await pipeline.parse(name, response, query)
+    with metrics.timer("parse_seconds", source=name):
+        return get_source(name).parse_page(response, query)
+
+
+async def _parse_cached(
+    cache: ResponseCache,
+    digest: str,
+    name: str,
+    response: PageResponse,
+    pipeline: Optional[ParsePipeline],
+    query: Optional[ProxyQuery],
+) -> ParseResult:
+    loop = asyncio.get_running_loop()
+    query_key = query.key() if query is not None else "all"
+    version = get_source(name).records_version()
+    cached = await loop.run_in_executor(None, cache.parsed, digest, name, query_key, version)
+    if cached is not None:
+        metrics.inc("parse_skipped_total", source=name)
+        total, rows = cached
+        return total, [ProxyAddress.from_record(row) for row in rows]
+
+    total, proxies = await _parse(name, response, pipeline, query)
+    records = [proxy.to_record() for proxy in proxies]
+    await loop.run_in_executor(None, cache.remember, digest, name, query_key, version, total, records)
+    return total, proxies
+
+
+async def fetch_source(
+    name: str,
+    timeout: Optional[float] = None,
+    pipeline: Optional[ParsePipeline] = None,
+    query: Optional[ProxyQuery] = None,
+) -> List[ProxyAddress]:
+    with metrics.timer("source_seconds", source=name):
+        proxies = await _fetch_source(name, timeout, pipeline, query)
+    metrics.inc("parse_rows_total", len(proxies), source=name)
+    logger.info(f"{name.upper():<9}: {len(proxies)}")
+    return proxies
+
+
+async def _fetch_source(
+    name: str, timeout: Optional[float], pipeline: Optional[ParsePipeline], query: Optional[ProxyQuery]
+) -> List[ProxyAddress]:
+    parser = get_source(name)
+    timeout = source_timeout(name, timeout)
+    try:
+        if parser.page_url:
+            return await _walk_pages(parser, timeout, pipeline, query)
+        if not parser.url:
+            logger.info(f"{name}: no url to fetch")
+            return []
+
+        with metrics.timer("fetch_seconds", source=name):
+            response = await asyncio.wait_for(policy.fetch(name, parser.url, timeout), timeout)
+        return (await parse_response(name, response, pipeline, query))[1]
+    except asyncio.TimeoutError:
+        logger.info(f"{name}: timed out after {timeout}s")
+        metrics.inc("fetch_errors_total", source=name, reason="timeout")
+    except requests.RequestException as e:
+        logger.info(f"{name}: {e!r}")
+        metrics.inc("fetch_errors_total", source=name, reason="error")
+    except Exception as e:
+        # a broken parser or page must not take the other sources' results with it
+        logger.exception(f"{name}: failed")
+        metrics.inc("fetch_errors_total", source=name, reason=type(e).__name__)
+    return []
+
+
+async def _walk_pages(
+    parser: Type[FreeProxyParser],
+    timeout: float,
+    pipeline: Optional[ParsePipeline],
+    query: Optional[ProxyQuery],
+    deadline: Optional[float] = Config.PAGE_WALK_DEADLINE,
+) -> List[ProxyAddress]:
+    """All pages of ``parser`` within ``deadline`` seconds in total; ``timeout`` only bounds each page."""
+    proxies: List[ProxyAddress] = []
+
+    async def walk():
+        pages = stream_pages(parser, max_pages=parser.max_pages, timeout=timeout, pipeline=pipeline, query=query)
+        async for proxy in pages:
+            proxies.append(proxy)
+
+    try:
+        await asyncio.wait_for(walk(), deadline)
+    except asyncio.TimeoutError:
+        logger.info(f"{parser.name}: stopped paging after {deadline}s with {len(proxies)} proxies")
+        metrics.inc("fetch_errors_total", source=parser.name, reason="timeout")
+    return proxies
+
+
+async def fetch_proxies(
+    sites: Optional[Iterable[str]] = None,
+    timeout: Optional[float] = None,
+    workers: Optional[int] = None,
+    query: Optional[ProxyQuery] = None,
+    deadline: Optional[float] = Config.FETCH_DEADLINE,
+) -> List[ProxyAddress]:
+    """Fetch the selected sources concurrently, parsing and merging each response as soon as it arrives.
+
+    Endpoints listed by several sources come back once, with their records combined.
+    Requests are retried and hedged by :data:`policy`; a source that still fails or exceeds its
+    timeout contributes no proxies, and the others are unaffected. After ``deadline`` seconds the
+    sources still running are cancelled and the proxies of those that finished are returned.
+    With ``workers`` (default ``Config.PARSE_WORKERS``) responses are parsed in that many processes
+    through a :class:`ParsePipeline`; with 0 they are parsed on the event loop. The parsers drop
+    the rows that the :func:`merge_safe` part of ``query`` rejects. The full query is applied
+    after merging, so the result is the same as filtering the merged proxies.
+    """
+    workers = Config.PARSE_WORKERS if workers is None else workers
+    merged = ProxyMerger()
+    async with AsyncExitStack() as stack:
+        pipeline = await stack.enter_async_context(ParsePipeline(workers)) if workers else None
+        names = select_sources(sites)
+        pushed = merge_safe(query)
+        tasks = [asyncio.ensure_future(fetch_source(name, timeout, pipeline, pushed)) for name in names]
+        try:
+            for future in asyncio.as_completed(tasks, timeout=deadline):
+                merged.extend(await future)
+        except asyncio.TimeoutError:
+            late = [name for name, task in zip(names, tasks) if not task.done()]
+            logger.info(f"Refresh deadline of {deadline}s passed, dropping {', '.join(late)}")
+            for name in late:
+                metrics.inc("fetch_errors_total", source=name, reason="deadline")
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    return list(query.filter(merged)) if query is not None else merged.values()
+
+
+async def replay_proxies(
+    sites: Optional[Iterable[str]] = None,
+    query: Optional[ProxyQuery] = None,
+    cache: Optional[ResponseCache] = None,
+) -> List[ProxyAddress]:
+    """Like :func:`fetch_proxies`, but from the latest cached responses of each source, without any request."""
+    cache = cache or get_response_cache()
+    if cache is None:
+        return []
+    merged = ProxyMerger()
+    pushed = merge_safe(query)
+    for name in select_sources(sites):
+        for url, digest, encoding in cache.latest(name):
+            content = cache.load(digest)
+            if content is None:
+                continue
+            response = RawResponse(content, 200, url, encoding)
+            merged.extend((await _parse_cached(cache, digest, name, response, None, pushed))[1])
+    proxies = list(query.filter(merged)) if query is not None else merged.values()
+    logger.info(f"Replayed {len(proxies)} cached proxies")
+    return proxies
+
+
+async def _fetch_page(
+    parser: Type[FreeProxyParser],
+    page: int,
+    page_size: int,
+    timeout: float,
+    pipeline: Optional[ParsePipeline],
+    query: Optional[ProxyQuery] = None,
+) -> Tuple[int, Optional[int], Optional[List[ProxyAddress]]]:
+    if not parser.page_url:
+        raise ValueError(f"{parser.name} is not a paginated source")
+    url = parser.page_url.format(limit=page_size, page=page)
+    try:
+        with metrics.timer("fetch_seconds", source=parser.name):
+            response = await asyncio.wait_for(policy.fetch(parser.name, url, timeout), timeout)
+        if response.status_code != 200:
+            logger.info(f"Response: [{response.status_code}] : {response.url}")
+            metrics.inc("fetch_errors_total", source=parser.name, reason="status")
+            return page, None, None
+        total, proxies = await parse_response(parser.name, response, pipeline, query)
+    except Exception as e:
+        logger.info(f"{parser.name} page {page}: {e!r}")
+        metrics.inc("fetch_errors_total", source=parser.name, reason=type(e).__name__)
+        return page, None, None
+    return page, total, proxies
+
+
+async def stream_pages(
+    parser: Type[FreeProxyParser],
+    limit: Optional[int] = None,
+    predicate: Optional[Callable[[ProxyAddress], bool]] = None,
+    concurrency: int = Config.GEO_NODE_CONCURRENCY,
+    max_pages: Optional[int] = None,
+    page_size: Optional[int] = None,
+    timeout: Optional[float] = None,
+    pipeline: Optional[ParsePipeline] = None,
+    query: Optional[ProxyQuery] = None,
+) -> AsyncGenerator[ProxyAddress, None]:
+    """Yield a paginated source's proxies page by page while later pages are still loading.
+
+    The first page is fetched alone, since it usually reports the total. After that at most
+    ``concurrency`` pages are in flight, and a new one is only requested once the caller has
+    consumed a finished page. Iteration stops after ``limit`` proxies accepted by ``predicate``
+    and ``query``.
+
+    ``query`` is only pushed into the parser once the source has reported a total: until then an
+    empty page marks the end, and a page emptied by the query must not look like one.
+    """
+    timeout = source_timeout(parser.name, timeout)
+    page_size = page_size or parser.page_size
+    last_page = max_pages or math.inf
+    next_page = 1
+    count = 0
+    total_known = False
+    in_flight: Set[asyncio.Future] = set()
+
+    def schedule():
+        nonlocal next_page
+        width = concurrency if next_page > 1 else 1
+        pushed = query if total_known else None
+        while len(in_flight) < width and next_page <= last_page:
+            fetching = _fetch_page(parser, next_page, page_size, timeout, pipeline, pushed)
+            in_flight.add(asyncio.ensure_future(fetching))
+            next_page += 1
+
+    try:
+        schedule()
+        while in_flight:
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                in_flight.discard(task)
+                page, total, proxies = task.result()
+                if total is not None:
+                    total_known = True
+                    last_page = min(last_page, math.ceil(total / page_size))
+                if proxies is not None and not proxies and not (total_known and query is not None):
+                    last_page = min(last_page, page - 1)
+                if proxies is None and not total_known:
+                    # without a total a failed page is the only end marker we get
+                    last_page = min(last_page, page - 1)
+
+                for proxy in proxies or []:
+                    if predicate is not None and not predicate(proxy):
+                        continue
+                    if query is not None and not query.matches(proxy):
+                        continue
+                    yield proxy
+                    count += 1
+                    if limit is not None and count >= limit:
+                        return
+            schedule()
+    finally:
+        for task in in_flight:
+            task.cancel()
+        await asyncio.gather(*in_flight, return_exceptions=True)
+
+
+def stream_geonode(
+    limit: Optional[int] = None,
+    predicate: Optional[Callable[[ProxyAddress], bool]] = None,
+    concurrency: int = Config.GEO_NODE_CONCURRENCY,
+    max_pages: Optional[int] = Config.GEO_NODE_MAX_PAGES,
+    page_size: int = Config.GEO_NODE_PAGE_SIZE,
+    timeout: Optional[float] = None,
+) -> AsyncGenerator[ProxyAddress, None]:
+    return stream_pages(GeoNodeProxyParser, limit, predicate, concurrency, max_pages, page_size, timeout)
+
+
+def iter_geonode(*args, **kwargs) -> Iterator[ProxyAddress]:
+    """Blocking generator over :func:`stream_geonode`."""
+    loop = asyncio.new_event_loop()
+    stream = stream_geonode(*args, **kwargs)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(stream.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(stream.aclose())
+        loop.close()
@@ -0,0 +1,211 @@
+"""Local HTTP/SOCKS5 front-end proxy that spreads connections over the harvested pool."""
+import asyncio
+import logging
+import socket
+import struct
+import time
+from typing import Awaitable, Callable, List, Optional
+from urllib.parse import urlsplit
+
+from .address import Protocol, ProxyAddress
+from .rotator import NoProxyAvailable, ProxyRotator
+from .settings import Config
+from .validator import ProxyError, Streams, open_tunnel
+
+logger = logging.getLogger("forwarder")
+
+UPSTREAM_ERRORS = (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ProxyError)
+
+_BAD_GATEWAY = b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+
+
+class ForwardingProxy:
+    """Accept HTTP (plain and CONNECT) and SOCKS5 clients and forward each through a pool proxy.
+
+    The upstream for every connection comes from ``rotator``; if it cannot be reached the next
+    one is tried, up to ``retries`` times, before the client gets an error. Once both sides are
+    connected, bytes are relayed in chunks of up to ``Config.FORWARD_BUFFER_SIZE``.
+    """
+
+    def __init__(
+        self,
+        rotator: ProxyRotator,
+        host: str = Config.FORWARD_HOST,
+        port: int = Config.FORWARD_PORT,
+        retries: int = Config.FORWARD_RETRIES,
+        connect_timeout: float = Config.CHECK_CONNECT_TIMEOUT,
+    ):
+        self.rotator = rotator
+        self.host = host
+        self.port = port
+        self.retries = retries
+        self.connect_timeout = connect_timeout
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> "ForwardingProxy":
+        server = await asyncio.start_server(self._handle, self.host, self.port, limit=Config.FORWARD_BUFFER_SIZE)
+        self.server = server
+        self.port = server.sockets[0].getsockname()[1]
+        logger.info(f"Forwarding proxy on {self.host}:{self.port}")
+        return self
+
+    async def serve_forever(self) -> None:
+        if self.server is None:
+            raise RuntimeError("forwarding proxy is not started")
+        await self.server.serve_forever()
+
+    async def stop(self) -> None:
+        if self.server is None:
+            return
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            first = await reader.readexactly(1)
+            if first == b"\x05":
+                upstream = await self._accept_socks5(reader, writer)
+            else:
+                upstream = await self._accept_http(first, reader, writer)
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+            logger.debug(f"client handshake failed: {e!r}")
+            upstream = None
+        if upstream is None:
+            writer.close()
+            return
+        try:
+            await asyncio.gather(relay(reader, upstream[1]), relay(upstream[0], writer))
+        finally:
+            upstream[1].close()
+            writer.close()
+
+    async def _accept_socks5(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> Optional[Streams]:
+        methods = await reader.readexactly((await reader.readexactly(1))[0])
+        if 0 not in methods:
+            writer.write(b"\x05\xff")
+            return None
+        writer.write(b"\x05\x00")
+
+        _, command, _, address_type = await reader.readexactly(4)
+        if address_type == 1:
+            host = socket.inet_ntoa(await reader.readexactly(4))
+        elif address_type == 4:
+            host = socket.inet_ntop(socket.AF_INET6, await reader.readexactly(16))
+        else:
+            host = (await reader.readexactly((await reader.readexactly(1))[0])).decode()
+        port = struct.unpack("!H", await reader.readexactly(2))[0]
+        if command != 1:
+            writer.write(b"\x05\x07\x00\x01" + bytes(6))
+            return None
+
+        upstream = await self._connect(lambda proxy: open_tunnel(proxy, host, port, self.connect_timeout))
+        writer.write((b"\x05\x00" if upstream else b"\x05\x01") + b"\x00\x01" + bytes(6))
+        return upstream
+
+    async def _accept_http(
+        self, first: bytes, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> Optional[Streams]:
+        request_line = first + await reader.readline()
+        head = [request_line]
+        while head[-1] not in (b"\r\n", b"\n", b""):
+            head.append(await reader.readline())
+        method, target, version = request_line.decode("latin-1").split()
+
+        if method == "CONNECT":
+            host, port = target.rsplit(":", 1)
+            upstream = await self._connect(lambda proxy: open_tunnel(proxy, host, int(port), self.connect_timeout))
+            writer.write(b"HTTP/1.1 200 Connection established\r\n\r\n" if upstream else _BAD_GATEWAY)
+            return upstream
+
+        parts = urlsplit(target)
+        hostname = parts.hostname
+        if not hostname:
+            raise ValueError(f"not an absolute URL: {target}")
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        origin_form = f"{method} {path} {version}\r\n".encode("latin-1")
+
+        async def connect(proxy: ProxyAddress) -> Streams:
+            # HTTPS proxies take plain requests in absolute form too, and many refuse CONNECT to port 80
+            if proxy.protocol in (Protocol.HTTP, Protocol.HTTPS, Protocol.UNKNOWN):
+                connection = asyncio.open_connection(proxy.ip, int(proxy.port), limit=Config.FORWARD_BUFFER_SIZE)
+                streams = await asyncio.wait_for(connection, self.connect_timeout)
+                streams[1].write(b"".join(head))
+            else:
+                streams = await open_tunnel(proxy, hostname, parts.port or 80, self.connect_timeout)
+                streams[1].write(origin_form + b"".join(head[1:]))
+            return streams
+
+        upstream = await self._connect(connect)
+        if upstream is None:
+            writer.write(_BAD_GATEWAY)
+        return upstream
+
+    async def _connect(self, connect: Callable[[ProxyAddress], Awaitable[Streams]]) -> Optional[Streams]:
+        for _ in range(self.retries + 1):
+            try:
+                proxy = self.rotator.acquire()
+            except NoProxyAvailable as e:
+                logger.info(f"No upstream: {e}")
+                return None
+            start = time.perf_counter()
+            try:
+                streams = await connect(proxy)
+            except UPSTREAM_ERRORS as e:
+                logger.debug(f"{proxy.ip}:{proxy.port} failed: {e!r}")
+                self.rotator.report(proxy, False)
+                continue
+            self.rotator.report(proxy, True, (time.perf_counter() - start) * 1000)
+            return streams
+        return None
+
+
+async def relay(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Copy ``reader`` to ``writer`` until EOF, in chunks as large as the transport has buffered.
+
+    EOF is passed on as a half close where the transport supports it, so the other direction keeps
+    flowing; the caller closes both sides once both directions are done. An error closes ``writer``
+    at once, which also ends the opposite direction.
+    """
+    writer.transport.set_write_buffer_limits(high=Config.FORWARD_BUFFER_SIZE)
+    try:
+        while True:
+            data = await reader.read(Config.FORWARD_BUFFER_SIZE)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+        if writer.can_write_eof():
+            writer.write_eof()
+        else:
+            writer.close()
+    except OSError:
+        writer.close()
+
+
+def forward(
+    refresh: Callable[[], List[ProxyAddress]],
+    host: str = Config.FORWARD_HOST,
+    port: int = Config.FORWARD_PORT,
+    interval: float = Config.DAEMON_REFRESH_INTERVAL,
+) -> None:
+    """Run a forwarding proxy whose pool is replaced with ``refresh()`` every ``interval`` seconds."""
+
+    async def main(rotator: ProxyRotator):
+        proxy = await ForwardingProxy(rotator, host, port).start()
+        loop = asyncio.get_running_loop()
+
+        async def refresher():
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    rotator.update(await loop.run_in_executor(None, refresh))
+                    logger.info(f"Rotation refreshed: {len(rotator)}")
+                except Exception:
+                    logger.exception("Rotation refresh failed, keeping previous pool")
+
+        return await asyncio.gather(proxy.serve_forever(), refresher())
+
+    try:
+        asyncio.run(main(ProxyRotator(refresh())))
+    except KeyboardInterrupt:
+        pass
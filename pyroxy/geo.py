@@ -0,0 +1,263 @@
+"""Country and ASN lookup from a local IP range database."""
+import csv
+import logging
+from array import array
+from bisect import bisect_right
+from dataclasses import replace
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from .address import ProxyAddress
+from .countries import COUNTRY_NAMES
+from .settings import Config
+from .store import pack_ip
+
+logger = logging.getLogger("geo")
+
+# names the sources use that differ from the database's English country names
+COUNTRY_ALIASES = {
+    "bolivia, plurinational state of": "BO",
+    "congo, the democratic republic of the": "CD",
+    "czech republic": "CZ",
+    "great britain": "GB",
+    "iran, islamic republic of": "IR",
+    "korea, republic of": "KR",
+    "lao people's democratic republic": "LA",
+    "macedonia": "MK",
+    "moldova, republic of": "MD",
+    "palestine, state of": "PS",
+    "republic of korea": "KR",
+    "russian federation": "RU",
+    "syrian arab republic": "SY",
+    "taiwan, province of china": "TW",
+    "tanzania, united republic of": "TZ",
+    "uk": "GB",
+    "united states of america": "US",
+    "usa": "US",
+    "venezuela, bolivarian republic of": "VE",
+    "viet nam": "VN",
+}
+
+
+class GeoInfo(NamedTuple):
+    country: Optional[str]
+    asn: Optional[int]
+    organization: Optional[str]
+
+
+class RangeIndex:
+    """Sorted, non-overlapping IPv4 ranges mapped to integers, looked up with one bisect."""
+
+    def __init__(self, ranges: Iterable[Tuple[int, int, int]]):
+        self.starts = array("I")
+        self.ends = array("I")
+        self.values = array("I")
+        for start, end, value in sorted(ranges):
+            self.starts.append(start)
+            self.ends.append(end)
+            self.values.append(value)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def lookup(self, ip: int) -> Optional[int]:
+        i = bisect_right(self.starts, ip) - 1
+        if i >= 0 and ip <= self.ends[i]:
+            return self.values[i]
+        return None
+
+
+def parse_network(network: str) -> Optional[Tuple[int, int]]:
+    """First and last address of an IPv4 CIDR block as integers, None for IPv6 or garbage."""
+    ip, _, bits = network.partition("/")
+    try:
+        start = pack_ip(ip)
+        size = 1 << (32 - int(bits or 32))
+    except (OSError, ValueError):
+        return None
+    start &= ~(size - 1) & 0xFFFFFFFF
+    return start, start + size - 1
+
+
+def normalize_country(value: Optional[str], names: Optional[Dict[str, str]] = None) -> Optional[str]:
+    """ISO 3166 alpha-2 code for a code or an English country name, None if it is not recognised."""
+    value = (value or "").strip()
+    key = value.lower()
+    # aliases first: some of them, like "uk", look like codes but are not the ISO one
+    if key in COUNTRY_ALIASES:
+        return COUNTRY_ALIASES[key]
+    if len(value) == 2 and value.isalpha():
+        return value.upper()
+    return (names or {}).get(key) or COUNTRY_NAMES.get(key)
+
+
+class GeoIndex:
+    """Country and ASN of IPv4 addresses, from GeoLite2 style CSV files or MMDB databases.
+
+    Each database becomes a :class:`RangeIndex`, so a lookup is two binary searches over
+    contiguous arrays and millions of networks cost a few bytes each.
+    """
+
+    def __init__(
+        self,
+        countries: Optional[RangeIndex] = None,
+        country_codes: Optional[List[str]] = None,
+        asns: Optional[RangeIndex] = None,
+        organizations: Optional[Dict[int, str]] = None,
+        names: Optional[Dict[str, str]] = None,
+    ):
+        self.countries = countries or RangeIndex(())
+        self.country_codes = country_codes or []
+        self.asns = asns or RangeIndex(())
+        self.organizations = organizations or {}
+        # lower case country name to code
+        self.names = names or {}
+
+    @classmethod
+    def from_csv(
+        cls,
+        country_blocks: Optional[Union[str, Path]] = None,
+        country_locations: Optional[Union[str, Path]] = None,
+        asn_blocks: Optional[Union[str, Path]] = None,
+    ) -> "GeoIndex":
+        """Load the ``Country-Blocks-IPv4``, ``Country-Locations`` and ``ASN-Blocks-IPv4`` CSV files given."""
+        codes: Dict[str, str] = {}
+        names: Dict[str, str] = {}
+        if country_locations:
+            for row in _read_csv(country_locations):
+                if row.get("country_iso_code"):
+                    codes[row["geoname_id"]] = row["country_iso_code"]
+                    if row.get("country_name"):
+                        names[row["country_name"].lower()] = row["country_iso_code"]
+
+        country_codes: List[str] = []
+        country_ranges = []
+        if country_blocks:
+            code_values: Dict[str, int] = {}
+            for row in _read_csv(country_blocks):
+                code = codes.get(row["geoname_id"] or row.get("registered_country_geoname_id", ""))
+                network = parse_network(row["network"])
+                if code is None or network is None:
+                    continue
+                value = code_values.get(code)
+                if value is None:
+                    value = code_values[code] = len(country_codes)
+                    country_codes.append(code)
+                country_ranges.append((*network, value))
+
+        organizations: Dict[int, str] = {}
+        asn_ranges = []
+        if asn_blocks:
+            for row in _read_csv(asn_blocks):
+                network = parse_network(row["network"])
+                if network is None or not row["autonomous_system_number"]:
+                    continue
+                asn = int(row["autonomous_system_number"])
+                organizations.setdefault(asn, row.get("autonomous_system_organization") or "")
+                asn_ranges.append((*network, asn))
+
+        index = cls(RangeIndex(country_ranges), country_codes, RangeIndex(asn_ranges), organizations, names)
+        logger.info(f"Loaded {len(index.countries)} country and {len(index.asns)} ASN networks")
+        return index
+
+    @classmethod
+    def from_mmdb(
+        cls, country_db: Optional[Union[str, Path]] = None, asn_db: Optional[Union[str, Path]] = None
+    ) -> "GeoIndex":
+        """Load GeoLite2 Country and ASN ``.mmdb`` databases; needs the optional ``maxminddb`` package."""
+        try:
+            import maxminddb  # type: ignore[import]
+        except ImportError:
+            raise ImportError("Reading .mmdb databases needs the maxminddb package: pip install maxminddb")
+
+        country_codes: List[str] = []
+        code_values: Dict[str, int] = {}
+        names: Dict[str, str] = {}
+        country_ranges = []
+        for network, record in _mmdb_networks(maxminddb, country_db):
+            country = record.get("country") or record.get("registered_country") or {}
+            code = country.get("iso_code")
+            if not code:
+                continue
+            name = country.get("names", {}).get("en")
+            if name:
+                names[name.lower()] = code
+            value = code_values.get(code)
+            if value is None:
+                value = code_values[code] = len(country_codes)
+                country_codes.append(code)
+            country_ranges.append((*network, value))
+
+        organizations: Dict[int, str] = {}
+        asn_ranges = []
+        for network, record in _mmdb_networks(maxminddb, asn_db):
+            asn = record.get("autonomous_system_number")
+            if asn:
+                organizations.setdefault(asn, record.get("autonomous_system_organization") or "")
+                asn_ranges.append((*network, asn))
+
+        return cls(RangeIndex(country_ranges), country_codes, RangeIndex(asn_ranges), organizations, names)
+
+    @classmethod
+    def load(cls, directory: Union[str, Path] = Config.GEO_DIR) -> Optional["GeoIndex"]:
+        """Load whichever GeoLite2 databases are in ``directory``, MMDB first; None if there are none."""
+        directory = Path(directory)
+        mmdb = [directory / name for name in (Config.GEO_COUNTRY_MMDB, Config.GEO_ASN_MMDB)]
+        if any(path.exists() for path in mmdb):
+            return cls.from_mmdb(*(path if path.exists() else None for path in mmdb))
+        names = (Config.GEO_COUNTRY_BLOCKS, Config.GEO_COUNTRY_LOCATIONS, Config.GEO_ASN_BLOCKS)
+        csv_files = [directory / name for name in names]
+        if any(path.exists() for path in csv_files):
+            return cls.from_csv(*(path if path.exists() else None for path in csv_files))
+        return None
+
+    def lookup(self, ip: str) -> GeoInfo:
+        try:
+            address = pack_ip(ip)
+        except (OSError, TypeError):
+            return GeoInfo(None, None, None)
+        value = self.countries.lookup(address)
+        asn = self.asns.lookup(address)
+        return GeoInfo(
+            None if value is None else self.country_codes[value],
+            asn,
+            None if asn is None else self.organizations.get(asn),
+        )
+
+    def normalize(self, country: Optional[str]) -> Optional[str]:
+        return normalize_country(country, self.names)
+
+    def country(self, proxy: ProxyAddress) -> Optional[str]:
+        """Country code of ``proxy`` from the database, else the normalised country its source gave."""
+        return self.lookup(proxy.ip).country or self.normalize(proxy.country)
+
+    def enrich(self, proxies: Iterable[ProxyAddress]) -> List[ProxyAddress]:
+        """Copies of ``proxies`` with ``country`` replaced by a two letter code where one is known."""
+        enriched = []
+        for proxy in proxies:
+            country = self.country(proxy)
+            enriched.append(proxy if country is None or country == proxy.country else replace(proxy, country=country))
+        return enriched
+
+
+def _read_csv(path: Union[str, Path]) -> Iterable[dict]:
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+
+def _mmdb_networks(maxminddb, path: Optional[Union[str, Path]]) -> Iterable[Tuple[Tuple[int, int], dict]]:
+    if not path:
+        return
+    with maxminddb.open_database(str(path)) as reader:
+        for network, record in reader:
+            if network.version == 6:
+                # IPv4 space is embedded in IPv6 databases at ::/96
+                if int(network.network_address) >> 32 or network.prefixlen < 96:
+                    continue
+                start, size = int(network.network_address), 1 << (128 - network.prefixlen)
+            elif network.version == 4:
+                start, size = int(network.network_address), network.num_addresses
+            else:
+                continue
+            if record:
+                yield (start, start + size - 1), record
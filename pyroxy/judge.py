@@ -0,0 +1,203 @@
+"""Proxy judge: an echo endpoint that shows what a proxy leaks, and the checker that reads it."""
+import asyncio
+import json
+import logging
+import re
+from dataclasses import replace
+from typing import Iterable, Iterator, List, Optional
+
+from .address import Anonymity, ProxyAddress
+from .metrics import metrics
+from .settings import Config
+from .validator import CHECK_ERRORS, ProxyChecker, ProxyError, target_address
+
+logger = logging.getLogger("judge")
+
+# headers only a proxy adds; any of them gives the proxy away even when our address does not leak
+PROXY_HEADERS = frozenset(
+    [
+        "via",
+        "forwarded",
+        "x-forwarded-for",
+        "x-forwarded-host",
+        "x-forwarded-proto",
+        "x-real-ip",
+        "x-proxy-id",
+        "x-bluecoat-via",
+        "client-ip",
+        "true-client-ip",
+        "proxy-connection",
+        "proxy-agent",
+        "cache-control-via",
+    ]
+)
+
+# headers of our own request, which name the judge and not us
+_REQUEST_HEADERS = frozenset(["host", "connection"])
+_VALUE_SEPARATORS = re.compile(r'[\s,;="\[\]]+')
+
+
+def classify(headers: dict, origin: str, ip: Optional[str] = None) -> Anonymity:
+    """Anonymity of a proxy from the request headers the judge received through it, and the address it came from.
+
+    ``NOA`` if the request came from our own address ``origin`` or any header carries it, ``ANM``
+    if the proxy announced itself with one of :data:`PROXY_HEADERS`, else ``HIA``.
+    """
+    headers = {name.lower(): value for name, value in headers.items() if name.lower() not in _REQUEST_HEADERS}
+    if origin and ip == origin:
+        return Anonymity.NOA
+    if origin and any(origin in _VALUE_SEPARATORS.split(value) for value in headers.values()):
+        return Anonymity.NOA
+    if PROXY_HEADERS.intersection(headers):
+        return Anonymity.ANM
+    return Anonymity.HIA
+
+
+class JudgeServer:
+    """Answer every ``GET`` with JSON of the client address and the request headers it arrived with.
+
+    Proxies under test must be able to reach it, so outside of tests it listens on all interfaces.
+    """
+
+    def __init__(self, host: str = Config.JUDGE_HOST, port: int = Config.JUDGE_PORT):
+        self.host = host
+        self.port = port
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def url(self) -> str:
+        host = "127.0.0.1" if self.host in ("0.0.0.0", "") else self.host
+        return f"http://{host}:{self.port}/"
+
+    async def start(self) -> "JudgeServer":
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        logger.info(f"Proxy judge on {self.host}:{self.port}")
+        return self
+
+    async def stop(self) -> None:
+        if self.server is None:
+            return
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            await reader.readline()
+            headers = {}
+            for _ in range(Config.JUDGE_MAX_HEADERS):
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip()] = value.strip()
+            peer = writer.get_extra_info("peername")
+            body = json.dumps({"ip": peer[0] if peer else None, "headers": headers}).encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        except (OSError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+def serve(host: str = Config.JUDGE_HOST, port: int = Config.JUDGE_PORT) -> None:
+    async def main():
+        judge = await JudgeServer(host, port).start()
+        await judge.server.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+
+class ProxyJudge(ProxyChecker):
+    """Relabel the anonymity of many proxies at once from what they reveal to the judge at ``url``.
+
+    Our own address is what the judge sees on a direct request, unless ``origin`` is given. The
+    judge should be a plain ``http`` URL: HTTP and HTTPS proxies then get the request itself and
+    can add headers to it, while a tunnel carries it untouched and always looks elite.
+    """
+
+    def __init__(self, url: str, origin: Optional[str] = None, **kwargs):
+        super().__init__(url, **kwargs)
+        self.origin = origin
+
+    async def echo(self, proxy: Optional[ProxyAddress] = None) -> dict:
+        """What the judge saw of one request through ``proxy``, or of a direct one."""
+        if proxy is None:
+            host, port, _ = target_address(self.url)
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), self.connect_timeout)
+            writer.write(f"GET {self.url} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+        else:
+            reader, writer = await self.send_request(proxy)
+        try:
+            response = await asyncio.wait_for(_read_all(reader, Config.JUDGE_MAX_RESPONSE), self.read_timeout)
+        finally:
+            writer.close()
+        head, _, body = response.partition(b"\r\n\r\n")
+        if not head.startswith(b"HTTP/") or head.split(None, 2)[1:2] != [b"200"]:
+            raise ProxyError(f"Judge answered {head[:40]!r}")
+        return json.loads(body)
+
+    async def judge(self, proxy: ProxyAddress) -> Optional[Anonymity]:
+        """The anonymity ``proxy`` really offers, None if the judge could not be reached through it."""
+        try:
+            origin = self.origin
+            if origin is None:
+                origin = self.origin = (await self.echo())["ip"]
+            echo = await self.echo(proxy)
+            # a proxy on our own host always reaches the judge from our address
+            ip = echo["ip"] if proxy.ip != origin else None
+            anonymity = classify(echo["headers"], origin, ip)
+        except CHECK_ERRORS + (KeyError, TypeError, AttributeError) as e:
+            logger.debug(f"{proxy.ip}:{proxy.port} not judged: {e!r}")
+            anonymity = None
+        metrics.inc("judge_checks_total", result="failed" if anonymity is None else anonymity.name)
+        return anonymity
+
+    async def relabel(self, proxies: Iterable[ProxyAddress]) -> List[ProxyAddress]:
+        """Return the proxies that reached the judge with their measured anonymity, dropping the rest."""
+        if self.origin is None:
+            self.origin = (await self.echo())["ip"]
+        pending: Iterator[ProxyAddress] = iter(proxies)
+        judged: List[ProxyAddress] = []
+
+        async def worker():
+            for proxy in pending:
+                anonymity = await self.judge(proxy)
+                if anonymity is None:
+                    continue
+                if anonymity != proxy.anonymity:
+                    metrics.inc("judge_relabelled_total", claimed=proxy.anonymity.name, measured=anonymity.name)
+                    proxy = replace(proxy, anonymity=anonymity)
+                judged.append(proxy)
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        logger.info(f"Judged : {len(judged)} reachable")
+        return judged
+
+
+async def _read_all(reader: asyncio.StreamReader, limit: int) -> bytes:
+    chunks = []
+    size = 0
+    while size < limit:
+        chunk = await reader.read(limit - size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size += len(chunk)
+    return b"".join(chunks)
+
+
+def judge_proxies(
+    proxies: Iterable[ProxyAddress], url: Optional[str] = Config.JUDGE_URL, origin: Optional[str] = None, **kwargs
+) -> List[ProxyAddress]:
+    if url is None:
+        raise ValueError("No judge URL: pass one or set Config.JUDGE_URL")
+    return asyncio.run(ProxyJudge(url, origin, **kwargs).relabel(proxies))
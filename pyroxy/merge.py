@@ -0,0 +1,146 @@
+"""Cross-source deduplication of proxies."""
+import re
+import time
+from dataclasses import replace
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from .address import Anonymity, Protocol, ProxyAddress, Speed, SpeedType
+from .query import ProxyQuery
+
+MergeKey = Tuple[str, int, Protocol]
+
+# an HTTPS-capable proxy also serves plain HTTP, so both are the same endpoint
+_PROTOCOL_FAMILY = {
+    Protocol.UNKNOWN: Protocol.HTTP,
+    Protocol.HTTP: Protocol.HTTP,
+    Protocol.HTTPS: Protocol.HTTP,
+    Protocol.SOCKS4: Protocol.SOCKS4,
+    Protocol.SOCKS5: Protocol.SOCKS5,
+}
+_PROTOCOL_RANK = {Protocol.UNKNOWN: 0, Protocol.HTTP: 1, Protocol.HTTPS: 2, Protocol.SOCKS4: 1, Protocol.SOCKS5: 1}
+
+_AGO = re.compile(r"(\d+)\s*(sec|min|hour|day)", re.IGNORECASE)
+_AGO_SECONDS = {"sec": 1, "min": 60, "hour": 3600, "day": 86400}
+
+
+def normalize(proxy: ProxyAddress) -> ProxyAddress:
+    """Give every source's record the same types: an int port and stripped strings."""
+    ip = proxy.ip.strip()
+    country = proxy.country.strip() if proxy.country else proxy.country
+    if isinstance(proxy.port, int) and ip == proxy.ip and country == proxy.country:
+        return proxy
+    return replace(proxy, ip=ip, port=int(proxy.port), country=country)
+
+
+def merge_key(proxy: ProxyAddress) -> MergeKey:
+    return proxy.ip, int(proxy.port), _PROTOCOL_FAMILY[proxy.protocol]
+
+
+def updated_at(text: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Epoch seconds for an ISO timestamp or a relative "12 mins ago" string, None if unknown."""
+    if not text:
+        return None
+    try:
+        return datetime.fromisoformat(text.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        pass
+    match = _AGO.search(text)
+    if match is None:
+        return None
+    return (now or time.time()) - int(match.group(1)) * _AGO_SECONDS[match.group(2).lower()]
+
+
+def _better_speed(a, b):
+    """Prefer a ``Speed`` over a raw value or None, then the better of two comparable speeds."""
+    if not isinstance(a, Speed):
+        return b if isinstance(b, Speed) or a is None else a
+    if not isinstance(b, Speed) or b.speed_type != a.speed_type or b.value < 0:
+        return a
+    if a.value < 0:
+        return b
+    better = min if a.speed_type == SpeedType.TIME else max
+    return better(a, b, key=lambda speed: speed.value)
+
+
+def merge(known: ProxyAddress, other: ProxyAddress, now: Optional[float] = None) -> ProxyAddress:
+    """Combine two records of the same endpoint, keeping the best information of each.
+
+    The richer protocol wins (HTTPS over HTTP), the newest ``updated`` wins, speeds keep the best
+    measured value, and for anonymity a known level beats UNKNOWN but the weaker of two known
+    levels is kept, since free lists tend to overstate it.
+    """
+    protocol = other.protocol if _PROTOCOL_RANK[other.protocol] > _PROTOCOL_RANK[known.protocol] else known.protocol
+
+    if known.anonymity == Anonymity.UNKNOWN or other.anonymity == Anonymity.UNKNOWN:
+        anonymity = known.anonymity if other.anonymity == Anonymity.UNKNOWN else other.anonymity
+    else:
+        anonymity = Anonymity(max(known.anonymity.value, other.anonymity.value))
+
+    updated = known.updated
+    known_at, other_at = updated_at(known.updated, now), updated_at(other.updated, now)
+    if other_at is not None and (known_at is None or other_at > known_at):
+        updated = other.updated
+
+    return ProxyAddress(
+        known.ip,
+        known.port,
+        protocol,
+        known.country or other.country,
+        updated,
+        anonymity,
+        google=bool(known.google or other.google),
+        speed=_better_speed(known.speed, other.speed),
+        uptime=_better_speed(known.uptime, other.uptime),
+        response=_better_speed(known.response, other.response),
+        latency=_better_speed(known.latency, other.latency),
+    )
+
+
+def merge_safe(query: Optional[ProxyQuery]) -> Optional[ProxyQuery]:
+    """The part of ``query`` that may be pushed into the parsers without changing any merged proxy.
+
+    Any record dropped before merging could have weakened the anonymity, richened the protocol,
+    set ``google`` or given the country of its endpoint, so only records of another protocol
+    family, which never merge with the ones kept, are safe to drop. None when there is nothing
+    to drop, as for a query covering every family. The full query still has to be applied to
+    the merged proxies.
+    """
+    if query is None or query.protocols is None:
+        return None
+    families = {_PROTOCOL_FAMILY[protocol] for protocol in query.protocols}
+    if families == set(_PROTOCOL_FAMILY.values()):
+        return None
+    return ProxyQuery(frozenset(protocol for protocol, family in _PROTOCOL_FAMILY.items() if family in families))
+
+
+class ProxyMerger:
+    """Hash index of normalized proxies keyed on (ip, port, protocol family), merged as they arrive."""
+
+    def __init__(self, proxies: Iterable[ProxyAddress] = ()):
+        self._index: Dict[MergeKey, ProxyAddress] = {}
+        self.extend(proxies)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __iter__(self) -> Iterator[ProxyAddress]:
+        return iter(self._index.values())
+
+    def add(self, proxy: ProxyAddress) -> bool:
+        """Add ``proxy``; returns False if it was merged into an endpoint already seen."""
+        proxy = normalize(proxy)
+        key = merge_key(proxy)
+        known = self._index.get(key)
+        if known is None:
+            self._index[key] = proxy
+            return True
+        self._index[key] = merge(known, proxy)
+        return False
+
+    def extend(self, proxies: Iterable[ProxyAddress]) -> None:
+        for proxy in proxies:
+            self.add(proxy)
+
+    def values(self) -> list:
+        return list(self._index.values())
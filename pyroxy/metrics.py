@@ -0,0 +1,205 @@
+"""Process wide counters, gauges and timers with Prometheus and JSON exporters."""
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Type
+
+logger = logging.getLogger("metrics")
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+EXPORTERS: Dict[str, Type["MetricsExporter"]] = {}
+
+
+def _key(name: str, labels: Dict[str, object]) -> Key:
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+class Metrics:
+    """Named, labelled measurements of the fetch, parse, filter, validate and pool stages.
+
+    Every update takes one lock for a dictionary update, so instrumenting a hot path costs about
+    a microsecond and is safe from the executor threads that run fetches.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Key, float] = {}
+        self._gauges: Dict[Key, float] = {}
+        # count, sum and max of the observed durations in seconds
+        self._timers: Dict[Key, List[float]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            stats = self._timers.get(key)
+            if stats is None:
+                self._timers[key] = [1, seconds, seconds]
+            else:
+                stats[0] += 1
+                stats[1] += seconds
+                stats[2] = max(stats[2], seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def counter(self, name: str, **labels) -> float:
+        return self._counters.get(_key(name, labels), 0)
+
+    def gauge(self, name: str, **labels) -> Optional[float]:
+        return self._gauges.get(_key(name, labels))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            timers = {key: list(stats) for key, stats in self._timers.items()}
+        return {
+            "time": time.time(),
+            "counters": [{"name": n, "labels": dict(ls), "value": v} for (n, ls), v in sorted(counters.items())],
+            "gauges": [{"name": n, "labels": dict(ls), "value": v} for (n, ls), v in sorted(gauges.items())],
+            "timers": [
+                {"name": n, "labels": dict(ls), "count": c, "sum": s, "max": m}
+                for (n, ls), (c, s, m) in sorted(timers.items())
+            ],
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._timers.clear()
+
+
+metrics = Metrics()
+
+
+class MetricsExporter(ABC):
+    """Renders a :meth:`Metrics.snapshot`; subclasses that set ``name`` are registered as a format."""
+
+    name: Optional[str] = None
+    content_type = "text/plain"
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.__dict__.get("name"):
+            EXPORTERS[cls.name] = cls
+
+    @classmethod
+    @abstractmethod
+    def export(cls, snapshot: dict) -> str:
+        raise NotImplementedError
+
+
+class JSONExporter(MetricsExporter):
+    name = "json"
+    content_type = "application/json"
+
+    @classmethod
+    def export(cls, snapshot: dict) -> str:
+        return json.dumps(snapshot, indent=1)
+
+
+class PrometheusExporter(MetricsExporter):
+    """Prometheus text exposition format; timers become summaries without quantiles."""
+
+    name = "prometheus"
+    content_type = "text/plain; version=0.0.4"
+    prefix = "pyroxy_"
+
+    @classmethod
+    def export(cls, snapshot: dict) -> str:
+        lines = []
+        declared = set()
+
+        def declare(name: str, kind: str) -> None:
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# TYPE {cls.prefix}{name} {kind}")
+
+        for kind, section in (("counter", "counters"), ("gauge", "gauges")):
+            for entry in snapshot[section]:
+                declare(entry["name"], kind)
+                lines.append(f"{cls.prefix}{entry['name']}{_labels(entry['labels'])} {entry['value']}")
+        for entry in snapshot["timers"]:
+            name, labels = entry["name"], _labels(entry["labels"])
+            declare(name, "summary")
+            lines.append(f"{cls.prefix}{name}_count{labels} {entry['count']}")
+            lines.append(f"{cls.prefix}{name}_sum{labels} {entry['sum']}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def export(fmt: str = "prometheus", registry: Metrics = metrics) -> str:
+    return EXPORTERS[fmt].export(registry.snapshot())
+
+
+def write_metrics(path: str, fmt: Optional[str] = None, registry: Metrics = metrics) -> None:
+    """Write a snapshot to ``path``; the format defaults to JSON for ``.json`` files and Prometheus otherwise."""
+    fmt = fmt or ("json" if str(path).endswith(".json") else "prometheus")
+    with open(path, "w") as f:
+        f.write(export(fmt, registry))
+
+
+def start_profile(kind: str, output: str) -> Callable[[], None]:
+    """Start profiling the process with ``cprofile`` or ``tracemalloc``; the returned function stops it.
+
+    cProfile stats are dumped to ``output`` for ``pstats`` or snakeviz. For tracemalloc the snapshot
+    is dumped to ``output`` and the allocation sites holding the most memory are logged.
+    """
+    if kind == "cprofile":
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+        def stop():
+            profiler.disable()
+            profiler.dump_stats(output)
+            logger.info(f"cProfile stats written to {output}")
+
+        return stop
+
+    if kind == "tracemalloc":
+        import tracemalloc
+
+        tracemalloc.start(25)
+
+        def stop():
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            snapshot.dump(output)
+            logger.info(f"tracemalloc: {current / 2 ** 20:.1f} MiB in use, {peak / 2 ** 20:.1f} MiB peak")
+            for stat in snapshot.statistics("lineno")[:10]:
+                logger.info(f"tracemalloc: {stat}")
+
+        return stop
+
+    raise ValueError(f"Unknown profiler: {kind}")
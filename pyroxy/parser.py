@@ -1,77 +1,195 @@
 import base64
+import json
 import logging
+import os
+import re
 from abc import ABC, abstractmethod
-from os import listdir
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Union
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple, Type, Union
 
 from parsel import Selector
-from requests import Response
+from parsel.csstranslator import HTMLTranslator
 
-from .address import Anonymity, Protocol, ProxyAddress, Speed, SpeedType
+from .address import RECORD_VERSION, Anonymity, Protocol, ProxyAddress, Speed, SpeedType
+from .merge import ProxyMerger
+from .query import ProxyQuery
+from .settings import Config
+
+if TYPE_CHECKING:
+    from requests import Response
+
+    from .pipeline import RawResponse
 
 logger = logging.getLogger("parser")
 
+# what the parsers read: a fetched response, or the same fields rebuilt from cached bytes
+PageResponse = Union["Response", "RawResponse"]
+
+SOURCES: Dict[str, Type["FreeProxyParser"]] = {}
+
+PROTOCOLS = {
+    "HTTP": Protocol.HTTP,
+    "HTTPS": Protocol.HTTPS,
+    "SOCKS4": Protocol.SOCKS4,
+    "SOCKS5": Protocol.SOCKS5,
+}
+ANONYMITY = {
+    # No Anonymity
+    "transparent": Anonymity.NOA,
+    "level3": Anonymity.NOA,
+    # Anonymous
+    "anonymous": Anonymity.ANM,
+    "level2": Anonymity.ANM,
+    # High Anonymity
+    "elite": Anonymity.HIA,
+    "elite proxy": Anonymity.HIA,
+    "High anonymity": Anonymity.HIA,
+    "level1": Anonymity.HIA,
+}
+
+
+@lru_cache(maxsize=None)
+def css_to_xpath(css: str) -> str:
+    return HTMLTranslator().css_to_xpath(css)
+
+
+def table_rows(selector: Selector, css: str) -> Iterator[list]:
+    """Yield the ``td`` elements of every row matched by ``css``.
+
+    Rows are found with one XPath evaluation and cells are walked on the lxml tree directly,
+    instead of building a ``Selector`` and running a query for every cell.
+    """
+    for tr in selector.root.xpath(css_to_xpath(css)):
+        yield list(tr.iter("td"))
+
+
+def cell_text(td, tag: Optional[str] = None) -> str:
+    """Same result as ``td.css("::text").get("")``, or ``td.css(f"{tag}::text").get("")`` when ``tag`` is given."""
+    if tag is None:
+        return next(td.itertext(), "")
+    for element in td.iter(tag):
+        if element.text is not None:
+            return element.text
+        for child in element:
+            if child.tail is not None:
+                return child.tail
+    return ""
+
 
 class FreeProxyParser(ABC):
+    """Parser of one proxy list site.
+
+    Subclasses that set ``name`` are registered as a source under it: ``url`` is fetched and
+    handed to :meth:`parse`. A source with a ``page_url`` template (``{limit}`` and ``{page}``)
+    is read page by page through :meth:`parse_page` instead, up to ``max_pages`` pages (all when
+    None). Requests to a host are limited to the lowest ``rate_limit`` (per second) and ``burst``
+    declared by the sources on it. Sources with ``default = False`` are only fetched when asked for.
+
+    Both parse methods take an optional :class:`ProxyQuery`; rows it rejects are skipped before
+    their ``ProxyAddress`` is built. Bump ``version`` whenever a parser's output changes, so that
+    results cached from an older one are parsed again.
+    """
+
+    name: str = ""
+    url: Optional[str] = None
+    page_url: Optional[str] = None
+    page_size: int = 1
+    max_pages: Optional[int] = 1
+    rate_limit: float = Config.SOURCE_RATE_LIMIT
+    burst: int = Config.SOURCE_BURST
+    default: bool = True
+    version: int = 1
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.__dict__.get("name"):
+            register_source(cls)
+
     @classmethod
     @abstractmethod
-    def parse(cls, response: Response) -> List[ProxyAddress]:
+    def parse(cls, response: PageResponse, query: Optional[ProxyQuery] = None) -> List[ProxyAddress]:
         raise NotImplementedError
 
+    @classmethod
+    def parse_page(
+        cls, response: PageResponse, query: Optional[ProxyQuery] = None
+    ) -> Tuple[Optional[int], List[ProxyAddress]]:
+        """Proxies on one page and the total the source reports, if it does."""
+        return None, cls.parse(response, query)
+
+    @classmethod
+    def records_version(cls) -> str:
+        """Version of the records this parser produces, to store with cached results."""
+        return f"{RECORD_VERSION}.{cls.version}"
+
     @staticmethod
     def setup_protocol(protocol_text: str) -> Protocol:
-        protocol_map = {
-            "HTTP": Protocol.HTTP,
-            "HTTPS": Protocol.HTTPS,
-            "SOCKS4": Protocol.SOCKS4,
-            "SOCKS5": Protocol.SOCKS5,
-        }
-        return protocol_map.get(protocol_text.upper(), Protocol.UNKNOWN)
+        return PROTOCOLS.get(protocol_text.upper(), Protocol.UNKNOWN)
 
     @staticmethod
     def setup_anonymity(anonymity_text: str) -> Anonymity:
-        anonymous = {
-            # No Anonymity
-            "transparent": Anonymity.NOA,
-            "level3": Anonymity.NOA,
-            # Anonymous
-            "anonymous": Anonymity.ANM,
-            "level2": Anonymity.ANM,
-            # High Anonymity
-            "elite": Anonymity.HIA,
-            "elite proxy": Anonymity.HIA,
-            "High anonymity": Anonymity.HIA,
-            "level1": Anonymity.HIA,
-        }
-        return anonymous.get(anonymity_text, Anonymity.UNKNOWN)
+        return ANONYMITY.get(anonymity_text, Anonymity.UNKNOWN)
+
+
+def register_source(parser: Type[FreeProxyParser]) -> Type[FreeProxyParser]:
+    SOURCES[parser.name.lower()] = parser
+    return parser
+
+
+def _entry_points(group: str) -> list:
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:  # Python < 3.8
+        return []
+    found = entry_points()
+    if hasattr(found, "select"):
+        return list(found.select(group=group))
+    return list(found.get(group, []))
+
+
+def load_source_plugins(group: str = Config.SOURCE_ENTRY_POINT) -> None:
+    """Import the sources other packages declare in the ``pyroxy.sources`` entry point group.
+
+    An entry point may name a module defining ``FreeProxyParser`` subclasses or a subclass itself.
+    """
+    for entry_point in _entry_points(group):
+        try:
+            loaded = entry_point.load()
+        except Exception:
+            logger.exception(f"Failed to load proxy source plugin {entry_point.name}")
+            continue
+        if isinstance(loaded, type) and issubclass(loaded, FreeProxyParser) and loaded.name:
+            register_source(loaded)
 
 
 class FreeProxyNetParser(FreeProxyParser):
+    name = "freeproxy"
+    url = Config.FREE_PROXY_NET_URL
+
     @classmethod
-    def parse(cls, response: Response) -> List[ProxyAddress]:
+    def parse(cls, response: PageResponse, query: Optional[ProxyQuery] = None) -> List[ProxyAddress]:
         if response.status_code != 200:
             logger.info(f"Response: [{response.status_code}] : {response.url}")
             return []
 
-        selector = Selector(response.text)
-        p_rows = selector.css(".fpl-list > table tr")
-
         proxy_list = []
-        for tr in p_rows:
-            tds = tr.css("td")
+        for tds in table_rows(Selector(response.text), ".fpl-list > table tr"):
             if not tds:
                 continue
-            ip = tds[0].css("::text").get()
-            port = tds[1].css("::text").get()
-            google = (tds[5].css("::text").get() or "") in "yes"
-            country = tds[3].css("::text").get()
-            anonymity = cls.setup_anonymity(tds[4].css("::text").get())
-            https = tds[6].css("::text").get()
-            updated = tds[7].css("::text").get()
-
-            protocols = "https" if https == "yes" else "http"
-            protocol = cls.setup_protocol(protocols)
+            anonymity = ANONYMITY.get(cell_text(tds[4]), Anonymity.UNKNOWN)
+            protocol = Protocol.HTTPS if cell_text(tds[6]) == "yes" else Protocol.HTTP
+            google = cell_text(tds[5]) in "yes"
+            country = cell_text(tds[3])
+            # the site gives no latency
+            if query is not None and not (
+                query.accepts(protocol, anonymity, google, country) and query.accepts_latency(None)
+            ):
+                continue
+            ip = cell_text(tds[0])
+            port = int(cell_text(tds[1]))
+            updated = cell_text(tds[7])
 
             pad = ProxyAddress(ip, port, protocol, country, updated, google=google, anonymity=anonymity)
             proxy_list.append(pad)
@@ -80,95 +198,182 @@ class FreeProxyNetParser(FreeProxyParser):
 
 
 class GeoNodeProxyParser(FreeProxyParser):
+    name = "geonode"
+    url = Config.GEO_NODE_URL
+    page_url = Config.GEO_NODE_PAGE_URL
+    page_size = Config.GEO_NODE_PAGE_SIZE
+    max_pages = Config.GEO_NODE_MAX_PAGES
+
     @classmethod
-    def parse(cls, response: Response) -> List[ProxyAddress]:
+    def parse(cls, response: PageResponse, query: Optional[ProxyQuery] = None) -> List[ProxyAddress]:
+        return cls.parse_page(response, query)[1]
+
+    @classmethod
+    def parse_page(
+        cls, response: PageResponse, query: Optional[ProxyQuery] = None
+    ) -> Tuple[Optional[int], List[ProxyAddress]]:
         if response.status_code != 200:
             logger.info(f"Response: [{response.status_code}] : {response.url}")
-            return []
+            return None, []
 
-        data = response.json().get("data")
+        payload = response.json()
+        return payload.get("total"), list(cls.iter_parse(payload.get("data") or [], query))
 
-        proxy_list = []
+    @classmethod
+    def iter_parse(cls, data: Iterable[dict], query: Optional[ProxyQuery] = None) -> Iterator[ProxyAddress]:
         for proxy in data:
-            ip = proxy.get("ip")
-            port = proxy.get("port")
-            anonymity = cls.setup_anonymity(proxy.get("anonymityLevel"))
-            country = proxy.get("country")
-            google = proxy.get("google")
-            updated = proxy.get("updated_at")
-
+            anonymity = ANONYMITY.get(proxy.get("anonymityLevel", ""), Anonymity.UNKNOWN)
             protocols = proxy.get("protocols")
-            protocol = protocols[0] if protocols else ""
-            protocol = cls.setup_protocol(protocol)
+            protocol = PROTOCOLS.get(protocols[0].upper(), Protocol.UNKNOWN) if protocols else Protocol.UNKNOWN
+            google = bool(proxy.get("google"))
+            country = proxy.get("country") or ""
+            response_ms = proxy.get("responseTime", -1)
+            if query is not None and not (
+                query.accepts(protocol, anonymity, google, country) and query.accepts_latency(response_ms)
+            ):
+                continue
 
             speed = Speed(SpeedType.TIME, proxy.get("speed", -1))
-            response_time = Speed(SpeedType.TIME, proxy.get("responseTime", -1))
+            response_time = Speed(SpeedType.TIME, response_ms)
 
-            pad = ProxyAddress(
-                ip,
-                port,
+            yield ProxyAddress(
+                proxy["ip"],
+                int(proxy["port"]),
                 protocol,
                 country,
-                updated,
+                proxy.get("updated_at") or "",
                 google=google,
                 anonymity=anonymity,
                 speed=speed,
                 response=response_time,
             )
-            proxy_list.append(pad)
-
-        return proxy_list
 
 
 class FreeProxyCZ(FreeProxyParser):
+    name = "freeproxycz"
+    url = Config.FREE_PROXY_CZ_URL
+    # bans scrapers quickly; its pages are usually saved by hand and read with from_cache
+    rate_limit = 0.2
+    burst = 1
+    default = False
+
     @classmethod
-    def parse(cls, response: Union[Response, str]) -> List[ProxyAddress]:
-        selector = Selector(response.text) if isinstance(response, Response) else Selector(response)
-        ip_rows = selector.css("table#proxy_list tbody > tr")
-        column_length = len(list(map(lambda s: s.get(), selector.css("table#proxy_list th ::text"))))
+    def parse(cls, response: Union[PageResponse, str], query: Optional[ProxyQuery] = None) -> List[ProxyAddress]:
+        if not isinstance(response, str) and response.status_code != 200:
+            logger.info(f"Response: [{response.status_code}] : {response.url}")
+            return []
+        selector = Selector(response) if isinstance(response, str) else Selector(response.text)
+        column_length = len(selector.css("table#proxy_list th ::text"))
         proxies: List[ProxyAddress] = []
-        for row in ip_rows:
-            tds = row.css("td")
+        for tds in table_rows(selector, "table#proxy_list tbody > tr"):
             if len(tds) != column_length:
                 continue
 
-            ip = cls._parse_ip(tds[0])
-            port = int(tds[1].css("::text").get())
-            protocol = tds[2].css("::text").get()
-            country = tds[3].css("a::text").get()
-            _ = tds[4].css("::text").get()  # region
-            _ = tds[5].css("::text").get()  # city
-            anonymity = tds[6].css("::text").get()
-            speed = tds[7].css("small::text").get()
-            _ = tds[8].css("small::text").get()  # uptime
-            response_time = tds[9].css("small::text").get()
-            last_checked = tds[10].css("small::text").get()
+            anonymity = ANONYMITY.get(cell_text(tds[6]), Anonymity.UNKNOWN)
+            protocol = PROTOCOLS.get(cell_text(tds[2]).upper(), Protocol.UNKNOWN)
+            country = cell_text(tds[3], "a")
+            if query is not None and not query.accepts(protocol, anonymity, None, country):
+                continue
+            response_time = Speed.parse(cell_text(tds[9], "small"))
+            if query is not None and not query.accepts_latency(response_time.value if response_time else None):
+                continue
+
+            ip = cls._parse_ip(cell_text(tds[0], "script"))
+            port = int(cell_text(tds[1]))
+            speed = Speed.parse(cell_text(tds[7], "small"))
+            uptime = Speed.parse(cell_text(tds[8], "small"))
+            last_checked = cell_text(tds[10], "small")
 
             pad = ProxyAddress(
                 ip,
                 port,
-                cls.setup_protocol(protocol),
+                protocol,
                 country,
                 last_checked,
-                anonymity=cls.setup_anonymity(anonymity),
+                anonymity=anonymity,
                 speed=speed,
+                uptime=uptime,
                 response=response_time,
             )
             proxies.append(pad)
         return proxies
 
     @staticmethod
-    def _parse_ip(ip_selector: Selector) -> str:
-        ip_string = ip_selector.css("script").re_first(r".*\(\"(.+)\"")
+    def _parse_ip(script: str) -> str:
+        match = re.search(r".*\(\"(.+)\"", script)
+        if match is None:
+            raise ValueError(f"No encoded address in {script!r}")
+        ip_string = match.group(1)
         clean_ip_string = ip_string.split('")')[0]
         return base64.urlsafe_b64decode(clean_ip_string).decode()
 
     @staticmethod
-    def from_cache(cache_dir: Path) -> List[ProxyAddress]:
-        proxies = set()
-        for file in listdir(cache_dir):
-            with open(cache_dir / file) as f:
-                text = f.read()
-                proxies.update(FreeProxyCZ.parse(text))
-
-        return list(proxies)
+    def from_cache(cache_dir: Path, workers: Optional[int] = None) -> List[ProxyAddress]:
+        """Parse every page saved in ``cache_dir``.
+
+        Parsed rows are kept in an index next to the pages, keyed by file name, mtime and size,
+        so only new or changed pages, and pages parsed by another parser version, are parsed
+        again; those are spread over a process pool.
+        """
+        index_file = cache_dir / Config.CACHE_INDEX_NAME
+        index = _load_index(index_file)
+        version = FreeProxyCZ.records_version()
+
+        entries = {}
+        stale = []
+        for entry in os.scandir(cache_dir):
+            if entry.name.startswith(".") or not entry.is_file():
+                continue
+            stat = entry.stat()
+            cached = index.get(entry.name)
+            if (
+                cached
+                and cached.get("version") == version
+                and cached["mtime"] == stat.st_mtime_ns
+                and cached["size"] == stat.st_size
+            ):
+                entries[entry.name] = cached
+            else:
+                stale.append((entry.name, stat))
+
+        if stale:
+            paths = [str(cache_dir / name) for name, _ in stale]
+            if len(paths) == 1:
+                results = [_parse_cache_file(paths[0])]
+            else:
+                with ProcessPoolExecutor(workers) as pool:
+                    results = list(pool.map(_parse_cache_file, paths))
+            for (name, stat), records in zip(stale, results):
+                entries[name] = {
+                    "mtime": stat.st_mtime_ns,
+                    "size": stat.st_size,
+                    "version": version,
+                    "records": records,
+                }
+            logger.info(f"Parsed {len(stale)} cached pages")
+
+        if stale or len(entries) != len(index):
+            _save_index(index_file, entries)
+
+        rows = (record for entry in entries.values() for record in entry["records"])
+        return ProxyMerger(map(ProxyAddress.from_record, rows)).values()
+
+
+def _parse_cache_file(path: str) -> List[tuple]:
+    with open(path) as f:
+        return [proxy.to_record() for proxy in FreeProxyCZ.parse(f.read())]
+
+
+def _load_index(index_file: Path) -> dict:
+    try:
+        with open(index_file) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_index(index_file: Path, entries: dict) -> None:
+    tmp_file = index_file.with_name(index_file.name + ".tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(entries, f)
+    os.replace(tmp_file, index_file)
@@ -0,0 +1,112 @@
+"""Process pool parsing stage between fetching and merging."""
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from .address import ProxyAddress
+from .metrics import metrics
+from .parser import SOURCES, load_source_plugins
+from .query import ProxyQuery
+from .settings import Config
+
+logger = logging.getLogger("pipeline")
+
+ParseResult = Tuple[Optional[int], List[ProxyAddress]]
+
+
+class RawResponse:
+    """The parts of a ``requests.Response`` the parsers use, rebuilt from bytes in a worker."""
+
+    def __init__(self, content: bytes, status_code: int, url: str, encoding: Optional[str]):
+        self.content = content
+        self.status_code = status_code
+        self.url = url
+        self.encoding = encoding
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+def parse_records(
+    name: str,
+    content: bytes,
+    status_code: int,
+    url: str,
+    encoding: Optional[str],
+    query: Optional[ProxyQuery] = None,
+) -> Tuple[Optional[int], List[tuple]]:
+    """Parse one response of source ``name`` and flatten the proxies with ``to_record``.
+
+    Runs in the worker processes: only bytes go in and tuples of plain values come out, which
+    pickle far smaller and faster than the dataclasses.
+    """
+    if name not in SOURCES:
+        load_source_plugins()
+    total, proxies = SOURCES[name].parse_page(RawResponse(content, status_code, url, encoding), query)
+    return total, [proxy.to_record() for proxy in proxies]
+
+
+class ParsePipeline:
+    """Parse responses in a pool of ``workers`` processes, fed through a bounded queue.
+
+    :meth:`parse` waits while ``queue_size`` responses are already queued, which holds fetching
+    back instead of buffering pages faster than they can be parsed. Use as an async context
+    manager; the pool is started on entry and shut down on exit.
+    """
+
+    def __init__(self, workers: Optional[int] = None, queue_size: int = Config.PARSE_QUEUE_SIZE):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._consumers: List[asyncio.Future] = []
+
+    async def __aenter__(self) -> "ParsePipeline":
+        self._executor = ProcessPoolExecutor(self.workers)
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self._queue = queue
+        self._consumers = [asyncio.ensure_future(self._consume(queue)) for _ in range(self.workers)]
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        for consumer in self._consumers:
+            consumer.cancel()
+        await asyncio.gather(*self._consumers, return_exceptions=True)
+        if self._executor is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+        self._executor = self._queue = None
+
+    async def parse(self, name: str, response, query: Optional[ProxyQuery] = None) -> ParseResult:
+        if self._queue is None:
+            raise RuntimeError("ParsePipeline is not started, use it with async with")
+        future = asyncio.get_running_loop().create_future()
+        payload = (name, response.content, response.status_code, response.url, response.encoding, query)
+        await self._queue.put((payload, future))
+        return await future
+
+    async def _consume(self, queue: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            payload, future = await queue.get()
+            try:
+                with metrics.timer("parse_seconds", source=payload[0]):
+                    total, records = await loop.run_in_executor(self._executor, parse_records, *payload)
+                result = total, [ProxyAddress.from_record(record) for record in records]
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                queue.task_done()
@@ -0,0 +1,153 @@
+"""Retry and hedging policy for source requests, driven by each source's recent latencies."""
+import asyncio
+import logging
+import math
+import random
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests import Response
+
+from .metrics import metrics
+from .ratelimit import HostLimiter
+from .settings import Config
+
+logger = logging.getLogger("policy")
+
+# statuses worth asking again for; anything else is the source's final answer
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+
+class LatencyTracker:
+    """The last ``window`` successful request durations of every source, in seconds."""
+
+    def __init__(self, window: int = Config.LATENCY_WINDOW, min_samples: int = Config.HEDGE_MIN_SAMPLES):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, source: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.get(source)
+            if samples is None:
+                samples = self._samples[source] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def percentile(self, source: str, q: float) -> Optional[float]:
+        """The ``q``-th percentile (0 to 100) of the source's durations, None until ``min_samples`` are in."""
+        with self._lock:
+            samples = sorted(self._samples.get(source, ()))
+        if not samples or len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, math.ceil(q / 100 * len(samples)) - 1)]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+
+class FetchPolicy:
+    """Run ``get(url, timeout, headers)`` for a source with hedging and retries, all within one time budget.
+
+    A request still running after the source's ``hedge_percentile`` latency gets a duplicate and
+    whichever answers first wins; the other is abandoned, though its thread runs until the
+    request's own timeout. Errors and the statuses in :data:`RETRY_STATUSES` are retried up to
+    ``retries`` times after a full jitter backoff, as long as the backoff ends before the budget.
+
+    Every request, hedges and retries included, first waits for its host's bucket in ``limiter``;
+    that wait counts neither in the latencies nor towards the hedge delay.
+    """
+
+    def __init__(
+        self,
+        get: Callable[[str, float, Optional[Dict[str, str]]], Awaitable[Response]],
+        limiter: Optional[HostLimiter] = None,
+        retries: int = Config.FETCH_RETRIES,
+        backoff: float = Config.FETCH_BACKOFF,
+        max_backoff: float = Config.FETCH_MAX_BACKOFF,
+        hedge_percentile: Optional[float] = Config.HEDGE_PERCENTILE,
+        latency: Optional[LatencyTracker] = None,
+    ):
+        self.get = get
+        self.limiter = limiter
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_percentile = hedge_percentile
+        self.latency = latency or LatencyTracker()
+
+    def hedge_delay(self, source: str) -> Optional[float]:
+        if self.hedge_percentile is None:
+            return None
+        return self.latency.percentile(source, self.hedge_percentile)
+
+    async def fetch(
+        self, source: str, url: str, timeout: float, headers: Optional[Dict[str, str]] = None
+    ) -> Response:
+        """The first usable response to ``url`` within ``timeout`` seconds, else the last one or error."""
+        deadline = time.monotonic() + timeout
+        for attempt in range(self.retries + 1):
+            remaining = deadline - time.monotonic()
+            try:
+                response = await self._hedged(source, url, remaining, headers)
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                error = None
+                reason = f"status {response.status_code}"
+            except requests.RequestException as e:
+                error = e
+                reason = repr(e)
+
+            delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+            if attempt == self.retries or time.monotonic() + delay >= deadline:
+                break
+            logger.debug(f"{source}: retrying in {delay:.2f}s after {reason}")
+            metrics.inc("fetch_retries_total", source=source)
+            await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return response
+
+    async def _hedged(self, source: str, url: str, timeout: float, headers: Optional[Dict[str, str]]) -> Response:
+        await self._wait_turn(url)
+        first = asyncio.ensure_future(self._timed(source, url, timeout, headers))
+        tasks = {first}
+        try:
+            delay = self.hedge_delay(source)
+            if delay is not None and delay < timeout:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    metrics.inc("fetch_hedged_total", source=source)
+                    hedge = self._timed(source, url, timeout - delay, headers, wait_turn=True)
+                    tasks.add(asyncio.ensure_future(hedge))
+            while True:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    tasks.discard(task)
+                    if task.exception() is None or not tasks:
+                        if task is not first:
+                            metrics.inc("fetch_hedge_wins_total", source=source)
+                        return task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _wait_turn(self, url: str) -> None:
+        if self.limiter is not None:
+            await self.limiter.bucket(urlsplit(url).netloc).acquire()
+
+    async def _timed(
+        self, source: str, url: str, timeout: float, headers: Optional[Dict[str, str]], wait_turn: bool = False
+    ) -> Response:
+        if wait_turn:
+            await self._wait_turn(url)
+        start = time.perf_counter()
+        response = await self.get(url, timeout, headers)
+        if response.status_code not in RETRY_STATUSES:
+            self.latency.record(source, time.perf_counter() - start)
+        return response
@@ -1,58 +1,94 @@
 """Main module."""
 import logging
-from typing import List, Optional
-
-import requests
+from typing import List, Optional, Union
 
 from .address import Anonymity, Protocol, ProxyAddress
-from .parser import FreeProxyCZ, FreeProxyNetParser, GeoNodeProxyParser
+from .parser import FreeProxyCZ
+from .metrics import metrics
+from .query import ProxyQuery
 from .settings import Config
+from .store import ProxyStore
+from .writers import write_proxies
 
 logger = logging.getLogger("pyroxy")
 
 ProxiesType = List[ProxyAddress]
 
 
-def proxy_list(site: Optional[str]) -> ProxiesType:
-    proxies = []
+def proxy_list(
+    site: Optional[str],
+    timeout: Optional[float] = None,
+    workers: Optional[int] = None,
+    query: Optional[ProxyQuery] = None,
+) -> ProxiesType:
+    """Fetch proxies from ``site``, or from every known source when ``site`` is empty.
 
-    fn_proxy_list = FreeProxyNetParser.parse(requests.get(Config.FREE_PROXY_NET_URL, headers=Config.HEADERS))
-    geo_proxy_list = GeoNodeProxyParser.parse(requests.get(Config.GEO_NODE_URL, headers=Config.HEADERS))
+    Sources are fetched concurrently, so a refresh takes as long as the slowest source.
+    ``workers`` parse processes take the parsing off the event loop, see :func:`pyroxy.fetch.fetch_proxies`.
+    Only merged proxies matching ``query`` are returned. The parsers skip rows of protocol families
+    ``query`` leaves out; anything else could change a merged proxy, so a query covering every
+    family, like the command line default, is applied after merging only.
+    Must not be called from a running event loop; use :func:`pyroxy.fetch.fetch_proxies` there.
+    """
+    # fetching needs asyncio and requests, which cached and filter-only callers never load
+    import asyncio
 
-    logger.info(f"FREE NET: {len(fn_proxy_list)}")
-    logger.info(f"GEONODE : {len(geo_proxy_list)}")
+    from .fetch import fetch_proxies
 
+    proxies = asyncio.run(fetch_proxies([site] if site else None, timeout, workers, query))
     if not site:
-        proxies.extend(fn_proxy_list)
-        proxies.extend(geo_proxy_list)
         logger.info(f"Returning all sites proxies : {len(proxies)}")
-    elif site and site.lower() == "freeproxy":
-        proxies.extend(fn_proxy_list)
-    elif site and site.lower() == "geonode":
-        proxies.extend(geo_proxy_list)
-
     return proxies
 
 
-def filter_proxy_list(
-    proxies: ProxiesType, protocols: List[Protocol], anonymity: List[Anonymity], google: Optional[bool] = None
-) -> ProxiesType:
-    filtered_proxies = ProxyFilters.google(proxies, google)
-    logger.info(f"Google    filtered: {len(filtered_proxies)}")
+def stored_proxy_list(site: Optional[str], ttl: float = Config.DATABASE_TTL) -> ProxiesType:
+    """Like :func:`proxy_list`, but only sources older than ``ttl`` seconds are fetched again."""
+    import asyncio
+
+    from .database import ProxyDatabase, refresh_sources
+
+    database = ProxyDatabase()
+    try:
+        return asyncio.run(refresh_sources(database, [site] if site else None, ttl))
+    finally:
+        database.close()
 
-    filtered_proxies = ProxyFilters.protocol(filtered_proxies, protocols)
-    logger.info(f"Protocol  filtered: {len(filtered_proxies)}")
 
-    filtered_proxies = ProxyFilters.anonymity(filtered_proxies, anonymity)
-    logger.info(f"Anonymity filtered: {len(filtered_proxies)}")
+def replayed_proxy_list(site: Optional[str], query: Optional[ProxyQuery] = None) -> ProxiesType:
+    """The proxies of the last responses fetched from ``site`` (or every source), read from the response cache."""
+    import asyncio
+
+    from .fetch import replay_proxies
+
+    return asyncio.run(replay_proxies([site] if site else None, query))
+
+
+def filter_proxy_list(
+    proxies: Union[ProxiesType, ProxyStore],
+    protocols: List[Protocol],
+    anonymity: List[Anonymity],
+    google: Optional[bool] = None,
+    query: Optional[ProxyQuery] = None,
+) -> ProxiesType:
+    """Proxies of one of ``protocols`` and ``anonymity`` levels (any when empty), also matching ``query``."""
+    query = ProxyQuery(frozenset(protocols), frozenset(anonymity), google) & (query or ProxyQuery())
+    if isinstance(proxies, ProxyStore):
+        filtered_proxies = proxies.select(**query.store_filters())
+    else:
+        filtered_proxies = list(query.filter(proxies))
+    logger.info(f"Filtered  proxies : {len(filtered_proxies)}")
+    total = len(proxies)
+    metrics.inc("filter_input_total", total)
+    metrics.inc("filter_output_total", len(filtered_proxies))
+    if total:
+        metrics.set("filter_selectivity", len(filtered_proxies) / total)
 
     return filtered_proxies
 
 
-def proxy_list_file(filename: str, proxies: ProxiesType) -> None:
-    with open(filename, "w") as f:
-        proxies_text = "\n".join(set(map(lambda p: f"{p.ip}:{p.port}", proxies)))
-        f.write(proxies_text)
+def proxy_list_file(filename: str, proxies: ProxiesType, fmt: str = "text") -> None:
+    count = write_proxies(filename, proxies, fmt)
+    logger.info(f"Wrote {count} proxies to {filename}")
 
 
 def cached_proxies() -> ProxiesType:
@@ -63,17 +99,19 @@ class ProxyFilters:
     @staticmethod
     def google(proxies, use_google: Optional[bool]) -> ProxiesType:
         if use_google is not None:
-            proxies = list(filter(lambda p: p.google == use_google, proxies))
+            proxies = [p for p in proxies if p.google == use_google]
         return proxies
 
     @staticmethod
     def anonymity(proxies: ProxiesType, anonymity_list: List[Anonymity]) -> ProxiesType:
         if anonymity_list:
-            proxies = list(filter(lambda p: p.anonymity in anonymity_list, proxies))
+            anonymity_set = frozenset(anonymity_list)
+            proxies = [p for p in proxies if p.anonymity in anonymity_set]
         return proxies
 
     @staticmethod
     def protocol(proxies: ProxiesType, protocols: List[Protocol]) -> ProxiesType:
         if protocols:
-            proxies = list(filter(lambda p: p.protocol in protocols, proxies))
+            protocol_set = frozenset(protocols)
+            proxies = [p for p in proxies if p.protocol in protocol_set]
         return proxies
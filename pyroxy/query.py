@@ -0,0 +1,118 @@
+"""Proxy predicates that parsers evaluate on raw rows, before any ``ProxyAddress`` is built."""
+import hashlib
+from dataclasses import dataclass, fields
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Optional
+
+from .address import Anonymity, Protocol, ProxyAddress
+from .geo import normalize_country
+from .store import proxy_latency
+
+
+@dataclass(frozen=True)
+class ProxyQuery:
+    """Which proxies to keep; a criterion left as None (or empty) accepts everything.
+
+    Parsers call :meth:`accepts` with the cheap columns of a row as soon as they have read them,
+    and :meth:`accepts_latency` before building ``Speed`` objects, so rejected rows cost neither
+    the remaining cells nor any objects. ``countries`` match either the text a source gives or
+    its two letter code. Queries combine with ``&``; combining contradictory criteria gives a
+    query with ``nothing`` set, which accepts no proxy at all.
+    """
+
+    protocols: Optional[FrozenSet[Protocol]] = None
+    anonymity: Optional[FrozenSet[Anonymity]] = None
+    google: Optional[bool] = None
+    countries: Optional[FrozenSet[str]] = None
+    # in ms; proxies without a known latency are rejected once this is set
+    max_latency: Optional[float] = None
+    nothing: bool = False
+
+    def __post_init__(self):
+        for name in ("protocols", "anonymity", "countries"):
+            value = getattr(self, name)
+            object.__setattr__(self, name, frozenset(value) if value else None)
+
+    def __and__(self, other: "ProxyQuery") -> "ProxyQuery":
+        values: Dict[str, Any] = {"nothing": self.nothing or other.nothing}
+        for field in fields(self):
+            mine, theirs = getattr(self, field.name), getattr(other, field.name)
+            if field.name == "nothing":
+                continue
+            if mine is None or theirs is None:
+                values[field.name] = theirs if mine is None else mine
+            elif field.name == "max_latency":
+                values[field.name] = min(mine, theirs)
+            elif field.name == "google":
+                if mine != theirs:
+                    raise ValueError("Queries disagree on google")
+                values[field.name] = mine
+            else:
+                values[field.name] = mine & theirs
+                values["nothing"] = values["nothing"] or not values[field.name]
+        return ProxyQuery(**values)
+
+    def accepts(
+        self, protocol: Protocol, anonymity: Anonymity, google: Optional[bool] = None, country: Optional[str] = None
+    ) -> bool:
+        if self.nothing:
+            return False
+        if self.anonymity is not None and anonymity not in self.anonymity:
+            return False
+        if self.protocols is not None and protocol not in self.protocols:
+            return False
+        if self.google is not None and bool(google) != self.google:
+            return False
+        if self.countries is not None and country not in self.countries:
+            return normalize_country(country) in self.countries
+        return True
+
+    def accepts_latency(self, latency: Optional[float]) -> bool:
+        """``latency`` is in ms; None, NaN or a negative value means unknown."""
+        if self.max_latency is None:
+            return not self.nothing
+        return not self.nothing and latency is not None and 0 <= latency <= self.max_latency
+
+    def matches(self, proxy: ProxyAddress) -> bool:
+        if not self.accepts(proxy.protocol, proxy.anonymity, proxy.google, proxy.country):
+            return False
+        return self.max_latency is None or self.accepts_latency(proxy_latency(proxy))
+
+    def filter(self, proxies: Iterable[ProxyAddress]) -> Iterator[ProxyAddress]:
+        if self.nothing:
+            return iter(())
+        if self.countries is not None or self.max_latency is not None:
+            return (proxy for proxy in proxies if self.matches(proxy))
+        # the common case, inlined to save two calls per proxy
+        protocols = self.protocols or frozenset(Protocol)
+        anonymity = self.anonymity or frozenset(Anonymity)
+        google = self.google
+        return (
+            p
+            for p in proxies
+            if p.protocol in protocols and p.anonymity in anonymity and (google is None or bool(p.google) == google)
+        )
+
+    def key(self) -> str:
+        """Short text naming this query, the same in every process, for cache file names."""
+        parts: List[Any] = [
+            sorted(value.name for value in self.protocols or ()),
+            sorted(value.name for value in self.anonymity or ()),
+            self.google,
+            sorted(str(value) for value in self.countries or ()),
+            self.max_latency,
+        ]
+        if self.nothing:
+            parts.append("nothing")
+        return hashlib.sha1(repr(parts).encode()).hexdigest()[:16]
+
+    def store_filters(self) -> Dict[str, Any]:
+        """Keywords for :meth:`ProxyStore.mask` selecting the same proxies."""
+        filters: Dict[str, Any] = {"protocols": self.protocols, "anonymity": self.anonymity, "google": self.google}
+        if self.nothing:
+            # no country is in an empty set
+            filters["countries"] = frozenset()
+        elif self.countries is not None:
+            filters["countries"] = self.countries
+        if self.max_latency is not None:
+            filters["latency"] = (0, self.max_latency)
+        return filters
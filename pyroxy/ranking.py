@@ -0,0 +1,117 @@
+"""Scoring and top-K selection over a whole proxy pool, vectorised with NumPy when it is installed."""
+import heapq
+import logging
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from .address import ProxyAddress
+from .settings import Config
+from .store import ProxyStore, proxy_latency, proxy_speed, proxy_uptime
+
+try:
+    import numpy as np  # type: ignore[import]
+except ImportError:
+    np = None
+
+logger = logging.getLogger("ranking")
+
+Columns = Tuple[Sequence[float], Sequence[float], Sequence[float]]
+Proxies = Union[Sequence[ProxyAddress], ProxyStore]
+
+
+def metric_columns(proxies: Proxies, rows: Optional[Iterable[int]] = None) -> Columns:
+    """Latency in ms, speed in bytes per second and uptime in percent of every proxy, NaN where unknown.
+
+    Raw strings some sources give, like ``"1570 kB/s"``, are normalised with :meth:`Speed.parse`.
+    A :class:`ProxyStore` hands out its columns without building a single ``ProxyAddress``.
+    """
+    if isinstance(proxies, ProxyStore):
+        return proxies.columns(rows)
+    if rows is not None:
+        proxies = [proxies[row] for row in rows]
+    return (
+        array("d", map(proxy_latency, proxies)),
+        array("d", map(proxy_speed, proxies)),
+        array("d", map(proxy_uptime, proxies)),
+    )
+
+
+def score_columns(
+    latency: Sequence[float],
+    speed: Sequence[float],
+    uptime: Sequence[float],
+    weights: Optional[Dict[str, float]] = None,
+) -> Sequence[float]:
+    """Combined score in ``[0, 1]`` of each proxy, higher is better.
+
+    Latency scores ``scale / (scale + latency)`` and speed ``speed / (speed + scale)``, so each
+    scores one half at its ``Config.RANK_*_SCALE``; uptime scores its fraction. Unknown values
+    take the defaults in ``Config``. Returns a NumPy array when NumPy is installed, else a list.
+    """
+    weights = weights or Config.RANK_WEIGHTS
+    total = sum(weights.values()) or 1.0
+    w_latency, w_speed, w_uptime = (weights.get(name, 0.0) / total for name in ("latency", "speed", "uptime"))
+    latency_scale, speed_scale = Config.RANK_LATENCY_SCALE, Config.RANK_SPEED_SCALE
+    default_latency, default_uptime = Config.ROTATOR_DEFAULT_LATENCY, Config.RANK_DEFAULT_UPTIME
+
+    if np is not None:
+        latencies = np.nan_to_num(np.asarray(latency, dtype=float), nan=default_latency)
+        speeds = np.nan_to_num(np.asarray(speed, dtype=float), nan=0.0)
+        uptimes = np.nan_to_num(np.asarray(uptime, dtype=float), nan=default_uptime)
+        return (
+            w_latency * latency_scale / (latency_scale + latencies)
+            + w_speed * speeds / (speeds + speed_scale)
+            + w_uptime * np.clip(uptimes, 0, 100) / 100
+        )
+
+    scores = []
+    for l_ms, bps, percent in zip(latency, speed, uptime):
+        l_ms = default_latency if l_ms != l_ms else l_ms
+        bps = 0.0 if bps != bps else bps
+        percent = default_uptime if percent != percent else min(100.0, max(0.0, percent))
+        scores.append(
+            w_latency * latency_scale / (latency_scale + l_ms)
+            + w_speed * bps / (bps + speed_scale)
+            + w_uptime * percent / 100
+        )
+    return scores
+
+
+def rank(proxies: Proxies, weights: Optional[Dict[str, float]] = None) -> Sequence[float]:
+    """Score every proxy in one pass over its metric columns, see :func:`score_columns`."""
+    return score_columns(*metric_columns(proxies), weights)
+
+
+def top_indices(scores: Sequence[float], k: int) -> List[int]:
+    """Positions of the ``k`` highest ``scores``, best first.
+
+    Selection is O(n) with ``argpartition`` on a NumPy array, else O(n log k) with a heap; only
+    the ``k`` winners are sorted.
+    """
+    n = len(scores)
+    k = min(k, n)
+    if k <= 0:
+        return []
+    if np is not None and isinstance(scores, np.ndarray):
+        best = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+        return best[np.argsort(-scores[best], kind="stable")].tolist()
+    return heapq.nlargest(k, range(n), key=scores.__getitem__)
+
+
+def top_k(proxies: Proxies, k: int, weights: Optional[Dict[str, float]] = None, **filters) -> List[ProxyAddress]:
+    """The ``k`` best scoring proxies, best first.
+
+    With a :class:`ProxyStore`, ``filters`` are the keywords of :meth:`ProxyStore.mask` and only
+    the matching rows are scored, e.g. ``top_k(store, 50, protocols=[Protocol.HTTPS])``.
+    """
+    rows: Optional[List[int]] = None
+    if filters:
+        if not isinstance(proxies, ProxyStore):
+            raise TypeError("filters need a ProxyStore, filter lists with filter_proxy_list")
+        rows = proxies.query(**filters)
+    scores = score_columns(*metric_columns(proxies, rows), weights)
+    best = top_indices(scores, k)
+    if rows is not None:
+        best = [rows[i] for i in best]
+    logger.debug(f"Ranked {len(scores)} proxies, kept {len(best)}")
+    return [proxies[i] for i in best]
@@ -0,0 +1,60 @@
+"""Token bucket rate limiting shared between threads and event loops."""
+import asyncio
+import threading
+import time
+from typing import Callable, Dict, Tuple
+
+
+class TokenBucket:
+    """Allow ``rate`` operations per second on average, with bursts of up to ``burst``.
+
+    :meth:`reserve` always takes a token, letting the balance go negative, and returns how long
+    the caller has to wait before using it; waiting callers are therefore served in order. Nothing
+    is bound to an event loop, so one bucket can be shared by ``asyncio.run`` calls and threads.
+    """
+
+    def __init__(self, rate: float, burst: float = 1, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1) -> float:
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            return max(0.0, -self._tokens / self.rate)
+
+    async def acquire(self, tokens: float = 1) -> None:
+        delay = self.reserve(tokens)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def wait(self, tokens: float = 1) -> None:
+        delay = self.reserve(tokens)
+        if delay:
+            time.sleep(delay)
+
+
+class HostLimiter:
+    """One :class:`TokenBucket` per host, created on first use with the limits ``limits(host)`` gives."""
+
+    def __init__(self, limits: Callable[[str], Tuple[float, float]]):
+        self.limits = limits
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(*self.limits(host))
+            return bucket
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
@@ -0,0 +1,149 @@
+"""Health scored proxy rotation with circuit breaking."""
+import math
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from .address import ProxyAddress
+from .metrics import metrics
+from .settings import Config
+from .store import proxy_latency
+
+
+class NoProxyAvailable(Exception):
+    """Every proxy in the rotation has its circuit open."""
+
+
+class ProxyHealth:
+    """Running success rate and latency of one proxy, plus its circuit breaker state."""
+
+    __slots__ = ("proxy", "success_rate", "latency", "failures", "open_until", "in_flight")
+
+    def __init__(self, proxy: ProxyAddress, latency: float):
+        self.proxy = proxy
+        self.success_rate = 1.0
+        self.latency = latency
+        self.failures = 0
+        self.open_until = 0.0
+        self.in_flight = 0
+
+    def score(self) -> float:
+        """Expected cost of the next request through this proxy; lower is better."""
+        return self.latency * (1 + self.in_flight) / max(self.success_rate, 0.01)
+
+
+class ProxyRotator:
+    """Pick proxies by power-of-two-choices over health scores.
+
+    Two random proxies with closed circuits are compared and the one with the lower score wins,
+    which keeps selection O(1) while steering traffic away from slow or failing proxies. After
+    ``failure_threshold`` consecutive failures a proxy's circuit opens for ``cooldown`` seconds;
+    after that it gets one trial request, and a failure reopens it straight away.
+
+    All state changes happen under one lock held for a few attribute updates, so a rotator can be
+    shared between threads and used from coroutines without blocking the event loop.
+    """
+
+    def __init__(
+        self,
+        proxies: Iterable[ProxyAddress] = (),
+        failure_threshold: int = Config.ROTATOR_FAILURE_THRESHOLD,
+        cooldown: float = Config.ROTATOR_COOLDOWN,
+        alpha: float = 0.2,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.alpha = alpha
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._health: List[ProxyHealth] = []
+        self._index: Dict[tuple, ProxyHealth] = {}
+        self.update(proxies)
+
+    def __len__(self) -> int:
+        return len(self._health)
+
+    def update(self, proxies: Iterable[ProxyAddress]) -> None:
+        """Replace the rotation, keeping the statistics of proxies that stay in it."""
+        health = []
+        index = {}
+        for proxy in proxies:
+            key = _key(proxy)
+            if key in index:
+                continue
+            known = self._index.get(key)
+            if known is None:
+                latency = proxy_latency(proxy)
+                known = ProxyHealth(proxy, Config.ROTATOR_DEFAULT_LATENCY if math.isnan(latency) else latency)
+            index[key] = known
+            health.append(known)
+        with self._lock:
+            self._health = health
+            self._index = index
+        metrics.set("rotation_size", len(health))
+
+    def acquire(self) -> ProxyAddress:
+        now = self.clock()
+        with self._lock:
+            health = self._health
+            if not health:
+                raise NoProxyAvailable("rotation is empty")
+
+            candidates = []
+            for _ in range(8):
+                entry = health[random.randrange(len(health))]
+                if entry.open_until <= now:
+                    candidates.append(entry)
+                    if len(candidates) == 2:
+                        break
+            if not candidates:
+                candidates = [entry for entry in health if entry.open_until <= now]
+                if not candidates:
+                    raise NoProxyAvailable(f"all {len(health)} proxies are cooling down")
+
+            chosen = min(candidates, key=ProxyHealth.score)
+            if chosen.failures >= self.failure_threshold:
+                # half open: let this one request through and keep others away until it reports
+                chosen.open_until = now + self.cooldown
+            chosen.in_flight += 1
+            return chosen.proxy
+
+    def report(self, proxy: ProxyAddress, success: bool, latency: Optional[float] = None) -> None:
+        """Record the outcome of a request through ``proxy``; ``latency`` is in milliseconds."""
+        with self._lock:
+            entry = self._index.get(_key(proxy))
+            if entry is None:
+                return
+            entry.in_flight = max(entry.in_flight - 1, 0)
+            entry.success_rate += self.alpha * ((1.0 if success else 0.0) - entry.success_rate)
+            if latency is not None:
+                entry.latency += self.alpha * (latency - entry.latency)
+            if success:
+                entry.failures = 0
+                entry.open_until = 0.0
+            else:
+                entry.failures += 1
+                if entry.failures >= self.failure_threshold:
+                    entry.open_until = self.clock() + self.cooldown
+
+    @contextmanager
+    def using(self) -> Iterator[ProxyAddress]:
+        """Acquire a proxy and report the block's outcome and duration when it exits."""
+        proxy = self.acquire()
+        start = time.perf_counter()
+        try:
+            yield proxy
+        except BaseException:
+            self.report(proxy, False)
+            raise
+        self.report(proxy, True, (time.perf_counter() - start) * 1000)
+
+    def health(self, proxy: ProxyAddress) -> Optional[ProxyHealth]:
+        return self._index.get(_key(proxy))
+
+
+def _key(proxy: ProxyAddress) -> tuple:
+    return proxy.ip, int(proxy.port), proxy.protocol
@@ -0,0 +1,279 @@
+"""Adaptive revalidation of a proxy pool within a global check budget."""
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from dataclasses import replace
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .address import Anonymity, Protocol, ProxyAddress, Speed, SpeedType
+from .metrics import metrics
+from .ratelimit import TokenBucket
+from .settings import Config
+
+logger = logging.getLogger("scheduler")
+
+_ANONYMITY_VALUE = {Anonymity.HIA: 2.0, Anonymity.ANM: 1.0, Anonymity.NOA: 0.5, Anonymity.UNKNOWN: 1.0}
+_PROTOCOL_VALUE = {
+    Protocol.SOCKS5: 2.0,
+    Protocol.SOCKS4: 1.5,
+    Protocol.HTTPS: 1.5,
+    Protocol.HTTP: 1.0,
+    Protocol.UNKNOWN: 1.0,
+}
+
+
+def proxy_value(proxy: ProxyAddress) -> float:
+    """How much keeping ``proxy`` fresh is worth: it is checked ``value`` times as often as a plain one."""
+    return _ANONYMITY_VALUE[proxy.anonymity] * _PROTOCOL_VALUE[proxy.protocol]
+
+
+class ProxyHistory:
+    """Check history of one proxy and its place in the schedule."""
+
+    __slots__ = ("proxy", "value", "checks", "alive", "failures", "flaps", "latency", "interval", "next_check", "entry")
+
+    def __init__(self, proxy: ProxyAddress, next_check: float):
+        self.proxy = proxy
+        self.value = proxy_value(proxy)
+        self.checks = 0
+        self.alive: Optional[bool] = None
+        # consecutive failed checks
+        self.failures = 0
+        # state changes, decaying by one with every check that agrees with the previous one
+        self.flaps = 0
+        self.latency: Optional[float] = None
+        self.interval = 0.0
+        self.next_check = next_check
+        self.entry = 0
+
+
+class RevalidationScheduler:
+    """Re-check proxies when they are due, most valuable first, at no more than ``rate`` checks a second.
+
+    Proxies sit in a heap keyed on their next check time. A live proxy is checked every
+    ``interval / value``; every recent up/down flap doubles that, and each consecutive failure of a
+    dead one doubles ``interval``, always within ``[min_interval, max_interval]``. Proxies failing
+    ``evict_after`` checks in a row are dropped. Rescheduling pushes a new heap entry and leaves the
+    old one to be skipped, so every operation is O(log n) however large the pool grows.
+    """
+
+    def __init__(
+        self,
+        interval: float = Config.REVALIDATE_INTERVAL,
+        min_interval: float = Config.REVALIDATE_MIN_INTERVAL,
+        max_interval: float = Config.REVALIDATE_MAX_INTERVAL,
+        rate: float = Config.REVALIDATE_RATE,
+        evict_after: int = Config.REVALIDATE_EVICT_AFTER,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.evict_after = evict_after
+        self.clock = clock
+        self.budget = TokenBucket(rate, max(1.0, rate), clock)
+        self._lock = threading.Lock()
+        self._history: Dict[tuple, ProxyHistory] = {}
+        self._heap: List[Tuple[float, float, int, tuple]] = []
+        self._entries = itertools.count(1)
+
+    def __len__(self) -> int:
+        return len(self._history)
+
+    def add(self, proxies: Iterable[ProxyAddress]) -> int:
+        """Schedule new proxies for an immediate check; known ones keep their history. Returns the count added."""
+        now = self.clock()
+        added = 0
+        with self._lock:
+            for proxy in proxies:
+                key = _key(proxy)
+                if key in self._history:
+                    continue
+                history = self._history[key] = ProxyHistory(proxy, now)
+                self._push(history)
+                added += 1
+        metrics.set("revalidation_pool_size", len(self._history))
+        return added
+
+    def _push(self, history: ProxyHistory) -> None:
+        history.entry = next(self._entries)
+        heapq.heappush(self._heap, (history.next_check, -history.value, history.entry, _key(history.proxy)))
+
+    def next_due(self) -> Optional[float]:
+        """When the earliest scheduled check is due, None if nothing is scheduled."""
+        with self._lock:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def _drop_stale(self) -> None:
+        heap = self._heap
+        while heap:
+            history = self._history.get(heap[0][3])
+            if history is not None and history.entry == heap[0][2]:
+                return
+            heapq.heappop(heap)
+
+    def pop_due(self) -> Optional[ProxyAddress]:
+        """Take the most valuable proxy whose check is due; it is not scheduled again until :meth:`record`."""
+        now = self.clock()
+        with self._lock:
+            self._drop_stale()
+            if not self._heap or self._heap[0][0] > now:
+                return None
+            history = self._history[heapq.heappop(self._heap)[3]]
+            history.entry = 0
+            return history.proxy
+
+    def record(self, proxy: ProxyAddress, latency: Optional[float]) -> None:
+        """Store the outcome of a check, ``latency`` in ms or None if it failed, and schedule the next one."""
+        alive = latency is not None
+        metrics.inc("validation_checks_total", result="ok" if alive else "failed")
+        with self._lock:
+            history = self._history.get(_key(proxy))
+            if history is None:
+                return
+            if history.alive is not None and history.alive != alive:
+                history.flaps += 1
+            elif history.flaps:
+                history.flaps -= 1
+            history.checks += 1
+            history.alive = alive
+            if latency is not None:
+                history.failures = 0
+                history.latency = latency
+                history.proxy = replace(history.proxy, latency=Speed(SpeedType.TIME, round(latency, 2)))
+            else:
+                history.failures += 1
+                if history.failures >= self.evict_after:
+                    del self._history[_key(proxy)]
+                    return
+
+            history.interval = self.interval_for(history)
+            history.next_check = self.clock() + history.interval
+            self._push(history)
+
+    def interval_for(self, history: ProxyHistory) -> float:
+        if history.alive:
+            interval = self.interval / history.value * 2 ** min(history.flaps, 16)
+        else:
+            interval = self.interval * 2 ** min(history.failures, 16)
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def history(self, proxy: ProxyAddress) -> Optional[ProxyHistory]:
+        return self._history.get(_key(proxy))
+
+    def alive(self) -> List[ProxyAddress]:
+        """Proxies whose last check succeeded, carrying the latency it measured."""
+        with self._lock:
+            alive = [history.proxy for history in self._history.values() if history.alive]
+        metrics.set("revalidation_alive", len(alive))
+        return alive
+
+    async def run(self, checker, concurrency: int = Config.CHECK_CONCURRENCY, stop: Optional[asyncio.Event] = None):
+        """Check due proxies with ``checker.check`` until ``stop`` is set.
+
+        ``checker`` is a :class:`pyroxy.validator.ProxyChecker` or anything with the same
+        ``async check(proxy) -> Optional[float]``. At most ``concurrency`` checks run at once.
+        """
+        slots = asyncio.Semaphore(concurrency)
+        running = set()
+
+        async def check(proxy: ProxyAddress) -> None:
+            try:
+                latency = await checker.check(proxy)
+            except Exception:
+                logger.exception(f"check of {proxy.ip}:{proxy.port} failed")
+                latency = None
+            finally:
+                slots.release()
+            self.record(proxy, latency)
+
+        try:
+            while stop is None or not stop.is_set():
+                due = self.next_due()
+                wait = 1.0 if due is None else due - self.clock()
+                if wait > 0:
+                    await _wait(stop, min(wait, 1.0))
+                    continue
+                await slots.acquire()
+                await self.budget.acquire()
+                proxy = self.pop_due()
+                if proxy is None:
+                    slots.release()
+                    continue
+                task = asyncio.ensure_future(check(proxy))
+                running.add(task)
+                task.add_done_callback(running.discard)
+        finally:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+
+class Revalidator(threading.Thread):
+    """Run :meth:`RevalidationScheduler.run` on an event loop of its own until :meth:`stop`."""
+
+    def __init__(self, scheduler: RevalidationScheduler, checker, concurrency: int = Config.CHECK_CONCURRENCY):
+        super().__init__(name="revalidator", daemon=True)
+        self.scheduler = scheduler
+        self.checker = checker
+        self.concurrency = concurrency
+        self._ready = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopped: Optional[asyncio.Event] = None
+
+    def run(self) -> None:
+        asyncio.run(self._main())
+
+    async def _main(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self._ready.set()
+        await self.scheduler.run(self.checker, self.concurrency, self._stopped)
+
+    def stop(self) -> None:
+        self._ready.wait()
+        if self._loop is not None and self._stopped is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+
+
+def revalidated(
+    fetch: Callable[[], List[ProxyAddress]],
+    scheduler: RevalidationScheduler,
+    fetch_interval: float,
+    clock: Callable[[], float] = time.monotonic,
+) -> Callable[[], List[ProxyAddress]]:
+    """Wrap ``fetch`` into a pool refresh returning the proxies ``scheduler`` last found alive.
+
+    The sources are fetched again, and new proxies scheduled, at most every ``fetch_interval``
+    seconds, so the refresh itself can run as often as the pool should follow the checks.
+    """
+    fetched_at: Optional[float] = None
+
+    def refresh() -> List[ProxyAddress]:
+        nonlocal fetched_at
+        now = clock()
+        if fetched_at is None or now - fetched_at >= fetch_interval:
+            proxies = fetch()
+            fetched_at = now
+            logger.info(f"Scheduled {scheduler.add(proxies)} new proxies for revalidation")
+        return scheduler.alive()
+
+    return refresh
+
+
+async def _wait(stop: Optional[asyncio.Event], timeout: float) -> None:
+    if stop is None:
+        await asyncio.sleep(timeout)
+        return
+    try:
+        await asyncio.wait_for(stop.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+
+
+def _key(proxy: ProxyAddress) -> tuple:
+    return proxy.ip, int(proxy.port), proxy.protocol
@@ -1,18 +1,124 @@
 import logging
 import os
 from pathlib import Path
+from typing import Dict, Optional
 
 
 class Config:
-    GEO_NODE_URL = "https://proxylist.geonode.com/api/proxy-list?limit=200&page=1&sort_by=lastChecked&sort_type=desc&speed=fast"  # noqa
+    GEO_NODE_PAGE_URL = "https://proxylist.geonode.com/api/proxy-list?limit={limit}&page={page}&sort_by=lastChecked&sort_type=desc&speed=fast"  # noqa
+    GEO_NODE_URL = GEO_NODE_PAGE_URL.format(limit=200, page=1)
     FREE_PROXY_NET_URL = "https://free-proxy-list.net/"
     FREE_PROXY_CZ_URL = "http://free-proxy.cz/en/proxylist/country/all/socks/ping/all/1"
 
     CACHE_DIR = Path(__file__).resolve(True).parent.parent / ".pyroxy_cache"
+    CACHE_INDEX_NAME = ".index.json"
+    DATABASE_FILE = CACHE_DIR / ".proxies.sqlite3"
+    # every fetched response, compressed and keyed by content hash; a size of 0 turns it off
+    RESPONSE_CACHE_DIR = CACHE_DIR / "responses"
+    RESPONSE_CACHE_SIZE = 64 * 1024 * 1024
+    # harvests remembered for replay
+    RESPONSE_CACHE_HISTORY = 10000
+    # seconds a source's stored proxies are served before it is fetched again
+    DATABASE_TTL = 600
+    # the published pool, mapped by worker processes; generations of it kept on disk
+    SNAPSHOT_DIR = CACHE_DIR / "snapshot"
+    SNAPSHOT_KEEP = 2
+    # re-reads of a control file caught mid-publish, sleeping up to 1ms, 2ms, ... 10ms in between
+    SNAPSHOT_READ_RETRIES = 20
+    # GeoLite2 databases, as .mmdb files or the CSV downloads
+    GEO_DIR = CACHE_DIR / "geo"
+    GEO_COUNTRY_MMDB = "GeoLite2-Country.mmdb"
+    GEO_ASN_MMDB = "GeoLite2-ASN.mmdb"
+    GEO_COUNTRY_BLOCKS = "GeoLite2-Country-Blocks-IPv4.csv"
+    GEO_COUNTRY_LOCATIONS = "GeoLite2-Country-Locations-en.csv"
+    GEO_ASN_BLOCKS = "GeoLite2-ASN-Blocks-IPv4.csv"
     LOG_DIR = Path(__file__).resolve(True).parent.parent / "logs"
 
     LOG_FILE = LOG_DIR / "pyroxy.log"
 
+    # seconds allowed for a single source before its results are dropped
+    FETCH_TIMEOUT = 15.0
+    SOURCE_TIMEOUTS: Dict[str, float] = {}
+    # seconds a whole refresh may take; sources still running then are dropped, None waits for all
+    FETCH_DEADLINE = 60.0
+    # seconds a paged source may spend on all of its pages; the proxies read by then are kept
+    PAGE_WALK_DEADLINE = 45.0
+    # retries of a failed request within its source's timeout, after up to 0.25s, 0.5s, ... of jitter
+    FETCH_RETRIES = 2
+    FETCH_BACKOFF = 0.25
+    FETCH_MAX_BACKOFF = 2.0
+    # a request slower than this percentile of its source's recent ones is sent again; None never hedges
+    HEDGE_PERCENTILE = 95.0
+    HEDGE_MIN_SAMPLES = 5
+    LATENCY_WINDOW = 50
+
+    # requests per second, and burst size, allowed against one host unless its sources say otherwise
+    SOURCE_RATE_LIMIT = 2.0
+    SOURCE_BURST = 4
+    SOURCE_ENTRY_POINT = "pyroxy.sources"
+    # keep-alive connections kept per host by the shared HTTP session
+    HTTP_POOL_SIZE = 16
+    # threads running blocking requests, hedges and abandoned ones included
+    FETCH_THREADS = 32
+
+    # processes parsing fetched pages; 0 parses on the event loop
+    PARSE_WORKERS = 0
+    # fetched responses allowed to wait for a parse worker before fetching is held back
+    PARSE_QUEUE_SIZE = 32
+
+    GEO_NODE_PAGE_SIZE = 200
+    GEO_NODE_CONCURRENCY = 4
+    # pages read from geonode; a runaway total must not page forever
+    GEO_NODE_MAX_PAGES = 25
+
+    # proxies formatted and written per write call by proxy_list_file
+    WRITE_CHUNK_SIZE = 10000
+
+    DAEMON_HOST = "127.0.0.1"
+    DAEMON_PORT = 8899
+    DAEMON_REFRESH_INTERVAL = 300
+
+    FORWARD_HOST = "127.0.0.1"
+    FORWARD_PORT = 8898
+    FORWARD_RETRIES = 3
+    FORWARD_BUFFER_SIZE = 256 * 1024
+
+    ROTATOR_FAILURE_THRESHOLD = 3
+    ROTATOR_COOLDOWN = 30.0
+    # assumed latency in ms for proxies nobody has measured yet
+    ROTATOR_DEFAULT_LATENCY = 1000.0
+
+    CHECK_URL = "http://www.gstatic.com/generate_204"
+    CHECK_CONCURRENCY = 500
+    CHECK_CONNECT_TIMEOUT = 5.0
+    CHECK_READ_TIMEOUT = 10.0
+
+    # the judge has to be reachable from the proxies under test, hence all interfaces
+    JUDGE_HOST = "0.0.0.0"
+    JUDGE_PORT = 8897
+    # where proxies reach a running judge, e.g. "http://203.0.113.7:8897/"
+    JUDGE_URL: Optional[str] = None
+    JUDGE_MAX_HEADERS = 100
+    JUDGE_MAX_RESPONSE = 64 * 1024
+
+    # seconds between checks of a plain live proxy, scaled down for valuable ones and up on failures
+    REVALIDATE_INTERVAL = 300.0
+    REVALIDATE_MIN_INTERVAL = 30.0
+    REVALIDATE_MAX_INTERVAL = 24 * 60 * 60.0
+    # global budget of checks per second
+    REVALIDATE_RATE = 50.0
+    REVALIDATE_EVICT_AFTER = 8
+    # seconds between updates of a served pool from the revalidation results
+    REVALIDATE_POOL_INTERVAL = 15.0
+
+    # share of each metric in a proxy's rank score
+    RANK_WEIGHTS = {"latency": 0.6, "speed": 0.2, "uptime": 0.2}
+    # latency in ms and speed in bytes per second that score half
+    RANK_LATENCY_SCALE = 1000.0
+    RANK_SPEED_SCALE = 100000.0
+    # assumed uptime in percent for proxies whose source does not give one
+    RANK_DEFAULT_UPTIME = 50.0
+
     HEADERS = {
         "Connection": "keep-alive",
         "Pragma": "no-cache",
@@ -24,7 +130,15 @@ class Config:
     }
 
 
+_is_setup = False
+
+
 def setup():
+    """Create the working directories and configure logging, once per process."""
+    global _is_setup
+    if _is_setup:
+        return
+    _is_setup = True
     setup_cache_directory()
     setup_logger()
 
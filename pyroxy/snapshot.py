@@ -0,0 +1,174 @@
+"""Versioned pool snapshots that many processes map read-only and follow through a generation counter."""
+import logging
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple, Union
+
+from .address import ProxyAddress
+from .settings import Config
+from .writers import BinaryProxyFile, write_proxies
+
+logger = logging.getLogger("snapshot")
+
+CONTROL_MAGIC = b"PYRG"
+CONTROL_VERSION = 1
+# magic, version, pad, generation, generation again; the counters are 8 byte aligned
+CONTROL = struct.Struct("<4sH2xQQ")
+_GENERATION_OFFSET = 8
+_CHECK_OFFSET = 16
+_COUNTER = struct.Struct("<Q")
+
+
+def _control_path(directory: Path) -> Path:
+    return directory / "control"
+
+
+def _pool_path(directory: Path, generation: int) -> Path:
+    return directory / f"pool.{generation}.bin"
+
+
+def publish_snapshot(
+    proxies: Iterable[ProxyAddress],
+    directory: Union[str, Path] = Config.SNAPSHOT_DIR,
+    keep: int = Config.SNAPSHOT_KEEP,
+) -> int:
+    """Write ``proxies`` as the next generation of the snapshot in ``directory``; returns that generation.
+
+    The pool goes to its own file in the ``binary`` format first and only then is the counter
+    in ``control`` bumped, so readers switch to a complete pool or keep the previous one. Files
+    of generations older than the last ``keep`` are removed; readers that still map one keep
+    it alive on POSIX systems. There must be a single publisher per directory.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    control = _control_path(directory)
+    if not control.exists():
+        tmp_file = control.with_name(f".control.{os.getpid()}.tmp")
+        tmp_file.write_bytes(CONTROL.pack(CONTROL_MAGIC, CONTROL_VERSION, 0, 0))
+        os.replace(tmp_file, control)
+
+    with open(control, "r+b") as f, mmap.mmap(f.fileno(), CONTROL.size) as view:
+        # as the only publisher, a torn control file can only be left by one that died mid-write
+        generation = _read_generation(view, retries=0)
+        if _read_counters(view) != (generation, generation):
+            logger.warning(f"Repairing snapshot control file at generation {generation}")
+            _COUNTER.pack_into(view, _CHECK_OFFSET, generation)
+            _COUNTER.pack_into(view, _GENERATION_OFFSET, generation)
+            view.flush()
+        generation += 1
+        count = write_proxies(_pool_path(directory, generation), proxies, "binary")
+        # the check copy first: a reader that sees the new generation also sees a matching check
+        _COUNTER.pack_into(view, _CHECK_OFFSET, generation)
+        _COUNTER.pack_into(view, _GENERATION_OFFSET, generation)
+        view.flush()
+
+    for path in directory.glob("pool.*.bin"):
+        try:
+            old = int(path.name.split(".")[1])
+        except ValueError:
+            continue
+        if old <= generation - keep:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+    logger.info(f"Published snapshot generation {generation}: {count} proxies")
+    return generation
+
+
+def _read_counters(view: mmap.mmap) -> Tuple[int, int]:
+    (generation,) = _COUNTER.unpack_from(view, _GENERATION_OFFSET)
+    (check,) = _COUNTER.unpack_from(view, _CHECK_OFFSET)
+    return generation, check
+
+
+def _read_generation(view: mmap.mmap, retries: int = Config.SNAPSHOT_READ_RETRIES) -> int:
+    """The published generation; counters that still disagree after ``retries`` re-reads give the newer one.
+
+    The check copy is written first and only after the pool, so the newer of the two always names a
+    complete pool, even when its publisher died before the second write.
+    """
+    magic, version, generation, check = CONTROL.unpack_from(view)
+    if magic != CONTROL_MAGIC or version != CONTROL_VERSION:
+        raise ValueError(f"Not a version {CONTROL_VERSION} snapshot control file")
+    for attempt in range(retries):
+        if generation == check:
+            return generation
+        # caught between the two writes of a publish
+        time.sleep(min(0.001 * 2 ** attempt, 0.01))
+        generation, check = _read_counters(view)
+    if generation != check:
+        logger.debug(f"Snapshot counters disagree ({generation} and {check}), using the newer")
+    return max(generation, check)
+
+
+class PoolSnapshot:
+    """Reader side of :func:`publish_snapshot`: the latest pool, mapped without copying or parsing.
+
+    :meth:`refresh` compares the generation counter with the mapped one, which costs a few
+    bytes read from shared pages, and attaches the newer pool when there is one. Records are
+    unpacked on access, see :class:`BinaryProxyFile`.
+    """
+
+    def __init__(self, directory: Union[str, Path] = Config.SNAPSHOT_DIR):
+        self.directory = Path(directory)
+        with open(_control_path(self.directory), "rb") as f:
+            self._control = mmap.mmap(f.fileno(), CONTROL.size, access=mmap.ACCESS_READ)
+        self.generation = 0
+        self.pool: Optional[BinaryProxyFile] = None
+        self.refresh()
+
+    def __enter__(self) -> "PoolSnapshot":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._detach()
+        self._control.close()
+
+    def refresh(self) -> bool:
+        """Attach the latest published pool; False if it is the one already attached."""
+        generation = _read_generation(self._control)
+        if generation == self.generation:
+            return False
+        while True:
+            try:
+                pool = BinaryProxyFile(_pool_path(self.directory, generation))
+                break
+            except FileNotFoundError:
+                # removed by later publishes while we were looking
+                latest = _read_generation(self._control)
+                if latest == generation:
+                    raise
+                generation = latest
+        self._detach()
+        self.pool, self.generation = pool, generation
+        return True
+
+    def _detach(self) -> None:
+        if self.pool is not None:
+            try:
+                self.pool.close()
+            except BufferError:
+                # records of it are still being iterated; the mapping goes with the last of them
+                pass
+            self.pool = None
+
+    def __len__(self) -> int:
+        return len(self.pool) if self.pool is not None else 0
+
+    def __getitem__(self, index: int) -> ProxyAddress:
+        if self.pool is None:
+            raise IndexError(index)
+        return self.pool[index]
+
+    def __iter__(self) -> Iterator[ProxyAddress]:
+        return iter(self.pool) if self.pool is not None else iter(())
+
+    def records(self) -> Iterator[tuple]:
+        return self.pool.records() if self.pool is not None else iter(())
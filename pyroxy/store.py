@@ -0,0 +1,264 @@
+"""Columnar in-memory proxy pool with mask based filtering."""
+import heapq
+import math
+import socket
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import compress
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple, Union
+
+from .address import Anonymity, Protocol, ProxyAddress, Speed, SpeedType
+
+if TYPE_CHECKING:
+    from .geo import GeoIndex
+
+_IPV4 = struct.Struct("!I")
+# country codes from this one on share a byte in the country column and keep row lists instead
+_OVERFLOW = 255
+
+
+def pack_ip(ip: str) -> int:
+    return _IPV4.unpack(socket.inet_aton(ip))[0]
+
+
+def unpack_ip(value: int) -> str:
+    return socket.inet_ntoa(_IPV4.pack(value))
+
+
+def _speed_value(speed, speed_type: SpeedType) -> float:
+    if isinstance(speed, str):
+        speed = Speed.parse(speed)
+    if isinstance(speed, Speed) and speed.speed_type == speed_type and speed.value >= 0:
+        return float(speed.value)
+    return math.nan
+
+
+def proxy_latency(proxy: ProxyAddress) -> float:
+    """Measured latency if known, else the advertised response time, else NaN."""
+    latency = _speed_value(proxy.latency, SpeedType.TIME)
+    return _speed_value(proxy.response, SpeedType.TIME) if math.isnan(latency) else latency
+
+
+def proxy_speed(proxy: ProxyAddress) -> float:
+    """Advertised throughput in bytes per second, else NaN."""
+    return _speed_value(proxy.speed, SpeedType.BPS)
+
+
+def proxy_uptime(proxy: ProxyAddress) -> float:
+    """Advertised uptime in percent, else NaN."""
+    return _speed_value(proxy.uptime, SpeedType.PERCENT)
+
+
+def proxy_to_dict(proxy: ProxyAddress) -> dict:
+    latency = proxy_latency(proxy)
+    return {
+        "ip": proxy.ip,
+        "port": int(proxy.port),
+        "protocol": proxy.protocol.name,
+        "anonymity": proxy.anonymity.name,
+        "country": proxy.country,
+        "google": bool(proxy.google),
+        "latency": None if math.isnan(latency) else latency,
+    }
+
+
+class ProxyStore:
+    """Proxies kept column by column: packed IPv4, uint16 port, one byte per enum and float metrics.
+
+    Categorical filters are evaluated as byte masks with ``bytes.translate`` and combined with
+    integer AND, so a query costs a few C-level passes over the columns rather than a Python loop
+    per proxy. Only the columns listed above plus ``updated`` are kept; ``response`` is folded into
+    ``latency``, and ``speed`` and ``uptime`` are kept as bytes per second and percent.
+
+    With a ``geo`` index every proxy is also tagged with its ASN, and countries are stored as two
+    letter codes from the index, or normalised from what the source gave.
+    """
+
+    def __init__(self, proxies: Iterable[ProxyAddress] = (), geo: Optional["GeoIndex"] = None):
+        self.geo = geo
+        self._ip = array("I")
+        self._port = array("H")
+        self._protocol = bytearray()
+        self._anonymity = bytearray()
+        self._google = bytearray()
+        self._country = bytearray()
+        self._latency = array("d")
+        self._speed = array("d")
+        self._uptime = array("d")
+        # 0 where the ASN is unknown
+        self._asn = array("I")
+        self._updated: List[str] = []
+
+        self._other_ips: Dict[int, str] = {}
+        self._countries: List[str] = []
+        self._country_codes: Dict[str, int] = {}
+        self._overflow_rows: Dict[int, array] = {}
+        self._overflow_country: Dict[int, int] = {}
+        self._latency_index: Optional[Tuple[array, array]] = None
+
+        self.extend(proxies)
+
+    def __len__(self) -> int:
+        return len(self._port)
+
+    def __getitem__(self, row: int) -> ProxyAddress:
+        latency, speed, uptime = self._latency[row], self._speed[row], self._uptime[row]
+        ip = self._other_ips.get(row) or unpack_ip(self._ip[row])
+        return ProxyAddress(
+            ip,
+            self._port[row],
+            Protocol(self._protocol[row]),
+            self._countries[self._overflow_country.get(row, self._country[row])],
+            self._updated[row],
+            Anonymity(self._anonymity[row]),
+            google=bool(self._google[row]),
+            speed=None if math.isnan(speed) else Speed(SpeedType.BPS, speed),
+            uptime=None if math.isnan(uptime) else Speed(SpeedType.PERCENT, uptime),
+            latency=None if math.isnan(latency) else Speed(SpeedType.TIME, latency),
+        )
+
+    def __iter__(self):
+        return (self[row] for row in range(len(self)))
+
+    def add(self, proxy: ProxyAddress) -> int:
+        row = len(self)
+        try:
+            self._ip.append(pack_ip(proxy.ip))
+        except (OSError, TypeError):
+            self._ip.append(0)
+            self._other_ips[row] = proxy.ip
+        self._port.append(int(proxy.port))
+        self._protocol.append(proxy.protocol.value)
+        self._anonymity.append(proxy.anonymity.value)
+        self._google.append(1 if proxy.google else 0)
+        self._latency.append(proxy_latency(proxy))
+        self._speed.append(proxy_speed(proxy))
+        self._uptime.append(proxy_uptime(proxy))
+        self._updated.append(proxy.updated)
+
+        country = proxy.country or ""
+        asn = 0
+        if self.geo is not None:
+            info = self.geo.lookup(proxy.ip)
+            country = info.country or self.geo.normalize(country) or country
+            asn = info.asn or 0
+        self._asn.append(asn)
+
+        code = self._country_codes.get(country)
+        if code is None:
+            code = self._country_codes[country] = len(self._countries)
+            self._countries.append(country)
+        if code < _OVERFLOW:
+            self._country.append(code)
+        else:
+            self._country.append(_OVERFLOW)
+            self._overflow_country[row] = code
+            self._overflow_rows.setdefault(code, array("I")).append(row)
+
+        self._latency_index = None
+        return row
+
+    def asn(self, row: int) -> Optional[int]:
+        return self._asn[row] or None
+
+    def columns(self, rows: Optional[Iterable[int]] = None) -> Tuple[array, array, array]:
+        """Latency in ms, speed in bytes per second and uptime in percent of ``rows``, or of every row."""
+        if rows is None:
+            return self._latency, self._speed, self._uptime
+        rows = list(rows)
+        latency, speed, uptime = (
+            array("d", map(column.__getitem__, rows)) for column in (self._latency, self._speed, self._uptime)
+        )
+        return latency, speed, uptime
+
+    def extend(self, proxies: Iterable[ProxyAddress]) -> None:
+        for proxy in proxies:
+            self.add(proxy)
+
+    def mask(
+        self,
+        protocols: Optional[Iterable[Protocol]] = None,
+        anonymity: Optional[Iterable[Anonymity]] = None,
+        google: Optional[bool] = None,
+        countries: Optional[Iterable[str]] = None,
+        latency: Optional[Tuple[float, float]] = None,
+        asns: Optional[Iterable[int]] = None,
+    ) -> bytes:
+        """Return one byte per row, 1 where the row passes every given filter."""
+        masks: List[Union[bytes, bytearray]] = []
+        if protocols:
+            masks.append(_in_mask(self._protocol, {p.value for p in protocols}))
+        if anonymity:
+            masks.append(_in_mask(self._anonymity, {a.value for a in anonymity}))
+        if google is not None:
+            masks.append(_in_mask(self._google, {1 if google else 0}))
+        if countries is not None:
+            # like ProxyQuery, a country matches by its text or by its two letter code
+            from .geo import normalize_country
+
+            names = set(countries)
+            codes = {
+                code
+                for country, code in self._country_codes.items()
+                if country in names or normalize_country(country) in names
+            }
+            mask = bytearray(_in_mask(self._country, codes - {_OVERFLOW}))
+            for code in codes:
+                for row in self._overflow_rows.get(code, ()):
+                    mask[row] = 1
+            masks.append(mask)
+        if latency is not None:
+            masks.append(self._latency_mask(*latency))
+        if asns is not None:
+            wanted = set(asns)
+            masks.append(bytes(asn in wanted for asn in self._asn))
+
+        if not masks:
+            return b"\x01" * len(self)
+        result = int.from_bytes(masks[0], "little")
+        for other in masks[1:]:
+            result &= int.from_bytes(other, "little")
+        return result.to_bytes(len(self), "little")
+
+    def query(self, **filters) -> List[int]:
+        """Row numbers matching ``filters``; see :meth:`mask` for the accepted keywords."""
+        return list(compress(range(len(self)), self.mask(**filters)))
+
+    def select(self, **filters) -> List[ProxyAddress]:
+        return [self[row] for row in self.query(**filters)]
+
+    def distinct_asns(self, count: int, **filters) -> List[ProxyAddress]:
+        """Up to ``count`` proxies matching ``filters``, each from a different ASN and the fastest in it."""
+        latency = self._latency
+        best: Dict[int, int] = {}
+        for row in self.query(**filters):
+            asn = self._asn[row]
+            if not asn:
+                continue
+            current = best.get(asn)
+            if current is None or _sort_latency(latency[row]) < _sort_latency(latency[current]):
+                best[asn] = row
+        rows = heapq.nsmallest(count, best.values(), key=lambda row: _sort_latency(latency[row]))
+        return [self[row] for row in rows]
+
+    def _latency_mask(self, low: float, high: float) -> bytearray:
+        if self._latency_index is None:
+            latency = self._latency
+            known = sorted((row for row in range(len(self)) if not math.isnan(latency[row])), key=latency.__getitem__)
+            self._latency_index = array("d", (latency[row] for row in known)), array("I", known)
+        values, rows = self._latency_index
+        start, stop = bisect_left(values, low), bisect_right(values, high)
+        mask = bytearray(len(self))
+        for row in rows[start:stop]:
+            mask[row] = 1
+        return mask
+
+
+def _sort_latency(latency: float) -> float:
+    return math.inf if math.isnan(latency) else latency
+
+
+def _in_mask(column: bytearray, codes: Iterable[int]) -> bytearray:
+    table = bytes(1 if code in codes else 0 for code in range(256))
+    return column.translate(table)
@@ -0,0 +1,242 @@
+"""Liveness and latency checks through harvested proxies."""
+import asyncio
+import ipaddress
+import logging
+import ssl
+import struct
+import time
+from dataclasses import replace
+from typing import Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from .address import Protocol, ProxyAddress, Speed, SpeedType
+from .metrics import metrics
+from .settings import Config
+
+logger = logging.getLogger("validator")
+
+Streams = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+class ProxyError(Exception):
+    """The proxy refused or mangled the handshake."""
+
+
+# what a dead, slow or broken proxy raises during a check
+CHECK_ERRORS = (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ProxyError, ValueError)
+
+
+def target_address(url: str) -> Tuple[str, int, str]:
+    parts = urlsplit(url)
+    if not parts.hostname:
+        raise ValueError(f"No host in {url!r}")
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    path = parts.path or "/"
+    if parts.query:
+        path = f"{path}?{parts.query}"
+    return parts.hostname, port, path
+
+
+async def open_tunnel(proxy: ProxyAddress, host: str, port: int, timeout: float) -> Streams:
+    """Connect to ``proxy`` and ask it for a raw TCP tunnel to ``host:port``."""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(proxy.ip, int(proxy.port)), timeout)
+    try:
+        if proxy.protocol == Protocol.SOCKS4:
+            await asyncio.wait_for(_socks4_handshake(reader, writer, host, port), timeout)
+        elif proxy.protocol == Protocol.SOCKS5:
+            await asyncio.wait_for(_socks5_handshake(reader, writer, host, port), timeout)
+        else:
+            await asyncio.wait_for(_connect_handshake(reader, writer, host, port), timeout)
+    except BaseException:
+        writer.close()
+        raise
+    return reader, writer
+
+
+async def _connect_handshake(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str, port: int):
+    writer.write(f"CONNECT {host}:{port} HTTP/1.1\r\nHost: {host}:{port}\r\n\r\n".encode())
+    await writer.drain()
+    status = await read_status(reader)
+    if status != 200:
+        raise ProxyError(f"CONNECT refused with {status}")
+
+
+async def _socks4_handshake(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str, port: int):
+    try:
+        address = ipaddress.IPv4Address(host).packed
+        suffix = b""
+    except ValueError:
+        # SOCKS4a: an invalid 0.0.0.x address tells the proxy to resolve the trailing host name
+        address = b"\x00\x00\x00\x01"
+        suffix = host.encode() + b"\x00"
+    writer.write(struct.pack("!BBH", 4, 1, port) + address + b"\x00" + suffix)
+    await writer.drain()
+    reply = await reader.readexactly(8)
+    if reply[1] != 0x5A:
+        raise ProxyError(f"SOCKS4 request rejected with {reply[1]:#x}")
+
+
+async def _socks5_handshake(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str, port: int):
+    writer.write(b"\x05\x01\x00")
+    await writer.drain()
+    version, method = await reader.readexactly(2)
+    if version != 5 or method != 0:
+        raise ProxyError("SOCKS5 proxy requires authentication")
+
+    name = host.encode()
+    writer.write(b"\x05\x01\x00\x03" + bytes([len(name)]) + name + struct.pack("!H", port))
+    await writer.drain()
+    version, reply, _, address_type = await reader.readexactly(4)
+    if reply != 0:
+        raise ProxyError(f"SOCKS5 request rejected with {reply:#x}")
+    if address_type == 1:
+        await reader.readexactly(4 + 2)
+    elif address_type == 4:
+        await reader.readexactly(16 + 2)
+    else:
+        length = (await reader.readexactly(1))[0]
+        await reader.readexactly(length + 2)
+
+
+async def start_tls(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    host: str,
+    timeout: float,
+    context: Optional[ssl.SSLContext] = None,
+) -> Streams:
+    """Upgrade an open tunnel to TLS with ``host``; the returned writer replaces ``writer``."""
+    context = context or ssl.create_default_context()
+    if hasattr(writer, "start_tls"):
+        # Python 3.11+, whose writers close their transport once they are dropped
+        await asyncio.wait_for(writer.start_tls(context, server_hostname=host), timeout)
+        return reader, writer
+    loop = asyncio.get_running_loop()
+    protocol = writer.transport.get_protocol()
+    upgrade = loop.start_tls(writer.transport, protocol, context, server_hostname=host)
+    transport = await asyncio.wait_for(upgrade, timeout)
+    if transport is None:
+        raise ProxyError("Tunnel closed during the TLS handshake")
+    return reader, asyncio.StreamWriter(transport, protocol, reader, loop)
+
+
+async def read_status(reader: asyncio.StreamReader) -> int:
+    """Read an HTTP response head and return its status code."""
+    status_line = await reader.readline()
+    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+        pass
+    try:
+        return int(status_line.split()[1])
+    except (IndexError, ValueError):
+        raise ProxyError(f"Bad status line: {status_line[:40]!r}")
+
+
+class ProxyChecker:
+    """Check many proxies at once against ``url`` with a bounded number of open connections."""
+
+    def __init__(
+        self,
+        url: str = Config.CHECK_URL,
+        concurrency: int = Config.CHECK_CONCURRENCY,
+        connect_timeout: float = Config.CHECK_CONNECT_TIMEOUT,
+        read_timeout: float = Config.CHECK_READ_TIMEOUT,
+        ssl_context: Optional[ssl.SSLContext] = None,
+    ):
+        if urlsplit(url).scheme not in ("http", "https"):
+            raise ValueError(f"Cannot check proxies against {url}: only http and https URLs are supported")
+        self.url = url
+        self.concurrency = concurrency
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.ssl_context = ssl_context
+
+    async def send_request(self, proxy: ProxyAddress) -> Streams:
+        """Connect through ``proxy`` and send it a ``GET`` of :attr:`url`; the response is left to read.
+
+        Plain ``http`` URLs go to HTTP and HTTPS proxies as absolute-form requests, the way browsers
+        use them, rather than through CONNECT, which most proxies only allow to port 443. ``https``
+        URLs are tunnelled through every kind of proxy and the tunnel is wrapped in TLS.
+        """
+        host, port, path = target_address(self.url)
+        secure = urlsplit(self.url).scheme == "https"
+        if proxy.protocol in (Protocol.HTTP, Protocol.HTTPS, Protocol.UNKNOWN) and not secure:
+            connection = asyncio.open_connection(proxy.ip, int(proxy.port))
+            reader, writer = await asyncio.wait_for(connection, self.connect_timeout)
+            path = self.url
+        else:
+            reader, writer = await open_tunnel(proxy, host, port, self.connect_timeout)
+        try:
+            if secure:
+                reader, writer = await start_tls(reader, writer, host, self.connect_timeout, self.ssl_context)
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+            await writer.drain()
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer
+
+    async def check(self, proxy: ProxyAddress) -> Optional[float]:
+        """Return the round trip of one request through ``proxy`` in milliseconds, or None if it failed."""
+        start = time.perf_counter()
+        writer = None
+        try:
+            reader, writer = await self.send_request(proxy)
+            status = await asyncio.wait_for(read_status(reader), self.read_timeout)
+        except CHECK_ERRORS as e:
+            logger.debug(f"{proxy.ip}:{proxy.port} dead: {e!r}")
+            return None
+        finally:
+            if writer is not None:
+                writer.close()
+
+        if not 200 <= status < 400:
+            logger.debug(f"{proxy.ip}:{proxy.port} dead: status {status}")
+            return None
+        return (time.perf_counter() - start) * 1000
+
+    async def validate(self, proxies: Iterable[ProxyAddress], limit: Optional[int] = None) -> List[ProxyAddress]:
+        """Return the live proxies with a measured ``latency``, dropping the dead ones.
+
+        Once ``limit`` live proxies are found the remaining checks are cancelled.
+        """
+        pending: Iterator[ProxyAddress] = iter(proxies)
+        alive: List[ProxyAddress] = []
+        done = asyncio.Event()
+
+        checked = 0
+
+        async def worker():
+            nonlocal checked
+            for proxy in pending:
+                latency = await self.check(proxy)
+                checked += 1
+                metrics.inc("validation_checks_total", result="failed" if latency is None else "ok")
+                if latency is None:
+                    continue
+                alive.append(replace(proxy, latency=Speed(SpeedType.TIME, round(latency, 2))))
+                if limit is not None and len(alive) >= limit:
+                    done.set()
+                    return
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(self.concurrency)]
+        finished = asyncio.ensure_future(asyncio.gather(*workers))
+        stopped = asyncio.ensure_future(done.wait())
+        try:
+            await asyncio.wait([finished, stopped], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in workers + [stopped]:
+                task.cancel()
+            await asyncio.gather(finished, return_exceptions=True)
+        for task in workers:
+            error = None if task.cancelled() else task.exception()
+            if error is not None:
+                raise error
+
+        logger.info(f"Validated : {len(alive)} alive")
+        if checked:
+            metrics.set("validation_success_rate", len(alive) / checked)
+        return alive[:limit] if limit is not None else alive
+
+
+def validate_proxies(proxies: Iterable[ProxyAddress], limit: Optional[int] = None, **kwargs) -> List[ProxyAddress]:
+    return asyncio.run(ProxyChecker(**kwargs).validate(proxies, limit))
@@ -0,0 +1,254 @@
+"""Streaming proxy list writers and a memory-mapped reader for the binary format."""
+import csv
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+from abc import ABC, abstractmethod
+from itertools import islice
+from pathlib import Path
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Set, Type, Union
+
+from .address import Anonymity, Protocol, ProxyAddress, Speed, SpeedType
+from .geo import normalize_country
+from .settings import Config
+from .store import pack_ip, proxy_latency, proxy_to_dict, unpack_ip
+
+logger = logging.getLogger("writers")
+
+WRITERS: Dict[str, Type["ProxyWriter"]] = {}
+
+BINARY_MAGIC = b"PYRX"
+BINARY_VERSION = 1
+# magic, version, record size, record count
+BINARY_HEADER = struct.Struct("<4sHHQ")
+# ip, port, protocol, anonymity, google, country code, pad, latency in ms (NaN if unknown)
+BINARY_RECORD = struct.Struct("<IHBBB2sxf")
+
+
+class ProxyWriter(ABC):
+    """Writes proxies to an open file one chunk at a time.
+
+    Subclasses that set ``name`` are registered as an output format under it.
+    """
+
+    name: Optional[str] = None
+    binary = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.__dict__.get("name"):
+            WRITERS[cls.name] = cls
+
+    def __init__(self, f: IO):
+        self.f = f
+        self.count = 0
+
+    def begin(self) -> None:
+        pass
+
+    @abstractmethod
+    def write(self, proxies: List[ProxyAddress]) -> None:
+        raise NotImplementedError
+
+    def end(self) -> None:
+        pass
+
+
+class TextWriter(ProxyWriter):
+    """Unique ``ip:port`` lines."""
+
+    name = "text"
+
+    def __init__(self, f: IO):
+        super().__init__(f)
+        self.seen: Set[str] = set()
+
+    def write(self, proxies: List[ProxyAddress]) -> None:
+        lines = []
+        for proxy in proxies:
+            line = f"{proxy.ip}:{proxy.port}"
+            if line not in self.seen:
+                self.seen.add(line)
+                lines.append(line)
+        if lines:
+            self.f.write(("\n" if self.count else "") + "\n".join(lines))
+            self.count += len(lines)
+
+
+class NDJSONWriter(ProxyWriter):
+    """One JSON object per line, shaped like the daemon's API responses."""
+
+    name = "ndjson"
+
+    def write(self, proxies: List[ProxyAddress]) -> None:
+        self.f.write("".join(json.dumps(proxy_to_dict(proxy)) + "\n" for proxy in proxies))
+        self.count += len(proxies)
+
+
+class CSVWriter(ProxyWriter):
+    name = "csv"
+    fields = ("ip", "port", "protocol", "anonymity", "country", "google", "latency")
+
+    def begin(self) -> None:
+        self.writer = csv.writer(self.f)
+        self.writer.writerow(self.fields)
+
+    def write(self, proxies: List[ProxyAddress]) -> None:
+        rows = (proxy_to_dict(proxy) for proxy in proxies)
+        self.writer.writerows([row[field] for field in self.fields] for row in rows)
+        self.count += len(proxies)
+
+
+class BinaryWriter(ProxyWriter):
+    """Fixed size little endian records after a short header, see :class:`BinaryProxyFile`.
+
+    Only IPv4 endpoints with a port below 65536 fit; others are skipped. Countries are kept as two letter codes and
+    ``updated`` is dropped.
+    """
+
+    name = "binary"
+    binary = True
+
+    def begin(self) -> None:
+        self.skipped = 0
+        self.f.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, BINARY_RECORD.size, 0))
+
+    def write(self, proxies: List[ProxyAddress]) -> None:
+        buffer = bytearray(BINARY_RECORD.size * len(proxies))
+        offset = 0
+        for proxy in proxies:
+            try:
+                BINARY_RECORD.pack_into(
+                    buffer,
+                    offset,
+                    pack_ip(proxy.ip),
+                    int(proxy.port),
+                    proxy.protocol.value,
+                    proxy.anonymity.value,
+                    bool(proxy.google),
+                    _country_code(proxy.country),
+                    proxy_latency(proxy),
+                )
+            except (OSError, TypeError, ValueError, struct.error) as e:
+                logger.debug(f"Skipping {proxy.ip}:{proxy.port}: {e}")
+                self.skipped += 1
+                continue
+            offset += BINARY_RECORD.size
+        self.f.write(memoryview(buffer)[:offset])
+        self.count += offset // BINARY_RECORD.size
+
+    def end(self) -> None:
+        if self.skipped:
+            logger.info(f"Skipped {self.skipped} proxies without an IPv4 address and a valid port")
+        self.f.seek(0)
+        self.f.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, BINARY_RECORD.size, self.count))
+        self.f.seek(0, os.SEEK_END)
+
+
+def _country_code(country: Optional[str]) -> bytes:
+    code = normalize_country(country)
+    return code.encode("ascii") if code and code.isascii() else b"\0\0"
+
+
+def _chunks(proxies: Iterable[ProxyAddress], size: int) -> Iterator[List[ProxyAddress]]:
+    proxies = iter(proxies)
+    while True:
+        chunk = list(islice(proxies, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def write_proxies(
+    filename: Union[str, Path],
+    proxies: Iterable[ProxyAddress],
+    fmt: str = "text",
+    chunk_size: int = Config.WRITE_CHUNK_SIZE,
+) -> int:
+    """Stream ``proxies`` to ``filename`` in format ``fmt``, ``chunk_size`` at a time; returns the count written.
+
+    The output goes to a temporary file next to ``filename`` that replaces it once complete, so
+    readers see either the previous file or the new one, never a partial write.
+    """
+    writer_class = WRITERS[fmt]
+    path = Path(filename)
+    tmp_file = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    mode, newline = ("wb", None) if writer_class.binary else ("w", "")
+    try:
+        with open(tmp_file, mode, newline=newline) as f:
+            writer = writer_class(f)
+            writer.begin()
+            for chunk in _chunks(proxies, chunk_size):
+                writer.write(chunk)
+            writer.end()
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, path)
+    except BaseException:
+        if tmp_file.exists():
+            tmp_file.unlink()
+        raise
+    return writer.count
+
+
+class BinaryProxyFile:
+    """Read-only memory map of a file written in the ``binary`` format.
+
+    Records are unpacked from the mapping on access; opening a file only checks its header, so
+    even millions of proxies are available at once without a parse step.
+    """
+
+    def __init__(self, filename: Union[str, Path]):
+        with open(filename, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size, count = BINARY_HEADER.unpack_from(self._mmap)
+        if magic != BINARY_MAGIC or version != BINARY_VERSION or record_size != BINARY_RECORD.size:
+            self._mmap.close()
+            raise ValueError(f"{filename} is not a version {BINARY_VERSION} binary proxy file")
+        self.count = count
+        start, stop = BINARY_HEADER.size, BINARY_HEADER.size + count * record_size
+        self._records = memoryview(self._mmap)[start:stop]
+
+    def __enter__(self) -> "BinaryProxyFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._records.release()
+        self._mmap.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> ProxyAddress:
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return _to_proxy(BINARY_RECORD.unpack_from(self._records, index * BINARY_RECORD.size))
+
+    def __iter__(self) -> Iterator[ProxyAddress]:
+        return map(_to_proxy, self.records())
+
+    def records(self) -> Iterator[tuple]:
+        """Raw record tuples, as laid out in ``BINARY_RECORD``."""
+        return BINARY_RECORD.iter_unpack(self._records)
+
+
+def _to_proxy(record: tuple) -> ProxyAddress:
+    ip, port, protocol, anonymity, google, country, latency = record
+    return ProxyAddress(
+        unpack_ip(ip),
+        port,
+        Protocol(protocol),
+        country.decode("ascii") if country != b"\0\0" else "",
+        "",
+        Anonymity(anonymity),
+        google=bool(google),
+        latency=None if math.isnan(latency) else Speed(SpeedType.TIME, latency),
+    )
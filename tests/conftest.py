@@ -0,0 +1,226 @@
+import asyncio
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import pytest
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+
+def fixture_text(name: str) -> str:
+    return (FIXTURES / name).read_text()
+
+
+class StubServer:
+    """Local HTTP server serving canned responses, optionally after a delay."""
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        self.client_ports = []
+        self.keep_alive = False
+        # requests being served at once, and the most seen
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def route(self, path, body="", status=200, delay=0.0, headers=None):
+        if isinstance(body, str):
+            body = body.encode()
+        self.routes[path] = (status, body, delay, headers or {})
+        return self.url(path)
+
+    def url(self, path):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}{path}"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            @property
+            def protocol_version(self):
+                return "HTTP/1.1" if stub.keep_alive else "HTTP/1.0"
+
+            def do_GET(self):
+                stub.requests.append((self.path, dict(self.headers)))
+                stub.client_ports.append(self.client_address[1])
+                route = stub.routes.get(self.path) or stub.routes.get(self.path.split("?")[0])
+                status, body, delay, headers = route or (404, b"", 0.0, {})
+                if callable(body):
+                    status, body, headers = body(self)
+                with stub._lock:
+                    stub.active += 1
+                    stub.max_active = max(stub.max_active, stub.active)
+                try:
+                    if delay:
+                        time.sleep(delay)
+                finally:
+                    with stub._lock:
+                        stub.active -= 1
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def response_cache(tmp_path, monkeypatch):
+    """Keep the responses tests fetch out of the real cache directory."""
+    from pyroxy import fetch
+    from pyroxy.settings import Config
+
+    monkeypatch.setattr(Config, "RESPONSE_CACHE_DIR", tmp_path / "responses")
+    monkeypatch.setattr(fetch, "_response_cache", None)
+    return fetch.get_response_cache
+
+
+@pytest.fixture(autouse=True)
+def fetch_latencies():
+    """Start every test without the request latencies earlier tests taught the fetch policy."""
+    from pyroxy import fetch
+
+    fetch.policy.latency.reset()
+    yield fetch.policy.latency
+    fetch.policy.latency.reset()
+
+
+@pytest.fixture
+def stub_server():
+    server = StubServer()
+    server.start()
+    yield server
+    server.stop()
+
+
+class StubProxy:
+    """Loopback proxy speaking plain HTTP, CONNECT, SOCKS4a and SOCKS5, forwarding to the real target.
+
+    ``extra_headers`` are injected into forwarded plain HTTP requests, like a leaky proxy would.
+    With ``connect_ports``, CONNECT to any other port is refused, like Squid's default ACLs do.
+    """
+
+    def __init__(self, extra_headers=None, dead=False, connect_ports=None):
+        self.extra_headers = extra_headers or {}
+        self.dead = dead
+        self.connect_ports = connect_ports
+        self.connections = 0
+        self.server = None
+        self.port = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        if self.dead:
+            writer.close()
+            return
+        try:
+            first = await reader.readexactly(1)
+            if first == b"\x04":
+                upstream = await self._socks4(reader, writer)
+            elif first == b"\x05":
+                upstream = await self._socks5(reader, writer)
+            else:
+                upstream = await self._http(first, reader, writer)
+            await asyncio.gather(_pipe(reader, upstream[1]), _pipe(upstream[0], writer))
+            upstream[1].close()
+            writer.close()
+        except (OSError, asyncio.IncompleteReadError):
+            writer.close()
+
+    async def _socks4(self, reader, writer):
+        head = await reader.readexactly(7)
+        port = struct.unpack("!H", head[1:3])[0]
+        await reader.readuntil(b"\x00")
+        host = socket.inet_ntoa(head[3:7])
+        if host.startswith("0.0.0."):
+            host = (await reader.readuntil(b"\x00"))[:-1].decode()
+        upstream = await asyncio.open_connection(host, port)
+        writer.write(b"\x00\x5a" + head[1:7])
+        return upstream
+
+    async def _socks5(self, reader, writer):
+        methods = await reader.readexactly(1)
+        await reader.readexactly(methods[0])
+        writer.write(b"\x05\x00")
+        _, _, _, address_type = await reader.readexactly(4)
+        if address_type == 3:
+            host = (await reader.readexactly((await reader.readexactly(1))[0])).decode()
+        else:
+            host = socket.inet_ntoa(await reader.readexactly(4))
+        port = struct.unpack("!H", await reader.readexactly(2))[0]
+        upstream = await asyncio.open_connection(host, port)
+        writer.write(b"\x05\x00\x00\x01\x7f\x00\x00\x01\x00\x00")
+        return upstream
+
+    async def _http(self, first, reader, writer):
+        request_line = first + await reader.readline()
+        headers = []
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            headers.append(line)
+        method, target, version = request_line.decode().split()
+        if method == "CONNECT":
+            host, port = target.rsplit(":", 1)
+            if self.connect_ports is not None and int(port) not in self.connect_ports:
+                writer.write(b"HTTP/1.1 403 Forbidden\r\n\r\n")
+                await writer.drain()
+                raise OSError(f"CONNECT to port {port} refused")
+            upstream = await asyncio.open_connection(host, int(port))
+            writer.write(b"HTTP/1.1 200 Connection established\r\n\r\n")
+            return upstream
+
+        parts = urlsplit(target)
+        upstream = await asyncio.open_connection(parts.hostname, parts.port or 80)
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        extra = [f"{key}: {value}\r\n".encode() for key, value in self.extra_headers.items()]
+        upstream[1].write(f"{method} {path} {version}\r\n".encode() + b"".join(headers + extra) + b"\r\n")
+        return upstream
+
+
+async def _pipe(reader, writer):
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+        if writer.can_write_eof():
+            writer.write_eof()
+            return
+    except OSError:
+        pass
+    writer.close()
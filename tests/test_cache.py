@@ -0,0 +1,129 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from pyroxy import fetch, pyroxy
+from pyroxy.address import Anonymity
+from pyroxy.cache import ResponseCache
+from pyroxy.metrics import metrics
+from pyroxy.parser import FreeProxyNetParser
+from pyroxy.query import ProxyQuery
+from pyroxy.settings import Config
+
+from .conftest import fixture_text
+
+
+def test_put_load_and_dedup(tmp_path):
+    cache = ResponseCache(tmp_path, max_bytes=1 << 20, codec="gz")
+    page = fixture_text("free_proxy_net.html").encode()
+
+    digest = cache.put("freeproxy", "http://a/", page, "utf-8")
+    assert cache.put("freeproxy", "http://a/", page, "utf-8") == digest
+
+    assert len(cache) == 1 and cache.size < len(page) / 2
+    assert cache.load(digest) == page
+    assert cache.latest("freeproxy") == [("http://a/", digest, "utf-8")]
+    assert [h.digest for h in cache.history()] == [digest, digest]
+
+    reopened = ResponseCache(tmp_path, max_bytes=1 << 20)
+    assert reopened.load(digest) == page and reopened.size == cache.size
+
+
+def test_least_recently_used_are_evicted(tmp_path):
+    cache = ResponseCache(tmp_path, max_bytes=3500, codec="gz")
+    digests = [cache.put("s", f"http://a/{i}", os.urandom(1000)) for i in range(3)]
+    cache.remember(digests[0], "s", "all", "1.1", None, [])
+    cache.remember(digests[1], "s", "all", "1.1", None, [])
+
+    assert cache.load(digests[0]) is not None
+    digests.append(cache.put("s", "http://a/3", os.urandom(1000)))
+
+    assert cache.load(digests[1]) is None
+    assert cache.parsed(digests[1], "s", "all", "1.1") is None
+    assert cache.parsed(digests[0], "s", "all", "1.1") == (None, [])
+    assert cache.parsed(digests[0], "s", "all", "1.2") is None
+    assert cache.size <= 3500
+    assert {url for url, _, _ in cache.latest()} == {"http://a/0", "http://a/2", "http://a/3"}
+
+
+def test_parsed_results_count_towards_the_size(tmp_path):
+    cache = ResponseCache(tmp_path, max_bytes=4000, codec="gz")
+    first = cache.put("s", "http://a/0", os.urandom(1000))
+    cache.remember(first, "s", "all", "1.1", None, [["10.0.0.1", 80]] * 150)
+    assert cache.size > 3000
+
+    second = cache.put("s", "http://a/1", os.urandom(1000))
+    assert cache.parsed(first, "s", "all", "1.1") is None
+    assert not list((tmp_path / "parsed").rglob("*.json"))
+    assert len(cache) == 1 and cache.size == ResponseCache(tmp_path).size
+    assert cache.latest() == [("http://a/1", second, None)]
+
+
+def test_caches_sharing_a_directory_merge_their_index(tmp_path):
+    first = ResponseCache(tmp_path, max_bytes=1 << 20, codec="gz")
+    second = ResponseCache(tmp_path, max_bytes=1 << 20, codec="gz")
+    a = first.put("s", "http://a/", b"a" * 100)
+    b = second.put("s", "http://b/", b"b" * 100)
+    first.remember(a, "s", "all", "1.1", 1, [])
+
+    reopened = ResponseCache(tmp_path, max_bytes=1 << 20)
+    assert len(reopened) == 2 and reopened.size == first.size
+    assert sorted(reopened.latest()) == [("http://a/", a, None), ("http://b/", b, None)]
+    assert [h.digest for h in reopened.history()] == [a, b]
+    # the history is appended to its own file, not rewritten with the index
+    assert "history" not in json.loads((tmp_path / "index.json").read_text())
+
+
+def test_history_is_compacted(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "RESPONSE_CACHE_HISTORY", 2)
+    cache = ResponseCache(tmp_path, max_bytes=1 << 20, codec="gz")
+    digests = [cache.put("s", "http://a/", str(i).encode()) for i in range(5)]
+
+    assert len((tmp_path / "history.jsonl").read_bytes().splitlines()) <= 4
+    assert [h.digest for h in cache.history()] == digests[-2:]
+
+
+@pytest.fixture
+def freeproxy(stub_server, monkeypatch):
+    monkeypatch.setattr(FreeProxyNetParser, "url", stub_server.route("/net", fixture_text("free_proxy_net.html")))
+    return stub_server
+
+
+def test_unchanged_response_is_not_parsed_again(freeproxy, monkeypatch):
+    first = pyroxy.proxy_list("freeproxy")
+    parse = FreeProxyNetParser.__dict__["parse"]
+    skipped = metrics.counter("parse_skipped_total", source="freeproxy")
+
+    def fail(*args):
+        raise AssertionError("unchanged response parsed again")
+
+    monkeypatch.setattr(FreeProxyNetParser, "parse", fail)
+    assert pyroxy.proxy_list("freeproxy") == first
+    assert metrics.counter("parse_skipped_total", source="freeproxy") == skipped + 1
+    assert len(fetch.get_response_cache()) == 1
+
+    monkeypatch.setattr(FreeProxyNetParser, "parse", parse)
+    query = ProxyQuery(anonymity=[Anonymity.HIA])
+    assert pyroxy.proxy_list("freeproxy", query=query) == [p for p in first if query.matches(p)]
+
+
+def test_parser_change_invalidates_parsed_results(freeproxy, monkeypatch):
+    first = pyroxy.proxy_list("freeproxy")
+    skipped = metrics.counter("parse_skipped_total", source="freeproxy")
+
+    monkeypatch.setattr(FreeProxyNetParser, "version", FreeProxyNetParser.version + 1)
+    assert pyroxy.proxy_list("freeproxy") == first
+    assert metrics.counter("parse_skipped_total", source="freeproxy") == skipped
+    assert pyroxy.proxy_list("freeproxy") == first
+    assert metrics.counter("parse_skipped_total", source="freeproxy") == skipped + 1
+    assert len(list((fetch.get_response_cache().directory / "parsed").rglob("*.json"))) == 1
+
+
+def test_replay_is_offline(freeproxy):
+    fetched = pyroxy.proxy_list("freeproxy")
+    freeproxy.stop()
+
+    assert pyroxy.replayed_proxy_list("freeproxy") == fetched
+    assert asyncio.run(fetch.replay_proxies(["geonode"])) == []
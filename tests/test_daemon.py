@@ -0,0 +1,144 @@
+import json
+import os
+import socket
+import threading
+import time
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+from pyroxy import daemon
+from pyroxy.address import Anonymity, Protocol, ProxyAddress, Speed, SpeedType
+from pyroxy.daemon import PoolHTTPServer, PoolRefresher, PoolUnixServer, ProxyPool
+
+
+def make_proxy(i, protocol=Protocol.HTTPS, anonymity=Anonymity.HIA, latency=None, country="US"):
+    latency = Speed(SpeedType.TIME, latency if latency is not None else i)
+    return ProxyAddress(f"10.0.0.{i}", 8000 + i, protocol, country, "", anonymity, latency=latency)
+
+
+@pytest.fixture
+def pool():
+    return ProxyPool(
+        [
+            make_proxy(1, Protocol.SOCKS5, latency=50),
+            make_proxy(2, latency=10),
+            make_proxy(2, latency=30),
+            make_proxy(3, anonymity=Anonymity.NOA, latency=100),
+            make_proxy(4, Protocol.SOCKS5, latency=5, country="DE"),
+        ]
+    )
+
+
+def test_pool_dedups_and_ranks(pool):
+    assert pool.size == 4
+    assert [p.ip for p in pool.get(10, [Protocol.HTTPS, Protocol.SOCKS5], [Anonymity.HIA])] == [
+        "10.0.0.4",
+        "10.0.0.2",
+        "10.0.0.1",
+    ]
+    assert pool.get(1, [Protocol.HTTPS])[0].latency.value == 10
+    assert [p.ip for p in pool.get(5, country="US", anonymity=[Anonymity.HIA])] == ["10.0.0.2", "10.0.0.1"]
+
+
+def test_pool_matches_country_codes_and_names():
+    pool = ProxyPool([make_proxy(1), make_proxy(2, country="United States of America"), make_proxy(3, country="Peru")])
+
+    for country in ("US", "us", "USA", "united states of america"):
+        assert [p.ip for p in pool.get(5, country=country)] == ["10.0.0.1", "10.0.0.2"]
+    assert [p.ip for p in pool.get(5, country="PERU")] == ["10.0.0.3"]
+    assert pool.get(5, country="Atlantis") == []
+
+
+def test_pool_get_normalizes_only_the_query_country(pool, monkeypatch):
+    calls = []
+    country_key = daemon._country_key
+    monkeypatch.setattr(daemon, "_country_key", lambda country: calls.append(country) or country_key(country))
+
+    assert [p.ip for p in pool.get(5, country="us")] == ["10.0.0.2", "10.0.0.1", "10.0.0.3"]
+    assert calls == ["us"]
+
+
+def test_http_api(pool):
+    server = PoolHTTPServer(("127.0.0.1", 0), pool)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        proxies = json.load(urlopen(f"{base}/proxies?n=2&protocol=socks5,https&anonymity=hia"))
+        text = urlopen(f"{base}/proxies?n=1&country=DE&format=text").read().decode()
+        health = json.load(urlopen(f"{base}/health"))
+        with pytest.raises(HTTPError) as negative:
+            urlopen(f"{base}/proxies?n=-1")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert [(p["ip"], p["protocol"], p["latency"]) for p in proxies] == [
+        ("10.0.0.4", "SOCKS5", 5),
+        ("10.0.0.2", "HTTPS", 10),
+    ]
+    assert text == "10.0.0.4:8004\n"
+    assert health["size"] == 4
+    assert negative.value.code == 400
+
+
+def test_unix_socket_api(pool, tmp_path):
+    path = str(tmp_path / "pool.sock")
+    server = PoolUnixServer(path, pool)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with socket.socket(socket.AF_UNIX) as client:
+            client.connect(path)
+            client.sendall(b"GET /proxies?n=1&format=text HTTP/1.0\r\n\r\n")
+            response = b"".join(iter(lambda: client.recv(4096), b""))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert response.startswith(b"HTTP/1.0 200")
+    assert response.endswith(b"10.0.0.4:8004\n")
+    assert not os.path.exists(path)
+
+
+def test_unix_socket_replaces_stale_socket(pool, tmp_path):
+    path = str(tmp_path / "pool.sock")
+    with socket.socket(socket.AF_UNIX) as stale:
+        stale.bind(path)
+    assert os.path.exists(path)
+
+    server = PoolUnixServer(path, pool)
+    server.server_close()
+
+    assert not os.path.exists(path)
+
+
+def test_unix_socket_keeps_live_socket(pool, tmp_path):
+    path = str(tmp_path / "pool.sock")
+    server = PoolUnixServer(path, pool)
+    try:
+        with pytest.raises(OSError):
+            PoolUnixServer(path, pool)
+        assert os.path.exists(path)
+    finally:
+        server.server_close()
+
+
+def test_refresher_keeps_pool_on_failure():
+    pool = ProxyPool()
+    calls = []
+
+    def refresh():
+        calls.append(1)
+        if len(calls) > 1:
+            raise RuntimeError("source down")
+        return [make_proxy(1)]
+
+    refresher = PoolRefresher(pool, refresh, interval=0.01)
+    refresher.start()
+    time.sleep(0.1)
+    refresher.stop()
+    refresher.join()
+
+    assert len(calls) > 1
+    assert pool.size == 1
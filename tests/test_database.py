@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from pyroxy import fetch
+from pyroxy.database import ProxyDatabase, refresh_sources
+from pyroxy.parser import FreeProxyNetParser, GeoNodeProxyParser
+
+from .conftest import fixture_text
+
+
+@pytest.fixture
+def geonode_source(stub_server, monkeypatch):
+    body = fixture_text("geonode.json").encode()
+
+    def conditional(handler):
+        if handler.headers.get("If-None-Match") == '"v1"':
+            return 304, b"", {}
+        return 200, body, {"ETag": '"v1"', "Last-Modified": "Sat, 13 Nov 2021 09:00:00 GMT"}
+
+    url = stub_server.route("/geonode", conditional)
+    monkeypatch.setattr(GeoNodeProxyParser, "url", url)
+    monkeypatch.setattr(GeoNodeProxyParser, "page_url", None)
+    return stub_server
+
+
+def test_refresh_respects_ttl_and_validators(tmp_path, geonode_source):
+    database = ProxyDatabase(tmp_path / "proxies.sqlite3")
+    try:
+        first = asyncio.run(refresh_sources(database, ["geonode"], ttl=60))
+        fresh = asyncio.run(refresh_sources(database, ["geonode"], ttl=60))
+        revalidated = asyncio.run(refresh_sources(database, ["geonode"], ttl=0))
+    finally:
+        database.close()
+
+    assert len(first) == 20
+    assert sorted(fresh, key=repr) == sorted(first, key=repr) == sorted(revalidated, key=repr)
+    assert len(geonode_source.requests) == 2
+    assert geonode_source.requests[1][1]["If-None-Match"] == '"v1"'
+    assert geonode_source.requests[1][1]["If-Modified-Since"] == "Sat, 13 Nov 2021 09:00:00 GMT"
+
+
+def test_failed_refresh_keeps_stored_proxies(tmp_path, geonode_source):
+    database = ProxyDatabase(tmp_path / "proxies.sqlite3")
+    try:
+        asyncio.run(refresh_sources(database, ["geonode"], ttl=60))
+        geonode_source.route("/geonode", "", status=500)
+        assert len(asyncio.run(refresh_sources(database, ["geonode"], ttl=0))) == 20
+    finally:
+        database.close()
+
+
+def test_empty_response_keeps_stored_proxies(tmp_path, geonode_source):
+    database = ProxyDatabase(tmp_path / "proxies.sqlite3")
+    try:
+        asyncio.run(refresh_sources(database, ["geonode"], ttl=60))
+        geonode_source.route("/geonode", '{"data": []}')
+        assert len(asyncio.run(refresh_sources(database, ["geonode"], ttl=0))) == 20
+    finally:
+        database.close()
+
+
+def test_refresh_retries_and_isolates_sources(tmp_path, geonode_source, monkeypatch):
+    body = fixture_text("geonode.json").encode()
+    statuses = [200, 503]
+
+    def flaky(handler):
+        return statuses.pop(), body, {}
+
+    def broken(response, query=None):
+        raise IndexError("list index out of range")
+
+    geonode_source.route("/geonode", flaky)
+    monkeypatch.setattr(FreeProxyNetParser, "url", geonode_source.route("/net", fixture_text("free_proxy_net.html")))
+    monkeypatch.setattr(FreeProxyNetParser, "parse_page", broken)
+    monkeypatch.setattr(fetch.policy, "backoff", 0.01)
+    database = ProxyDatabase(tmp_path / "proxies.sqlite3")
+    try:
+        proxies = asyncio.run(refresh_sources(database, ["freeproxy", "geonode"], ttl=60))
+    finally:
+        database.close()
+
+    assert len(proxies) == 20
+    assert statuses == []
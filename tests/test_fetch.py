@@ -0,0 +1,233 @@
+import asyncio
+import gc
+import json
+import time
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from pyroxy import fetch, parser, pyroxy
+from pyroxy.address import Anonymity, Protocol
+from pyroxy.metrics import metrics
+from pyroxy.merge import ProxyMerger
+from pyroxy.parser import SOURCES, FreeProxyNetParser, GeoNodeProxyParser
+from pyroxy.pipeline import RawResponse
+from pyroxy.query import ProxyQuery
+from pyroxy.ratelimit import TokenBucket
+
+from .conftest import fixture_text
+
+
+@pytest.fixture
+def sources(stub_server, monkeypatch):
+    net_url = stub_server.route("/net", fixture_text("free_proxy_net.html"), delay=0.4)
+    geonode_url = stub_server.route("/geonode", fixture_text("geonode.json"), delay=0.4)
+    monkeypatch.setattr(FreeProxyNetParser, "url", net_url)
+    monkeypatch.setattr(GeoNodeProxyParser, "page_url", geonode_url + "?limit={limit}&page={page}")
+    return stub_server
+
+
+def test_fetch_sources_concurrently(sources):
+    proxies = pyroxy.proxy_list(None)
+
+    assert len(proxies) == 40
+    # both slow sources were being served at the same time
+    assert sources.max_active == 2
+
+
+def test_fetch_only_selected_site(sources, stub_server):
+    proxies = pyroxy.proxy_list("GeoNode")
+
+    assert len(proxies) == 20
+    assert [path.split("?")[0] for path, _ in stub_server.requests] == ["/geonode"]
+
+
+def test_fetch_source_timeout(sources, stub_server):
+    stub_server.route("/net", fixture_text("free_proxy_net.html"), delay=1.0)
+
+    proxies = asyncio.run(fetch.fetch_proxies(timeout=0.6))
+
+    assert len(proxies) == 20
+
+
+def test_broken_source_keeps_the_others(sources, monkeypatch):
+    def broken(response, query=None):
+        raise IndexError("list index out of range")
+
+    monkeypatch.setattr(FreeProxyNetParser, "parse_page", broken)
+
+    proxies = asyncio.run(fetch.fetch_proxies())
+
+    assert len(proxies) == 20
+    assert metrics.counter("fetch_errors_total", source="freeproxy", reason="IndexError") >= 1
+
+
+def test_unknown_source():
+    with pytest.raises(ValueError):
+        fetch.select_sources(["nope"])
+
+
+@pytest.fixture
+def geonode_pages(stub_server, monkeypatch):
+    rows = json.loads(fixture_text("geonode.json"))["data"]
+    total = 45
+
+    def page(handler):
+        query = parse_qs(urlsplit(handler.path).query)
+        size, number = int(query["limit"][0]), int(query["page"][0])
+        start = (number - 1) * size
+        data = [dict(rows[i % len(rows)], ip=f"10.0.0.{i}") for i in range(start, min(start + size, total))]
+        return 200, json.dumps({"data": data, "total": total, "page": number, "limit": size}).encode(), {}
+
+    url = stub_server.route("/api/proxy-list", page)
+    monkeypatch.setattr(GeoNodeProxyParser, "page_url", url + "?limit={limit}&page={page}")
+    return stub_server
+
+
+def test_stream_geonode_walks_all_pages(geonode_pages):
+    proxies = list(fetch.iter_geonode(page_size=10, concurrency=3))
+
+    assert sorted(int(p.ip.rsplit(".", 1)[1]) for p in proxies) == list(range(45))
+    assert len(geonode_pages.requests) == 5
+
+
+def test_stream_pages_with_query_walks_all_pages(geonode_pages):
+    async def collect(query):
+        pages = fetch.stream_pages(GeoNodeProxyParser, page_size=10, concurrency=3, query=query)
+        return [p async for p in pages]
+
+    everything = asyncio.run(collect(None))
+    requests = len(geonode_pages.requests)
+    query = ProxyQuery([Protocol.SOCKS4, Protocol.SOCKS5])
+
+    assert sorted(asyncio.run(collect(query)), key=repr) == sorted(filter(query.matches, everything), key=repr)
+    # pages the query empties completely must not end the walk
+    assert asyncio.run(collect(ProxyQuery(countries=["ZZ"]))) == []
+    assert len(geonode_pages.requests) == 3 * requests
+
+
+def test_stream_geonode_stops_at_limit(geonode_pages):
+    google = [p for p in fetch.iter_geonode(limit=4, predicate=lambda p: p.google, page_size=10, concurrency=1)]
+
+    assert len(google) == 4
+    assert all(p.google for p in google)
+    assert len(geonode_pages.requests) == 1
+
+
+def test_stream_geonode_settles_pages_in_flight(geonode_pages, caplog):
+    route = geonode_pages.routes["/api/proxy-list"]
+    slow = route[1]
+
+    def page(handler):
+        if int(parse_qs(urlsplit(handler.path).query)["page"][0]) > 2:
+            time.sleep(0.5)
+        return slow(handler)
+
+    geonode_pages.routes["/api/proxy-list"] = (route[0], page, *route[2:])
+    proxies = list(fetch.iter_geonode(limit=15, page_size=10, concurrency=3))
+    gc.collect()
+
+    assert len(proxies) == 15
+    assert "destroyed but it is pending" not in caplog.text
+
+
+def test_stream_geonode_ends_when_pages_fail_without_total(stub_server, monkeypatch):
+    url = stub_server.route("/api/proxy-list", status=404)
+    monkeypatch.setattr(GeoNodeProxyParser, "page_url", url + "?limit={limit}&page={page}")
+
+    assert list(fetch.iter_geonode(page_size=10, concurrency=3, timeout=2)) == []
+    assert len(stub_server.requests) == 1
+
+
+def test_query_applies_to_merged_proxies(stub_server, monkeypatch):
+    net = [
+        p
+        for p in FreeProxyNetParser.parse(RawResponse(fixture_text("free_proxy_net.html").encode(), 200, "", "utf-8"))
+        if p.protocol == Protocol.HTTPS and p.anonymity == Anonymity.HIA
+    ]
+    # geonode lists the first elite proxy of free-proxy-list.net as transparent; the weaker level wins
+    row = dict(json.loads(fixture_text("geonode.json"))["data"][0], ip=net[0].ip, port=str(net[0].port))
+    row.update(protocols=["https"], anonymityLevel="transparent")
+    geonode_url = stub_server.route("/geonode", json.dumps({"data": [row], "total": 1, "page": 1, "limit": 200}))
+    monkeypatch.setattr(FreeProxyNetParser, "url", stub_server.route("/net", fixture_text("free_proxy_net.html")))
+    monkeypatch.setattr(GeoNodeProxyParser, "page_url", geonode_url + "?limit={limit}&page={page}")
+    query = ProxyQuery([Protocol.HTTPS], [Anonymity.HIA])
+
+    pushed = asyncio.run(fetch.fetch_proxies(query=query, workers=0))
+    merged = ProxyMerger(asyncio.run(fetch.fetch_proxies(workers=0)))
+
+    assert sorted(p.ip for p in pushed) == sorted(p.ip for p in query.filter(merged))
+    assert net[0].ip not in {p.ip for p in pushed}
+    assert len(pushed) == len(net) - 1
+
+
+def test_page_walk_stops_at_its_deadline(stub_server, monkeypatch):
+    # pages without a total and never empty: only the deadline ends the walk
+    rows = json.loads(fixture_text("geonode.json"))["data"]
+    url = stub_server.route("/api/proxy-list", json.dumps({"data": rows}), delay=0.2)
+    monkeypatch.setattr(GeoNodeProxyParser, "page_url", url + "?limit={limit}&page={page}")
+    monkeypatch.setattr(GeoNodeProxyParser, "max_pages", None)
+
+    start = time.monotonic()
+    proxies = asyncio.run(fetch._walk_pages(GeoNodeProxyParser, 2, None, None, deadline=1))
+
+    assert time.monotonic() - start < 2
+    assert proxies and len(proxies) % len(rows) == 0
+
+
+def test_registry_defaults():
+    assert fetch.select_sources() == ["freeproxy", "geonode"]
+    assert fetch.select_sources(["FreeProxyCZ"]) == ["freeproxycz"]
+
+
+def test_source_plugin(stub_server, monkeypatch):
+    class PluginParser(FreeProxyNetParser):
+        url = stub_server.route("/plugin", fixture_text("free_proxy_net.html"))
+
+    PluginParser.name = "plugin"
+    entry_point = SimpleNamespace(name="plugin", load=lambda: PluginParser)
+    monkeypatch.setitem(SOURCES, "plugin", None)
+    monkeypatch.setattr(parser, "_entry_points", lambda group: [entry_point])
+    monkeypatch.setattr(fetch, "_plugins_loaded", False)
+
+    assert "plugin" in fetch.select_sources()
+    assert len(pyroxy.proxy_list("plugin")) == 20
+
+
+def test_fetch_reuses_connections(stub_server):
+    stub_server.keep_alive = True
+    url = stub_server.route("/net", fixture_text("free_proxy_net.html"))
+
+    async def fetch_three():
+        return [(await fetch.fetch(url, 5)).status_code for _ in range(3)]
+
+    assert asyncio.run(fetch_three()) == [200, 200, 200]
+    assert len(set(stub_server.client_ports)) == 1
+
+
+def test_fetch_respects_host_rate_limit(stub_server, monkeypatch):
+    monkeypatch.setattr(FreeProxyNetParser, "url", stub_server.route("/net", fixture_text("free_proxy_net.html")))
+    monkeypatch.setattr(FreeProxyNetParser, "rate_limit", 10.0)
+    monkeypatch.setattr(FreeProxyNetParser, "burst", 1)
+    fetch.limiter.reset()
+
+    async def fetch_four():
+        return await asyncio.gather(*(fetch.fetch_source("freeproxy") for _ in range(4)))
+
+    start = time.perf_counter()
+    results = asyncio.run(fetch_four())
+    elapsed = time.perf_counter() - start
+    fetch.limiter.reset()
+
+    assert [len(proxies) for proxies in results] == [20] * 4
+    assert elapsed >= 0.3
+
+
+def test_token_bucket_reservations():
+    now = [0.0]
+    bucket = TokenBucket(rate=2.0, burst=2, clock=lambda: now[0])
+
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+    now[0] = 2.0
+    assert bucket.reserve() == 0.0
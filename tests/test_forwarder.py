@@ -0,0 +1,150 @@
+import asyncio
+import struct
+from urllib.parse import urlsplit
+
+from pyroxy.address import Anonymity, Protocol, ProxyAddress, Speed, SpeedType
+from pyroxy.forwarder import ForwardingProxy
+from pyroxy.rotator import ProxyRotator
+
+from .conftest import StubProxy
+
+
+def upstream(proxy, protocol, latency=None):
+    latency = Speed(SpeedType.TIME, latency) if latency is not None else None
+    return ProxyAddress("127.0.0.1", proxy.port, protocol, "US", "", Anonymity.HIA, latency=latency)
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = int(head.lower().split(b"content-length: ")[1].split(b"\r\n")[0])
+    return head.split(b"\r\n")[0], await reader.readexactly(length)
+
+
+async def via_socks5(port, host, target_port, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"\x05\x01\x00")
+    assert await reader.readexactly(2) == b"\x05\x00"
+    writer.write(b"\x05\x01\x00\x03" + bytes([len(host)]) + host.encode() + struct.pack("!H", target_port))
+    reply = await reader.readexactly(10)
+    assert reply[1] == 0
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+    response = await read_response(reader)
+    writer.close()
+    return response
+
+
+async def via_connect(port, host, target_port, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"CONNECT {host}:{target_port} HTTP/1.1\r\nHost: {host}:{target_port}\r\n\r\n".encode())
+    assert (await reader.readuntil(b"\r\n\r\n")).startswith(b"HTTP/1.1 200")
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+    response = await read_response(reader)
+    writer.close()
+    return response
+
+
+async def via_plain_http(port, url):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {url} HTTP/1.1\r\nHost: {urlsplit(url).netloc}\r\nConnection: close\r\n\r\n".encode())
+    response = await read_response(reader)
+    writer.close()
+    return response
+
+
+def test_forwards_through_pool_and_retries(stub_server):
+    body = b"x" * 300_000
+    url = stub_server.route("/data", body)
+    parts = urlsplit(url)
+
+    async def run():
+        good = await StubProxy().start()
+        dead = await StubProxy(dead=True).start()
+        # the dead one looks fastest, so it keeps winning the comparisons it is drawn into
+        pool = [upstream(dead, Protocol.SOCKS5, latency=1)] + [upstream(good, protocol) for protocol in Protocol]
+        rotator = ProxyRotator(pool, failure_threshold=1000)
+        forwarder = await ForwardingProxy(rotator, port=0, retries=len(pool), connect_timeout=1).start()
+        try:
+            results = []
+            for _ in range(5):
+                results.append(await via_socks5(forwarder.port, parts.hostname, parts.port, "/data"))
+                results.append(await via_connect(forwarder.port, parts.hostname, parts.port, "/data"))
+                results.append(await via_plain_http(forwarder.port, url))
+            return results, dead.connections
+        finally:
+            await forwarder.stop()
+            await good.stop()
+            await dead.stop()
+
+    results, dead_connections = asyncio.run(run())
+
+    assert all(status.startswith(b"HTTP/1.0 200") and data == body for status, data in results)
+    assert dead_connections > 0
+
+
+def test_bad_gateway_when_pool_is_dead():
+    async def run():
+        dead = await StubProxy(dead=True).start()
+        rotator = ProxyRotator([upstream(dead, Protocol.HTTPS)])
+        forwarder = await ForwardingProxy(rotator, port=0, retries=1, connect_timeout=1).start()
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", forwarder.port)
+            writer.write(b"CONNECT example.com:443 HTTP/1.1\r\n\r\n")
+            status = await reader.readline()
+            writer.close()
+            return status
+        finally:
+            await forwarder.stop()
+            await dead.stop()
+
+    assert asyncio.run(run()).startswith(b"HTTP/1.1 502")
+
+
+def test_half_close_keeps_the_reply_flowing():
+    async def count_until_eof(reader, writer):
+        data = await reader.read()
+        writer.write(f"{len(data)} bytes".encode())
+        await writer.drain()
+        writer.close()
+
+    async def run():
+        target = await asyncio.start_server(count_until_eof, "127.0.0.1", 0)
+        good = await StubProxy().start()
+        rotator = ProxyRotator([upstream(good, Protocol.HTTPS)])
+        forwarder = await ForwardingProxy(rotator, port=0, connect_timeout=1).start()
+        try:
+            target_port = target.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", forwarder.port)
+            writer.write(f"CONNECT 127.0.0.1:{target_port} HTTP/1.1\r\n\r\n".encode())
+            assert (await reader.readuntil(b"\r\n\r\n")).startswith(b"HTTP/1.1 200")
+            writer.write(b"x" * 100_000)
+            writer.write_eof()
+            reply = await asyncio.wait_for(reader.read(), 5)
+            writer.close()
+            return reply
+        finally:
+            await forwarder.stop()
+            await good.stop()
+            target.close()
+            await target.wait_closed()
+
+    assert asyncio.run(run()) == b"100000 bytes"
+
+
+def test_plain_http_through_https_upstream_skips_connect(stub_server):
+    url = stub_server.route("/plain", b"hello")
+
+    async def run():
+        squid = await StubProxy(connect_ports={443}).start()
+        proxy = upstream(squid, Protocol.HTTPS)
+        rotator = ProxyRotator([proxy])
+        forwarder = await ForwardingProxy(rotator, port=0, retries=0, connect_timeout=1).start()
+        try:
+            return await via_plain_http(forwarder.port, url), rotator.health(proxy)
+        finally:
+            await forwarder.stop()
+            await squid.stop()
+
+    (status, data), health = asyncio.run(run())
+
+    assert status.startswith(b"HTTP/1.0 200") and data == b"hello"
+    assert health.failures == 0 and health.success_rate == 1.0
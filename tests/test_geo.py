@@ -0,0 +1,89 @@
+import pytest
+
+from pyroxy.address import Anonymity, Protocol, ProxyAddress
+from pyroxy.geo import GeoIndex, RangeIndex, normalize_country, parse_network
+from pyroxy.settings import Config
+from pyroxy.store import ProxyStore, pack_ip
+
+LOCATIONS = """geoname_id,locale_code,continent_code,continent_name,country_iso_code,country_name,is_in_european_union
+6252001,en,NA,"North America",US,"United States",0
+2921044,en,EU,Europe,DE,Germany,1
+2017370,en,EU,Europe,RU,Russia,0
+"""
+COUNTRY_BLOCKS = """network,geoname_id,registered_country_geoname_id,represented_country_geoname_id,is_anonymous_proxy
+10.0.0.0/16,6252001,6252001,,0
+10.1.0.0/16,2921044,2921044,,0
+10.2.0.0/24,,2017370,,0
+"""
+ASN_BLOCKS = """network,autonomous_system_number,autonomous_system_organization
+10.0.0.0/17,64500,"Example One"
+10.0.128.0/17,64501,"Example Two"
+10.1.0.0/16,64502,"Example Three"
+"""
+
+
+@pytest.fixture
+def geo(tmp_path):
+    for name, text in (
+        (Config.GEO_COUNTRY_LOCATIONS, LOCATIONS),
+        (Config.GEO_COUNTRY_BLOCKS, COUNTRY_BLOCKS),
+        (Config.GEO_ASN_BLOCKS, ASN_BLOCKS),
+    ):
+        (tmp_path / name).write_text(text)
+    return GeoIndex.load(tmp_path)
+
+
+def make_proxy(ip, country=""):
+    return ProxyAddress(ip, 8080, Protocol.HTTP, country, "", Anonymity.HIA)
+
+
+def test_parse_network_and_range_index():
+    assert parse_network("10.0.0.0/8") == (pack_ip("10.0.0.0"), pack_ip("10.255.255.255"))
+    assert parse_network("10.0.0.1") == (pack_ip("10.0.0.1"),) * 2
+    assert parse_network("2001:db8::/32") is None
+
+    index = RangeIndex([(20, 29, 2), (0, 9, 1)])
+    assert [index.lookup(ip) for ip in (0, 9, 10, 25, 30)] == [1, 1, None, 2, None]
+
+
+def test_normalize_country():
+    assert normalize_country("us") == "US"
+    assert normalize_country("UK") == normalize_country("uk") == "GB"
+    assert normalize_country(" Russian Federation ") == "RU"
+    assert normalize_country("Germany") == "DE"
+    assert normalize_country("Deutschland") is None
+    assert normalize_country("Deutschland", {"deutschland": "DE"}) == "DE"
+    assert normalize_country(None) is None
+
+
+def test_lookup(geo):
+    assert geo.lookup("10.0.200.1") == ("US", 64501, "Example Two")
+    assert geo.lookup("10.2.0.9") == ("RU", None, None)
+    assert geo.lookup("192.168.0.1") == (None, None, None)
+    assert geo.lookup("::1") == (None, None, None)
+    assert GeoIndex.load(Config.GEO_DIR / "missing") is None
+
+
+def test_enrich_prefers_database_then_source_name(geo):
+    proxies = [make_proxy("10.1.0.1", "United States"), make_proxy("192.168.0.1", "Germany"), make_proxy("1.1.1.1")]
+
+    assert [p.country for p in geo.enrich(proxies)] == ["DE", "DE", ""]
+
+
+def test_store_distinct_asns(geo):
+    proxies = [
+        make_proxy("10.0.0.1"),
+        make_proxy("10.0.0.2"),
+        make_proxy("10.0.200.1"),
+        make_proxy("10.1.0.1"),
+        make_proxy("192.168.0.1", "United States"),
+    ]
+    store = ProxyStore(proxies, geo=geo)
+
+    assert [store.asn(row) for row in range(len(store))] == [64500, 64500, 64501, 64502, None]
+    assert store.query(countries=["US"]) == [0, 1, 2, 4]
+    assert store.query(asns=[64501, 64502]) == [2, 3]
+
+    picked = store.distinct_asns(5, countries=["US"])
+    assert [p.ip for p in picked] == ["10.0.0.1", "10.0.200.1"]
+    assert len(store.distinct_asns(1)) == 1
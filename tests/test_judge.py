@@ -0,0 +1,97 @@
+import asyncio
+from dataclasses import replace
+
+from click.testing import CliRunner
+
+from pyroxy import cli, judge, pyroxy, settings
+from pyroxy.address import Anonymity, Protocol, ProxyAddress
+from pyroxy.judge import JudgeServer, ProxyJudge, classify
+from pyroxy.metrics import metrics
+from pyroxy.settings import Config
+
+from .conftest import StubProxy
+
+
+def make_proxy(port, protocol=Protocol.HTTP):
+    return ProxyAddress("127.0.0.1", port, protocol, "US", "", Anonymity.HIA)
+
+
+def test_classify():
+    assert classify({"Host": "judge", "Accept": "*/*"}, "203.0.113.7") == Anonymity.HIA
+    assert classify({"Via": "1.1 squid"}, "203.0.113.7") == Anonymity.ANM
+    assert classify({"X-Forwarded-For": "198.51.100.1"}, "203.0.113.7") == Anonymity.ANM
+    assert classify({"X-Forwarded-For": "203.0.113.7, 198.51.100.1"}, "203.0.113.7") == Anonymity.NOA
+    assert classify({"Forwarded": "for=203.0.113.7;proto=http"}, "203.0.113.7") == Anonymity.NOA
+    assert classify({"X-Forwarded-For": "203.0.113.70"}, "203.0.113.7") == Anonymity.ANM
+    # the judge was reached from our own address
+    assert classify({"Accept": "*/*"}, "203.0.113.7", "203.0.113.7") == Anonymity.NOA
+    assert classify({"Accept": "*/*"}, "203.0.113.7", "198.51.100.1") == Anonymity.HIA
+
+
+def test_relabel_from_leaked_headers():
+    async def run():
+        judge = await JudgeServer("127.0.0.1", 0).start()
+        stubs = [
+            await StubProxy().start(),
+            await StubProxy({"Via": "1.1 stub"}).start(),
+            await StubProxy({"X-Forwarded-For": "127.0.0.1"}).start(),
+            await StubProxy(dead=True).start(),
+        ]
+        honest, announcing, leaking, dead = stubs
+        candidates = [
+            make_proxy(honest.port),
+            make_proxy(announcing.port),
+            make_proxy(leaking.port),
+            make_proxy(dead.port),
+            # an HTTPS proxy gets the plain http request itself, so what it adds shows
+            make_proxy(leaking.port, Protocol.HTTPS),
+            # a tunnel carries our request untouched, whatever the proxy would add to plain HTTP
+            make_proxy(leaking.port, Protocol.SOCKS5),
+        ]
+        try:
+            checker = ProxyJudge(judge.url, concurrency=3, connect_timeout=1, read_timeout=1)
+            return await checker.relabel(candidates), checker.origin
+        finally:
+            for stub in stubs:
+                await stub.stop()
+            await judge.stop()
+
+    relabelled = metrics.counter("judge_relabelled_total", claimed="HIA", measured="NOA")
+
+    judged, origin = asyncio.run(run())
+
+    assert origin == "127.0.0.1"
+    labels = sorted((p.protocol.value, p.anonymity.value) for p in judged)
+    assert labels == [
+        (Protocol.HTTP.value, Anonymity.HIA.value),
+        (Protocol.HTTP.value, Anonymity.ANM.value),
+        (Protocol.HTTP.value, Anonymity.NOA.value),
+        (Protocol.HTTPS.value, Anonymity.NOA.value),
+        (Protocol.SOCKS5.value, Anonymity.HIA.value),
+    ]
+    assert metrics.counter("judge_relabelled_total", claimed="HIA", measured="NOA") == relabelled + 2
+
+
+def test_cli_judges_before_filtering_on_anonymity(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "CACHE_DIR", tmp_path)
+    monkeypatch.setattr(settings, "_is_setup", True)
+    claimed_transparent = replace(make_proxy(1, Protocol.HTTPS), anonymity=Anonymity.NOA)
+    claimed_elite = make_proxy(2, Protocol.SOCKS5)
+    queries = []
+
+    def fetched(site, workers=None, query=None):
+        queries.append(query)
+        return [claimed_transparent, claimed_elite]
+
+    def judged(proxies, url):
+        measured = {1: Anonymity.HIA, 2: Anonymity.NOA}
+        return [replace(proxy, anonymity=measured[proxy.port]) for proxy in proxies]
+
+    monkeypatch.setattr(pyroxy, "proxy_list", fetched)
+    monkeypatch.setattr(judge, "judge_proxies", judged)
+    out = tmp_path / "out.txt"
+    result = CliRunner().invoke(cli.proxies, ["proxylist", str(out), "--judge", "http://judge.test/"])
+
+    assert result.exit_code == 0, result.output
+    assert queries[0].anonymity is None
+    assert out.read_text().split() == ["127.0.0.1:1"]
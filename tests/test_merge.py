@@ -0,0 +1,44 @@
+from pyroxy.address import Anonymity, Protocol, ProxyAddress, Speed, SpeedType
+from pyroxy.merge import ProxyMerger, merge, updated_at
+
+
+def test_merges_endpoint_across_sources():
+    net = ProxyAddress("1.2.3.4", "8080", Protocol.HTTP, "Germany", "2 mins ago", Anonymity.HIA, google=True)
+    geo = ProxyAddress(
+        "1.2.3.4",
+        8080,
+        Protocol.HTTPS,
+        "DE",
+        "2000-01-01T00:00:00.000Z",
+        Anonymity.ANM,
+        response=Speed(SpeedType.TIME, 300),
+    )
+    socks = ProxyAddress("1.2.3.4", 8080, Protocol.SOCKS5, "DE", "", Anonymity.UNKNOWN)
+
+    merger = ProxyMerger([net, geo, socks])
+
+    assert len(merger) == 2
+    merged = merger.values()[0]
+    assert (merged.port, merged.protocol, merged.anonymity) == (8080, Protocol.HTTPS, Anonymity.ANM)
+    assert merged.google is True
+    assert merged.updated == "2 mins ago"
+    assert merged.response == Speed(SpeedType.TIME, 300)
+
+
+def test_merge_keeps_best_speed_and_known_anonymity():
+    a = ProxyAddress("1.1.1.1", 80, Protocol.HTTP, "", "", Anonymity.UNKNOWN, speed="120 kB/s")
+    b = ProxyAddress("1.1.1.1", 80, Protocol.HTTP, "US", "", Anonymity.HIA, latency=Speed(SpeedType.TIME, 90))
+    c = ProxyAddress("1.1.1.1", 80, Protocol.HTTP, "", "", Anonymity.HIA, latency=Speed(SpeedType.TIME, 40))
+
+    merged = merge(merge(a, b), c)
+
+    assert merged.country == "US"
+    assert merged.anonymity == Anonymity.HIA
+    assert merged.speed == "120 kB/s"
+    assert merged.latency == Speed(SpeedType.TIME, 40)
+
+
+def test_updated_at_formats():
+    assert updated_at("2021-11-13T09:00:00.000Z") == 1636794000
+    assert updated_at("5 mins ago", now=1000) == 700
+    assert updated_at("yesterday") is None
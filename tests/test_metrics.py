@@ -0,0 +1,103 @@
+import asyncio
+import json
+import pstats
+import threading
+from urllib.request import urlopen
+
+import pytest
+from click.testing import CliRunner
+
+from pyroxy import cli, fetch, settings
+from pyroxy.address import Anonymity, Protocol
+from pyroxy.daemon import PoolHTTPServer, ProxyPool
+from pyroxy.metrics import Metrics, PrometheusExporter, export, metrics
+from pyroxy.parser import FreeProxyNetParser
+from pyroxy.pyroxy import filter_proxy_list
+from pyroxy.settings import Config
+
+from .conftest import fixture_text
+from .test_daemon import make_proxy
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_counters_gauges_and_timers():
+    registry = Metrics()
+    registry.inc("rows_total", 3, source="a")
+    registry.inc("rows_total", 2, source="a")
+    registry.set("pool_size", 7)
+    with registry.timer("fetch_seconds", source='say "hi"'):
+        pass
+
+    snapshot = registry.snapshot()
+    text = PrometheusExporter.export(snapshot)
+
+    assert registry.counter("rows_total", source="a") == 5
+    assert snapshot["timers"][0]["count"] == 1
+    assert "# TYPE pyroxy_rows_total counter" in text
+    assert 'pyroxy_rows_total{source="a"} 5' in text
+    assert "pyroxy_pool_size 7" in text
+    assert 'pyroxy_fetch_seconds_count{source="say \\"hi\\""} 1' in text
+    assert json.loads(export("json", registry))["gauges"] == [{"name": "pool_size", "labels": {}, "value": 7}]
+
+
+def test_fetch_and_filter_are_instrumented(stub_server, monkeypatch):
+    monkeypatch.setattr(FreeProxyNetParser, "url", stub_server.route("/net", fixture_text("free_proxy_net.html")))
+
+    proxies = asyncio.run(fetch.fetch_source("freeproxy"))
+    filtered = filter_proxy_list(proxies, [Protocol.HTTPS], [])
+
+    timers = {(t["name"], t["labels"].get("source")): t for t in metrics.snapshot()["timers"]}
+    assert metrics.counter("parse_rows_total", source="freeproxy") == 20
+    assert metrics.counter("fetch_bytes_total", source="freeproxy") == len(fixture_text("free_proxy_net.html"))
+    assert {("fetch_seconds", "freeproxy"), ("parse_seconds", "freeproxy"), ("source_seconds", "freeproxy")} <= set(
+        timers
+    )
+    assert metrics.gauge("filter_selectivity") == len(filtered) / 20
+
+
+def test_daemon_metrics_endpoint():
+    pool = ProxyPool([make_proxy(1), make_proxy(2, anonymity=Anonymity.NOA)])
+    server = PoolHTTPServer(("127.0.0.1", 0), pool)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        text = urlopen(f"{base}/metrics").read().decode()
+        snapshot = json.load(urlopen(f"{base}/metrics?format=json"))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert "pyroxy_pool_size 2" in text
+    assert 'pyroxy_pool_bucket_size{anonymity="NOA",protocol="HTTPS"} 1' in text
+    assert {"name": "pool_size", "labels": {}, "value": 2} in snapshot["gauges"]
+
+
+def test_cli_writes_metrics_and_profile(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "CACHE_DIR", tmp_path)
+    monkeypatch.setattr(settings, "_is_setup", True)
+    metrics_file, profile_file = tmp_path / "metrics.json", tmp_path / "pyroxy.prof"
+
+    result = CliRunner().invoke(
+        cli.proxies,
+        [
+            "--metrics",
+            str(metrics_file),
+            "--profile",
+            "cprofile",
+            "--profile-output",
+            str(profile_file),
+            "proxylist",
+            str(tmp_path / "out.txt"),
+            "--cached",
+        ],
+    )
+
+    assert result.exit_code == 0, result.output
+    assert json.loads(metrics_file.read_text())["counters"][0]["name"] == "filter_input_total"
+    assert pstats.Stats(str(profile_file)).total_calls > 0
@@ -1,10 +1,15 @@
+import json
 from pprint import pprint
 
 import requests
+from parsel import Selector
 
-from pyroxy.parser import FreeProxyNetParser, GeoNodeProxyParser
+from pyroxy.address import Anonymity, Protocol, ProxyAddress, Speed, SpeedType
+from pyroxy.parser import FreeProxyCZ, FreeProxyNetParser, GeoNodeProxyParser, cell_text
 from pyroxy.settings import Config
 
+from .conftest import fixture_text
+
 
 def test_parse_free_net():
     response = requests.get(Config.FREE_PROXY_NET_URL, headers=Config.HEADERS)
@@ -18,3 +23,89 @@ def test_parse_geonode():
     proxy_list = GeoNodeProxyParser.parse(response)
     print()
     pprint(proxy_list)
+
+
+class FixtureResponse:
+    status_code = 200
+    url = "fixture"
+
+    def __init__(self, name):
+        self.text = fixture_text(name)
+
+
+def test_parse_free_net_fixture():
+    proxy_list = FreeProxyNetParser.parse(FixtureResponse("free_proxy_net.html"))
+
+    assert len(proxy_list) == 20
+    assert proxy_list[0] == ProxyAddress(
+        "83.77.202.167", 80, Protocol.HTTP, "United States", "38 secs ago", Anonymity.NOA, google=True
+    )
+
+
+def test_parse_free_proxy_cz_fixture():
+    proxy_list = FreeProxyCZ.parse(fixture_text("free_proxy_cz.html"))
+
+    assert len(proxy_list) == 20
+    assert proxy_list[0].ip == "4.36.130.111"
+    assert proxy_list[0].port == 1080
+    assert proxy_list[0].protocol == Protocol.SOCKS4
+    assert proxy_list[0].country == "Germany"
+    assert proxy_list[0].speed == Speed(SpeedType.BPS, 1570000)
+    assert proxy_list[0].uptime == Speed(SpeedType.PERCENT, 74)
+    assert proxy_list[0].response == Speed(SpeedType.TIME, 2796)
+
+
+def test_cell_text_matches_parsel():
+    selector = Selector(
+        "<table><tr><td><!-- c -->t<small>A</small></td><td><a>x<b>y</b>z</a></td><td></td></tr></table>"
+    )
+    tds = selector.css("td")
+    for td in tds:
+        assert cell_text(td.root) == td.css("::text").get("")
+        assert cell_text(td.root, "small") == td.css("small::text").get("")
+        assert cell_text(td.root, "a") == td.css("a::text").get("")
+
+
+def test_from_cache_parses_changed_files_only(tmp_path, monkeypatch):
+    page = fixture_text("free_proxy_cz.html")
+    for i in range(3):
+        (tmp_path / f"page{i}.html").write_text(page.replace('<td style="">1080</td>', f"<td>{1100 + i}</td>"))
+
+    first = FreeProxyCZ.from_cache(tmp_path, workers=2)
+    assert (tmp_path / Config.CACHE_INDEX_NAME).exists()
+
+    def fail(text):
+        raise AssertionError("unchanged page parsed again")
+
+    monkeypatch.setattr(FreeProxyCZ, "parse", fail)
+    assert sorted(FreeProxyCZ.from_cache(tmp_path), key=repr) == sorted(first, key=repr)
+
+    monkeypatch.undo()
+    (tmp_path / "page2.html").write_text(page.replace('<td style="">1080</td>', "<td>2000</td>"))
+    (tmp_path / "page1.html").unlink()
+    ports = {p.port for p in FreeProxyCZ.from_cache(tmp_path)}
+    assert 2000 in ports and 1101 not in ports and 1100 in ports
+
+
+def test_from_cache_parses_again_after_a_parser_change(tmp_path, monkeypatch):
+    (tmp_path / "page.html").write_text(fixture_text("free_proxy_cz.html"))
+    first = FreeProxyCZ.from_cache(tmp_path)
+    parsed = []
+    parse = FreeProxyCZ.__dict__["parse"].__func__
+
+    def counting(cls, text, query=None):
+        parsed.append(text)
+        return parse(cls, text, query)
+
+    monkeypatch.setattr(FreeProxyCZ, "parse", classmethod(counting))
+    monkeypatch.setattr(FreeProxyCZ, "version", FreeProxyCZ.version + 1)
+
+    assert FreeProxyCZ.from_cache(tmp_path) == first
+    assert FreeProxyCZ.from_cache(tmp_path) == first
+    assert len(parsed) == 1
+
+
+def test_proxy_address_record_round_trip():
+    proxy_list = GeoNodeProxyParser.iter_parse(json.loads(fixture_text("geonode.json"))["data"])
+    for proxy in proxy_list:
+        assert ProxyAddress.from_record(json.loads(json.dumps(proxy.to_record()))) == proxy
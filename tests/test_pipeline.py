@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from pyroxy import fetch
+from pyroxy.address import ProxyAddress
+from pyroxy.metrics import metrics
+from pyroxy.parser import FreeProxyNetParser, GeoNodeProxyParser
+from pyroxy.pipeline import ParsePipeline, RawResponse, parse_records
+
+from .conftest import fixture_text
+
+
+@pytest.fixture
+def sources(stub_server, monkeypatch):
+    monkeypatch.setattr(FreeProxyNetParser, "url", stub_server.route("/net", fixture_text("free_proxy_net.html")))
+    geonode_url = stub_server.route("/geonode", fixture_text("geonode.json"))
+    monkeypatch.setattr(GeoNodeProxyParser, "page_url", geonode_url + "?limit={limit}&page={page}")
+    return stub_server
+
+
+def test_parse_records_returns_plain_tuples():
+    content = fixture_text("free_proxy_net.html").encode()
+    total, records = parse_records("freeproxy", content, 200, "fixture", "utf-8")
+
+    assert total is None
+    assert len(records) == 20
+    assert all(type(record) is tuple for record in records)
+    assert [ProxyAddress.from_record(r) for r in records] == FreeProxyNetParser.parse(
+        RawResponse(content, 200, "fixture", None)
+    )
+
+
+def test_pipeline_matches_inline_parsing(sources):
+    inline = asyncio.run(fetch.fetch_proxies(workers=0))
+    pooled = asyncio.run(fetch.fetch_proxies(workers=2))
+
+    assert len(pooled) == 40
+    assert sorted(pooled, key=repr) == sorted(inline, key=repr)
+
+
+def test_pipeline_surfaces_parse_errors(stub_server, monkeypatch):
+    url = stub_server.route("/geonode", "not json")
+    monkeypatch.setattr(GeoNodeProxyParser, "page_url", url + "?limit={limit}&page={page}")
+    metrics.reset()
+
+    assert asyncio.run(fetch.fetch_proxies(["geonode"], workers=1)) == []
+    assert metrics.counter("fetch_errors_total", source="geonode", reason="JSONDecodeError") == 1
+
+
+def test_pipeline_queue_is_bounded(sources):
+    async def run():
+        async with ParsePipeline(workers=1, queue_size=1) as pipeline:
+            response = await fetch.fetch(FreeProxyNetParser.url, 5)
+            parses = [asyncio.ensure_future(pipeline.parse("freeproxy", response)) for _ in range(4)]
+            await asyncio.sleep(0)
+            queued = pipeline._queue.qsize()
+            results = await asyncio.gather(*parses)
+        return queued, results
+
+    queued, results = asyncio.run(run())
+
+    assert queued == 1
+    assert [len(proxies) for _, proxies in results] == [20] * 4
@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+from pyroxy import fetch
+from pyroxy.metrics import metrics
+from pyroxy.parser import FreeProxyNetParser, GeoNodeProxyParser
+from pyroxy.policy import FetchPolicy, LatencyTracker
+
+from .conftest import fixture_text
+
+
+def test_percentile_needs_samples():
+    tracker = LatencyTracker(window=20, min_samples=5)
+    for seconds in range(1, 5):
+        tracker.record("s", seconds)
+
+    assert tracker.percentile("s", 95) is None
+    for seconds in range(5, 31):
+        tracker.record("s", seconds)
+
+    # only the last 20 samples, 11 to 30, are kept
+    assert tracker.percentile("s", 95) == 29
+    assert tracker.percentile("s", 50) == 20
+    assert tracker.percentile("other", 50) is None
+
+
+def test_slow_request_is_hedged(stub_server):
+    page = fixture_text("free_proxy_net.html").encode()
+    delays = [1.0]
+
+    def respond(handler):
+        time.sleep(delays.pop() if delays else 0.0)
+        return 200, page, {}
+
+    url = stub_server.route("/net", respond)
+    policy = FetchPolicy(fetch._get)
+    for _ in range(10):
+        policy.latency.record("freeproxy", 0.05)
+    hedged = metrics.counter("fetch_hedged_total", source="freeproxy")
+
+    start = time.perf_counter()
+    response = asyncio.run(policy.fetch("freeproxy", url, 5))
+
+    assert response.status_code == 200
+    assert time.perf_counter() - start < 0.5
+    assert len(stub_server.requests) == 2
+    assert metrics.counter("fetch_hedged_total", source="freeproxy") == hedged + 1
+
+
+def test_failures_are_retried(stub_server):
+    statuses = [200, 503, 503]
+
+    def respond(handler):
+        return statuses.pop(), b"", {}
+
+    url = stub_server.route("/net", respond)
+    policy = FetchPolicy(fetch._get, retries=2, backoff=0.01)
+
+    assert asyncio.run(policy.fetch("freeproxy", url, 5)).status_code == 200
+    assert len(stub_server.requests) == 3
+
+    statuses[:] = [200, 503, 503]
+    assert asyncio.run(FetchPolicy(fetch._get, retries=1, backoff=0.01).fetch("freeproxy", url, 5)).status_code == 503
+
+
+def test_deadline_keeps_finished_sources(stub_server, monkeypatch):
+    monkeypatch.setattr(FreeProxyNetParser, "url", stub_server.route("/net", fixture_text("free_proxy_net.html")))
+    geonode_url = stub_server.route("/geonode", fixture_text("geonode.json"), delay=2.0)
+    monkeypatch.setattr(GeoNodeProxyParser, "page_url", geonode_url + "?limit={limit}&page={page}")
+
+    start = time.perf_counter()
+    proxies = asyncio.run(fetch.fetch_proxies(timeout=5, deadline=0.5))
+
+    assert len(proxies) == 20
+    assert time.perf_counter() - start < 1.5
+    assert metrics.counter("fetch_errors_total", source="geonode", reason="deadline") >= 1
@@ -0,0 +1,138 @@
+import json
+
+import pytest
+
+from pyroxy.address import Anonymity, Protocol, ProxyAddress, Speed, SpeedType
+from pyroxy.merge import merge_safe
+from pyroxy.parser import FreeProxyCZ, FreeProxyNetParser, GeoNodeProxyParser
+from pyroxy.pyroxy import filter_proxy_list
+from pyroxy.query import ProxyQuery
+from pyroxy.store import ProxyStore
+
+from .conftest import fixture_text
+
+
+class FakeResponse:
+    status_code = 200
+    url = "http://example.com/"
+
+    def __init__(self, text):
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+
+QUERIES = [
+    ProxyQuery(),
+    ProxyQuery([Protocol.HTTPS, Protocol.SOCKS4, Protocol.SOCKS5], [Anonymity.HIA]),
+    ProxyQuery(anonymity=[Anonymity.NOA], google=True),
+    ProxyQuery(countries=["DE", "United States"]),
+    ProxyQuery(max_latency=1500),
+]
+
+
+def parse_all(query=None):
+    return {
+        "freeproxy": FreeProxyNetParser.parse(FakeResponse(fixture_text("free_proxy_net.html")), query),
+        "geonode": GeoNodeProxyParser.parse(FakeResponse(fixture_text("geonode.json")), query),
+        "freeproxycz": FreeProxyCZ.parse(fixture_text("free_proxy_cz.html"), query),
+    }
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_parsers_push_down_query(query):
+    everything = parse_all()
+
+    pushed = parse_all(query)
+
+    for name, proxies in everything.items():
+        assert pushed[name] == [p for p in proxies if query.matches(p)], name
+    assert sum(map(len, pushed.values())) < sum(map(len, everything.values())) or query == ProxyQuery()
+
+
+def test_accepts_country_text_or_code():
+    query = ProxyQuery(countries=["RU"])
+
+    assert query.accepts(Protocol.HTTP, Anonymity.HIA, country="Russian Federation")
+    assert query.accepts(Protocol.HTTP, Anonymity.HIA, country="ru")
+    assert not query.accepts(Protocol.HTTP, Anonymity.HIA, country="Germany")
+
+
+def test_combine_queries():
+    a = ProxyQuery([Protocol.HTTP, Protocol.HTTPS], max_latency=500)
+    b = ProxyQuery([Protocol.HTTPS, Protocol.SOCKS5], [Anonymity.HIA], max_latency=200)
+
+    combined = a & b
+
+    assert combined == ProxyQuery([Protocol.HTTPS], [Anonymity.HIA], max_latency=200)
+    assert not (a & ProxyQuery([Protocol.SOCKS5])).accepts(Protocol.HTTP, Anonymity.HIA)
+    assert a & ProxyQuery() == a
+    with pytest.raises(ValueError):
+        ProxyQuery(google=True) & ProxyQuery(google=False)
+
+
+def test_contradictory_queries_match_nothing():
+    proxies = [
+        ProxyAddress("10.0.0.1", 80, Protocol.HTTP, "", "", Anonymity.HIA),
+        ProxyAddress("10.0.0.2", 80, Protocol.HTTP, None, "", Anonymity.HIA),
+        ProxyAddress("10.0.0.3", 80, Protocol.HTTP, "US", "", Anonymity.HIA),
+    ]
+
+    nothing = ProxyQuery(countries=["US"]) & ProxyQuery(countries=["DE"])
+
+    assert nothing.nothing and (nothing & ProxyQuery()).nothing
+    assert not nothing.accepts(Protocol.HTTP, Anonymity.HIA, country=None)
+    assert not nothing.accepts_latency(None)
+    assert list(nothing.filter(proxies)) == []
+    assert filter_proxy_list(ProxyStore(proxies), [], [], query=nothing) == []
+    assert nothing.key() != ProxyQuery().key()
+    assert (ProxyQuery([Protocol.HTTP]) & ProxyQuery([Protocol.SOCKS5])).nothing
+
+
+def test_country_filter_agrees_between_list_and_store():
+    proxies = [
+        ProxyAddress("10.0.0.1", 80, Protocol.HTTP, "Russian Federation", "", Anonymity.HIA),
+        ProxyAddress("10.0.0.2", 80, Protocol.HTTP, "RU", "", Anonymity.HIA),
+        ProxyAddress("10.0.0.3", 80, Protocol.HTTP, "Germany", "", Anonymity.HIA),
+        ProxyAddress("10.0.0.4", 80, Protocol.HTTP, "UK", "", Anonymity.HIA),
+    ]
+
+    for countries in (["RU"], ["Russian Federation"], ["GB", "DE"]):
+        query = ProxyQuery(countries=countries)
+        listed = filter_proxy_list(proxies, [], [], query=query)
+        stored = filter_proxy_list(ProxyStore(proxies), [], [], query=query)
+        assert [p.ip for p in stored] == [p.ip for p in listed], countries
+    assert [p.ip for p in filter_proxy_list(ProxyStore(proxies), [], [], query=ProxyQuery(countries=["RU"]))] == [
+        "10.0.0.1",
+        "10.0.0.2",
+    ]
+
+
+def test_merge_safe_pushes_down_protocol_families_only():
+    assert merge_safe(ProxyQuery([Protocol.HTTPS], [Anonymity.HIA])) == ProxyQuery(
+        [Protocol.UNKNOWN, Protocol.HTTP, Protocol.HTTPS]
+    )
+    assert merge_safe(ProxyQuery([Protocol.HTTPS, Protocol.SOCKS4, Protocol.SOCKS5], [Anonymity.HIA])) is None
+    assert merge_safe(ProxyQuery(anonymity=[Anonymity.HIA])) is None
+
+
+def test_filter_proxy_list_with_query_matches_store():
+    proxies = parse_all()["geonode"]
+    query = ProxyQuery(max_latency=2000)
+
+    filtered = filter_proxy_list(proxies, [Protocol.SOCKS4, Protocol.SOCKS5], [], query=query)
+
+    assert filtered and all(p.response.value <= 2000 for p in filtered)
+    stored = filter_proxy_list(ProxyStore(proxies), [Protocol.SOCKS4, Protocol.SOCKS5], [], query=query)
+    assert [(p.ip, p.port) for p in stored] == [(p.ip, p.port) for p in filtered]
+
+
+def test_unknown_latency_fails_latency_bound():
+    proxy = ProxyAddress("10.0.0.1", 80, Protocol.HTTP, "", "", Anonymity.HIA)
+
+    assert ProxyQuery().matches(proxy)
+    assert not ProxyQuery(max_latency=100).matches(proxy)
+    assert ProxyQuery(max_latency=100).matches(
+        ProxyAddress("10.0.0.1", 80, Protocol.HTTP, "", "", Anonymity.HIA, latency=Speed(SpeedType.TIME, 50))
+    )
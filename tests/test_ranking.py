@@ -0,0 +1,88 @@
+import pytest
+
+from pyroxy import ranking
+from pyroxy.address import Anonymity, Protocol, ProxyAddress, Speed, SpeedType
+from pyroxy.parser import FreeProxyCZ
+from pyroxy.store import ProxyStore
+
+from .conftest import fixture_text
+
+
+def make_proxy(port, protocol=Protocol.HTTPS, latency=None, speed=None, uptime=None):
+    return ProxyAddress(
+        "10.0.0.1",
+        port,
+        protocol,
+        "US",
+        "",
+        Anonymity.HIA,
+        speed=speed,
+        uptime=uptime,
+        latency=None if latency is None else Speed(SpeedType.TIME, latency),
+    )
+
+
+@pytest.fixture(params=["python", "numpy"])
+def backend(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(ranking, "np", None)
+    return request.param
+
+
+def test_speed_parse():
+    assert Speed.parse("1570 kB/s") == Speed(SpeedType.BPS, 1570000)
+    assert Speed.parse("2796 ms") == Speed(SpeedType.TIME, 2796)
+    assert Speed.parse("1.5 s") == Speed(SpeedType.TIME, 1500)
+    assert Speed.parse("74%") == Speed(SpeedType.PERCENT, 74)
+    assert Speed.parse("fast") is None
+    assert Speed.parse(None) is None
+
+
+def test_scores_follow_metrics(backend):
+    proxies = [
+        make_proxy(1, latency=2000),
+        make_proxy(2, latency=100),
+        make_proxy(3, latency=100, speed="500 kB/s", uptime="95%"),
+        make_proxy(4),
+    ]
+
+    scores = list(ranking.rank(proxies))
+
+    assert scores[2] > scores[1] > scores[0]
+    # unknown latency counts as the rotator's default of one second
+    assert scores[1] > scores[3] > scores[0]
+    assert all(0 <= score <= 1 for score in scores)
+
+
+def test_top_k(backend):
+    proxies = [make_proxy(port, latency=port * 10) for port in range(1, 101)]
+
+    assert [p.port for p in ranking.top_k(proxies, 5)] == [1, 2, 3, 4, 5]
+    assert len(ranking.top_k(proxies, 500)) == 100
+    assert ranking.top_k(proxies, 0) == []
+    assert ranking.top_k([], 5) == []
+
+
+def test_top_k_from_store_with_filters(backend):
+    proxies = [
+        make_proxy(port, Protocol.HTTPS if port % 2 else Protocol.HTTP, latency=1000 - port) for port in range(1, 51)
+    ]
+    store = ProxyStore(proxies)
+
+    best = ranking.top_k(store, 3, protocols=[Protocol.HTTPS])
+
+    assert [p.port for p in best] == [49, 47, 45]
+    assert [p.port for p in ranking.top_k(store, 3)] == [50, 49, 48]
+    with pytest.raises(TypeError):
+        ranking.top_k(proxies, 3, protocols=[Protocol.HTTPS])
+
+
+def test_free_proxy_cz_speeds_rank_like_the_store(backend):
+    proxies = FreeProxyCZ.parse(fixture_text("free_proxy_cz.html"))
+    store = ProxyStore(proxies)
+
+    assert store[0].speed == Speed(SpeedType.BPS, 1570000) and store[0].uptime == Speed(SpeedType.PERCENT, 74)
+    assert list(ranking.rank(store)) == pytest.approx(list(ranking.rank(proxies)))
+    assert ranking.top_k(store, 5) == [store[i] for i in ranking.top_indices(ranking.rank(proxies), 5)]
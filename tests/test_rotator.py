@@ -0,0 +1,85 @@
+import threading
+from collections import Counter
+
+import pytest
+
+from pyroxy.address import Anonymity, Protocol, ProxyAddress
+from pyroxy.rotator import NoProxyAvailable, ProxyRotator
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_proxies(n):
+    return [ProxyAddress(f"10.0.0.{i}", 8000 + i, Protocol.HTTPS, "US", "", Anonymity.HIA) for i in range(n)]
+
+
+def test_prefers_fast_and_reliable_proxies():
+    fast, slow, flaky = make_proxies(3)
+    rotator = ProxyRotator([fast, slow, flaky], failure_threshold=100)
+    for _ in range(20):
+        rotator.report(fast, True, 50)
+        rotator.report(slow, True, 2000)
+        rotator.report(flaky, False)
+
+    picks = Counter()
+    for _ in range(3000):
+        proxy = rotator.acquire()
+        rotator.report(proxy, proxy != flaky, 50 if proxy == fast else 2000)
+        picks[proxy] += 1
+
+    assert picks[fast] > picks[slow] > picks[flaky]
+
+
+def test_circuit_opens_and_half_opens():
+    clock = Clock()
+    good, bad = make_proxies(2)
+    rotator = ProxyRotator([good, bad], failure_threshold=2, cooldown=10, clock=clock)
+    for _ in range(2):
+        rotator.report(bad, False)
+
+    assert {rotator.acquire() for _ in range(50)} == {good}
+
+    clock.now = 11
+    rotator.report(good, False)
+    rotator.report(good, False)
+    assert rotator.acquire() == bad
+    with pytest.raises(NoProxyAvailable):
+        rotator.acquire()
+
+    rotator.report(bad, True, 100)
+    assert rotator.acquire() == bad
+
+
+def test_update_keeps_statistics():
+    proxies = make_proxies(3)
+    rotator = ProxyRotator(proxies)
+    rotator.report(proxies[0], False)
+    rotator.update(proxies[:2])
+
+    assert len(rotator) == 2
+    assert rotator.health(proxies[0]).failures == 1
+    assert rotator.health(proxies[2]) is None
+
+
+def test_thread_safe_accounting():
+    proxies = make_proxies(10)
+    rotator = ProxyRotator(proxies)
+
+    def work():
+        for _ in range(2000):
+            with rotator.using():
+                pass
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(rotator.health(proxy).in_flight == 0 for proxy in proxies)
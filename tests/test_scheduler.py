@@ -0,0 +1,177 @@
+import asyncio
+import time
+
+from pyroxy.address import Anonymity, Protocol, ProxyAddress, SpeedType
+from pyroxy.scheduler import RevalidationScheduler, Revalidator, revalidated
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_proxy(port, protocol=Protocol.HTTP, anonymity=Anonymity.ANM):
+    return ProxyAddress("127.0.0.1", port, protocol, "US", "", anonymity)
+
+
+def make_scheduler(clock, **kwargs):
+    options = dict(interval=100, min_interval=10, max_interval=10000, rate=1000, evict_after=5, clock=clock)
+    options.update(kwargs)
+    return RevalidationScheduler(**options)
+
+
+def test_valuable_proxies_first_and_more_often():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    plain = make_proxy(1, Protocol.HTTP, Anonymity.NOA)
+    valuable = make_proxy(2, Protocol.SOCKS5, Anonymity.HIA)
+    assert scheduler.add([plain, valuable]) == 2
+    assert scheduler.add([plain]) == 0
+
+    assert scheduler.pop_due() == valuable
+    assert scheduler.pop_due() == plain
+    assert scheduler.pop_due() is None
+
+    scheduler.record(valuable, 50.0)
+    scheduler.record(plain, 50.0)
+
+    assert scheduler.history(valuable).interval == 25
+    assert scheduler.history(plain).interval == 200
+    clock.now = 30
+    assert scheduler.pop_due().port == valuable.port
+    assert scheduler.pop_due() is None
+
+
+def test_dead_proxies_back_off_and_are_evicted():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    proxy = make_proxy(1)
+    scheduler.add([proxy])
+
+    intervals = []
+    for _ in range(4):
+        clock.now = scheduler.next_due()
+        assert scheduler.pop_due() == proxy
+        scheduler.record(proxy, None)
+        intervals.append(scheduler.history(proxy).interval)
+
+    assert intervals == [200, 400, 800, 1600]
+
+    clock.now = scheduler.next_due()
+    scheduler.record(scheduler.pop_due(), None)
+    assert len(scheduler) == 0
+    assert scheduler.next_due() is None
+
+
+def test_flapping_proxies_back_off_until_stable():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    proxy = make_proxy(1)
+    scheduler.add([proxy])
+
+    for latency in (10.0, None, 10.0, None, 10.0):
+        scheduler.pop_due()
+        scheduler.record(proxy, latency)
+    flapping = scheduler.history(proxy).interval
+
+    for _ in range(4):
+        scheduler.pop_due()
+        scheduler.record(proxy, 10.0)
+
+    assert flapping == 1600
+    assert scheduler.history(proxy).interval == 100
+
+
+def test_alive_carries_measured_latency():
+    scheduler = make_scheduler(FakeClock())
+    live, dead = make_proxy(1), make_proxy(2)
+    scheduler.add([live, dead])
+    scheduler.record(live, 12.345)
+    scheduler.record(dead, None)
+
+    alive = scheduler.alive()
+
+    assert [p.port for p in alive] == [1]
+    assert alive[0].latency.speed_type == SpeedType.TIME and alive[0].latency.value == 12.35
+
+
+def test_run_respects_the_check_budget(monkeypatch):
+    clock = FakeClock()
+    sleep = asyncio.sleep
+
+    async def fake_sleep(delay, *args):
+        clock.now += delay
+        await sleep(0)
+
+    class Checker:
+        def __init__(self, stop):
+            self.stop = stop
+            self.checked = []
+
+        async def check(self, proxy):
+            self.checked.append(proxy.port)
+            if clock.now >= 0.5:
+                self.stop.set()
+            return None if proxy.port % 2 else 5.0
+
+    monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+    scheduler = make_scheduler(clock, interval=0.05, min_interval=0.05, max_interval=0.05, rate=50)
+    scheduler.add(make_proxy(port) for port in range(1000))
+
+    async def run():
+        checker = Checker(asyncio.Event())
+        await scheduler.run(checker, concurrency=10, stop=checker.stop)
+        return checker.checked
+
+    checked = asyncio.run(run())
+
+    # the initial burst plus the refill over the simulated run
+    assert 50 < len(checked) <= 50 + 50 * clock.now + 1
+    assert len(set(checked)) == len(checked)
+    assert len(scheduler.alive()) == sum(1 for port in checked if port % 2 == 0)
+
+
+def test_revalidated_fetches_once_per_interval():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    fetched = []
+
+    def fetch():
+        fetched.append(clock.now)
+        return [make_proxy(len(fetched))]
+
+    refresh = revalidated(fetch, scheduler, 60, clock)
+    assert refresh() == []
+    scheduler.record(scheduler.pop_due(), 10.0)
+    clock.now = 30
+    assert [proxy.port for proxy in refresh()] == [1]
+    clock.now = 60
+    refresh()
+
+    assert fetched == [0, 60]
+    assert len(scheduler) == 2
+
+
+def test_revalidator_checks_in_the_background():
+    class Checker:
+        async def check(self, proxy):
+            return 5.0
+
+    scheduler = RevalidationScheduler(rate=1000)
+    scheduler.add([make_proxy(1), make_proxy(2)])
+    revalidator = Revalidator(scheduler, Checker())
+    revalidator.start()
+    try:
+        for _ in range(200):
+            if len(scheduler.alive()) == 2:
+                break
+            time.sleep(0.01)
+    finally:
+        revalidator.stop()
+        revalidator.join(5)
+
+    assert len(scheduler.alive()) == 2
+    assert not revalidator.is_alive()
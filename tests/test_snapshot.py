@@ -0,0 +1,66 @@
+import struct
+import time
+
+from pyroxy.address import Anonymity, Protocol, ProxyAddress
+from pyroxy.snapshot import PoolSnapshot, publish_snapshot
+
+
+def make_proxies(n, port=1000):
+    return [
+        ProxyAddress(f"10.0.{i // 256}.{i % 256}", port + i, Protocol.SOCKS5, "DE", "", Anonymity.HIA) for i in range(n)
+    ]
+
+
+def endpoints(proxies):
+    return [(p.ip, p.port) for p in proxies]
+
+
+def test_readers_follow_generations(tmp_path):
+    assert publish_snapshot(make_proxies(300), tmp_path) == 1
+    first, second = PoolSnapshot(tmp_path), PoolSnapshot(tmp_path)
+
+    assert first.generation == 1 and len(first) == 300
+    assert endpoints(first) == endpoints(make_proxies(300))
+    assert not first.refresh()
+
+    assert publish_snapshot(make_proxies(5, port=2000), tmp_path) == 2
+    # still the attached generation until asked
+    assert len(first) == 300
+    assert first.refresh() and second.refresh()
+    assert first.generation == second.generation == 2
+    assert endpoints(first) == endpoints(second) == endpoints(make_proxies(5, port=2000))
+
+    first.close()
+    second.close()
+
+
+def test_old_generations_are_removed(tmp_path):
+    for generation in range(1, 5):
+        publish_snapshot(make_proxies(generation), tmp_path, keep=2)
+        if generation == 1:
+            snapshot = PoolSnapshot(tmp_path)
+            with_iterator = iter(snapshot)
+
+    assert sorted(p.name for p in tmp_path.glob("pool.*")) == ["pool.3.bin", "pool.4.bin"]
+    assert snapshot.refresh() and snapshot.generation == 4 and len(snapshot) == 4
+    # a reader still iterating the first generation keeps its mapping
+    assert endpoints(with_iterator) == endpoints(make_proxies(1))
+    snapshot.close()
+
+
+def test_torn_control_file(tmp_path):
+    publish_snapshot(make_proxies(1), tmp_path)
+    publish_snapshot(make_proxies(2), tmp_path)
+    # a publisher that died between its two writes: the check copy is ahead
+    control = tmp_path / "control"
+    data = bytearray(control.read_bytes())
+    struct.pack_into("<Q", data, 8, 1)
+    control.write_bytes(bytes(data))
+
+    start = time.monotonic()
+    with PoolSnapshot(tmp_path) as snapshot:
+        assert snapshot.generation == 2 and len(snapshot) == 2
+    assert time.monotonic() - start < 1
+
+    assert publish_snapshot(make_proxies(3), tmp_path) == 3
+    assert struct.unpack_from("<QQ", control.read_bytes(), 8) == (3, 3)
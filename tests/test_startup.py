@@ -0,0 +1,49 @@
+import subprocess
+import sys
+
+from click.testing import CliRunner
+
+import pyroxy
+from pyroxy import cli
+
+HEAVY_MODULES = ("requests", "parsel", "lxml", "asyncio", "sqlite3", "http.server")
+
+
+def run_python(code, *flags):
+    return subprocess.run([sys.executable, *flags, "-c", code], capture_output=True, text=True, check=True)
+
+
+def test_cli_import_stays_light():
+    code = (
+        "import logging, sys, pyroxy.cli\n"
+        f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])\n"
+        "print(len(logging.getLogger().handlers))"
+    )
+    loaded, handlers = run_python(code).stdout.split("\n")[:2]
+
+    assert loaded == "[]"
+    assert handlers == "0"
+
+
+def test_cli_importtime():
+    stderr = run_python("import pyroxy.cli", "-X", "importtime").stderr
+    imported = {line.split("|")[-1].strip() for line in stderr.splitlines() if line.startswith("import time:")}
+
+    assert "pyroxy.cli" in imported
+    assert not imported & set(HEAVY_MODULES)
+
+
+def test_help_lists_registered_sources():
+    result = CliRunner().invoke(cli.proxies, ["proxylist", "--help"])
+
+    assert result.exit_code == 0
+    assert "freeproxy" in result.output and "geonode" in result.output
+    assert "ndjson" in result.output
+
+
+def test_package_exports_load_on_first_use():
+    from pyroxy import ProxyStore, filter_proxy_list
+
+    assert callable(filter_proxy_list)
+    assert ProxyStore is pyroxy.ProxyStore
+    assert "proxy_list" in dir(pyroxy)
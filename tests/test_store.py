@@ -0,0 +1,46 @@
+import json
+import math
+
+from pyroxy.address import Anonymity, Protocol, ProxyAddress
+from pyroxy.parser import GeoNodeProxyParser
+from pyroxy.pyroxy import filter_proxy_list
+from pyroxy.store import ProxyStore, proxy_latency
+
+from .conftest import fixture_text
+
+
+def geonode_proxies():
+    return list(GeoNodeProxyParser.iter_parse(json.loads(fixture_text("geonode.json"))["data"]))
+
+
+def test_store_query_matches_list_filter():
+    proxies = geonode_proxies()
+    store = ProxyStore(proxies)
+    protocols = [Protocol.HTTPS, Protocol.SOCKS4, Protocol.SOCKS5]
+
+    expected = filter_proxy_list(proxies, protocols, [Anonymity.HIA], google=True)
+    rows = store.query(protocols=protocols, anonymity=[Anonymity.HIA], google=True)
+
+    assert [(proxies[row].ip, proxies[row].port) for row in rows] == [(p.ip, p.port) for p in expected]
+    assert len(filter_proxy_list(store, protocols, [Anonymity.HIA], google=True)) == len(expected)
+
+
+def test_store_country_and_latency():
+    proxies = geonode_proxies()
+    store = ProxyStore(proxies)
+
+    rows = store.query(countries=["US", "DE"], latency=(0, 1500))
+
+    expected = [i for i, p in enumerate(proxies) if p.country in ("US", "DE") and 0 <= proxy_latency(p) <= 1500]
+    assert rows == expected
+
+
+def test_store_round_trip_columns():
+    proxy = ProxyAddress("10.1.2.3", "8080", Protocol.SOCKS5, "", "now", Anonymity.ANM, google=True)
+    store = ProxyStore([proxy, ProxyAddress("::1", 3128, Protocol.HTTP, "US", "", Anonymity.NOA)])
+
+    restored = store[0]
+    assert (restored.ip, restored.port) == ("10.1.2.3", 8080)
+    assert (restored.protocol, restored.anonymity) == (Protocol.SOCKS5, Anonymity.ANM)
+    assert restored.google and restored.latency is None and math.isnan(proxy_latency(restored))
+    assert store[1].ip == "::1"
@@ -0,0 +1,117 @@
+import asyncio
+import ssl
+
+import pytest
+
+from pyroxy.address import Anonymity, Protocol, ProxyAddress, SpeedType
+from pyroxy.validator import ProxyChecker
+
+from .conftest import FIXTURES, StubProxy
+
+
+def make_proxy(port, protocol):
+    return ProxyAddress("127.0.0.1", port, protocol, "US", "", Anonymity.HIA)
+
+
+def test_validate_all_protocols(stub_server):
+    url = stub_server.route("/generate_204", status=204)
+
+    async def run():
+        proxy = await StubProxy().start()
+        dead = await StubProxy(dead=True).start()
+        candidates = [make_proxy(proxy.port, protocol) for protocol in Protocol]
+        candidates.append(make_proxy(dead.port, Protocol.SOCKS5))
+        try:
+            return await ProxyChecker(url, concurrency=4, connect_timeout=1, read_timeout=1).validate(candidates)
+        finally:
+            await proxy.stop()
+            await dead.stop()
+
+    alive = asyncio.run(run())
+
+    assert sorted(p.protocol.value for p in alive) == [p.value for p in Protocol]
+    assert all(p.latency.speed_type == SpeedType.TIME and p.latency.value > 0 for p in alive)
+
+
+def test_validate_stops_at_limit(stub_server):
+    url = stub_server.route("/generate_204", status=204, delay=0.05)
+
+    async def run():
+        proxy = await StubProxy().start()
+        try:
+            candidates = [make_proxy(proxy.port, Protocol.SOCKS5) for _ in range(50)]
+            alive = await ProxyChecker(url, concurrency=2).validate(candidates, limit=3)
+            return alive, proxy.connections
+        finally:
+            await proxy.stop()
+
+    alive, connections = asyncio.run(run())
+
+    assert len(alive) == 3
+    assert connections < 10
+
+
+def test_closed_port_is_dead():
+    async def run():
+        server = await asyncio.start_server(lambda r, w: None, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        server.close()
+        await server.wait_closed()
+        return await ProxyChecker("http://127.0.0.1/", connect_timeout=1).check(make_proxy(port, Protocol.HTTP))
+
+    assert asyncio.run(run()) is None
+
+
+def test_https_proxy_is_checked_without_connect_to_port_80(stub_server):
+    url = stub_server.route("/generate_204", status=204)
+
+    async def run():
+        proxy = await StubProxy(connect_ports={443}).start()
+        try:
+            candidates = [make_proxy(proxy.port, Protocol.HTTP), make_proxy(proxy.port, Protocol.HTTPS)]
+            return await ProxyChecker(url, connect_timeout=1, read_timeout=1).validate(candidates)
+        finally:
+            await proxy.stop()
+
+    assert sorted(p.protocol.value for p in asyncio.run(run())) == [Protocol.HTTP.value, Protocol.HTTPS.value]
+
+
+def test_https_url_is_checked_over_tls():
+    keycert = str(FIXTURES / "localhost-keycert.pem")
+    server_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    server_context.load_cert_chain(keycert)
+    client_context = ssl.create_default_context(cafile=keycert)
+    paths = []
+
+    async def respond(reader, writer):
+        paths.append((await reader.readline()).split()[1])
+        writer.write(b"HTTP/1.1 204 No Content\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+        await writer.drain()
+        writer.close()
+
+    async def run():
+        origin = await asyncio.start_server(respond, "127.0.0.1", 0, ssl=server_context)
+        url = f"https://127.0.0.1:{origin.sockets[0].getsockname()[1]}/generate_204"
+        proxy = await StubProxy().start()
+        candidates = [make_proxy(proxy.port, protocol) for protocol in Protocol]
+        try:
+            checker = ProxyChecker(url, concurrency=4, connect_timeout=1, read_timeout=1, ssl_context=client_context)
+            alive = await checker.validate(candidates)
+            # without trusting the test certificate the handshake fails, so nothing passes
+            untrusted = await ProxyChecker(url, connect_timeout=1, read_timeout=1).validate(candidates[:1])
+            return alive, untrusted
+        finally:
+            await proxy.stop()
+            origin.close()
+            await origin.wait_closed()
+
+    alive, untrusted = asyncio.run(run())
+
+    assert sorted(p.protocol.value for p in alive) == [p.value for p in Protocol]
+    assert set(paths) == {b"/generate_204"}
+    assert untrusted == []
+
+
+def test_unsupported_check_url():
+    with pytest.raises(ValueError):
+        ProxyChecker("ftp://127.0.0.1/")
@@ -0,0 +1,122 @@
+import csv
+import json
+import math
+
+import pytest
+
+from pyroxy.address import Anonymity, Protocol, ProxyAddress, Speed, SpeedType
+from pyroxy.writers import BINARY_HEADER, BINARY_RECORD, BinaryProxyFile, write_proxies
+
+
+def make_proxies(n):
+    return [
+        ProxyAddress(
+            f"10.0.{i // 256}.{i % 256}",
+            1000 + i,
+            Protocol.SOCKS5 if i % 2 else Protocol.HTTPS,
+            "US" if i % 3 else "Germany",
+            "2021-11-13T09:00:00Z",
+            Anonymity.HIA,
+            google=bool(i % 2),
+            latency=Speed(SpeedType.TIME, float(i)) if i % 4 else None,
+        )
+        for i in range(n)
+    ]
+
+
+def test_text_keeps_unique_endpoints(tmp_path):
+    proxies = make_proxies(5)
+    path = tmp_path / "proxies.txt"
+
+    assert write_proxies(path, proxies + proxies, chunk_size=3) == 5
+    assert path.read_text() == "\n".join(f"{p.ip}:{p.port}" for p in proxies)
+
+
+def test_ndjson_and_csv(tmp_path):
+    proxies = make_proxies(7)
+    write_proxies(tmp_path / "proxies.ndjson", proxies, "ndjson", chunk_size=2)
+    write_proxies(tmp_path / "proxies.csv", proxies, "csv", chunk_size=2)
+
+    lines = [json.loads(line) for line in (tmp_path / "proxies.ndjson").read_text().splitlines()]
+    with open(tmp_path / "proxies.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
+
+    assert [line["ip"] for line in lines] == [row["ip"] for row in rows] == [p.ip for p in proxies]
+    assert lines[1] == {
+        "ip": "10.0.0.1",
+        "port": 1001,
+        "protocol": "SOCKS5",
+        "anonymity": "HIA",
+        "country": "US",
+        "google": True,
+        "latency": 1.0,
+    }
+    assert rows[0]["latency"] == "" and rows[1]["latency"] == "1.0"
+
+
+def test_binary_round_trip_through_mmap(tmp_path):
+    proxies = make_proxies(600) + [ProxyAddress("::1", 80, Protocol.HTTP, "US", None, Anonymity.NOA)]
+    path = tmp_path / "proxies.bin"
+
+    assert write_proxies(path, proxies, "binary", chunk_size=256) == 600
+    assert path.stat().st_size == BINARY_HEADER.size + 600 * BINARY_RECORD.size
+
+    with BinaryProxyFile(path) as snapshot:
+        assert len(snapshot) == 600
+        read = list(snapshot)
+        last = snapshot[-1]
+
+    assert last == read[599]
+    for original, proxy in zip(proxies, read):
+        assert (proxy.ip, proxy.port, proxy.protocol, proxy.anonymity, proxy.google) == (
+            original.ip,
+            original.port,
+            original.protocol,
+            original.anonymity,
+            original.google,
+        )
+        assert proxy.country == ("US" if original.country == "US" else "DE")
+        expected = original.latency.value if original.latency else math.nan
+        actual = proxy.latency.value if proxy.latency else math.nan
+        assert actual == expected or (math.isnan(actual) and math.isnan(expected))
+
+
+def test_binary_skips_unpackable_rows(tmp_path):
+    good = make_proxies(2)
+    bad = [
+        ProxyAddress(None, 80, Protocol.HTTP, "US", "", Anonymity.NOA),
+        ProxyAddress("10.1.0.1", 70000, Protocol.HTTP, "US", "", Anonymity.NOA),
+        ProxyAddress("10.1.0.2", "http", Protocol.HTTP, "US", "", Anonymity.NOA),
+    ]
+    path = tmp_path / "proxies.bin"
+
+    assert write_proxies(path, bad[:1] + good[:1] + bad[1:] + good[1:], "binary") == 2
+
+    with BinaryProxyFile(path) as snapshot:
+        read = list(snapshot)
+    assert [proxy.ip for proxy in read] == [proxy.ip for proxy in good]
+    assert read[0].country == "DE" and read[0].updated == ""
+
+
+def test_failed_write_keeps_previous_file(tmp_path):
+    path = tmp_path / "proxies.txt"
+    write_proxies(path, make_proxies(3))
+    before = path.read_text()
+
+    def broken():
+        yield from make_proxies(5)
+        raise RuntimeError("source died")
+
+    with pytest.raises(RuntimeError):
+        write_proxies(path, broken(), chunk_size=2)
+
+    assert path.read_text() == before
+    assert [p.name for p in tmp_path.iterdir()] == ["proxies.txt"]
+
+
+def test_not_a_binary_file(tmp_path):
+    path = tmp_path / "proxies.txt"
+    write_proxies(path, make_proxies(30))
+
+    with pytest.raises(ValueError):
+        BinaryProxyFile(path)